@@ -3,6 +3,7 @@ import click
 
 import carrottransform as c
 
+from .subcommands.bench import bench
 from .subcommands.run import run
 
 
@@ -19,6 +20,7 @@ def transform(ctx, version):
 
 
 transform.add_command(run, "run")
+transform.add_command(bench, "bench")
 
 if __name__ == "__main__":
     transform()
@@ -0,0 +1,236 @@
+"""
+the `bench` command; generates synthetic inputs shaped like the examples and times v1/v2 mapping them into csv and sqlite.
+
+each run is a separate process so that its peak memory can be read back from `wait4()` (where that exists) without the other runs getting in the way.
+the report is json - so that numbers from before and after a change can be compared.
+
+# λ uv run carrot-transform bench --persons 100000 --rows-per-person 5
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import sqlalchemy
+
+from carrottransform.tools.logger import logger_setup
+from carrottransform.tools.synthetic import EXAMPLE_INPUTS, generate_inputs
+
+logger = logger_setup()
+
+EXAMPLE_RULES = EXAMPLE_INPUTS.parent / "rules"
+PERSON_TABLE = "Demographics"
+
+# the example tables that the v1/v2 rules read
+TABLES = [PERSON_TABLE, "Symptoms", "covid19_antibody"]
+
+ENGINES = {"v1": EXAMPLE_RULES / "v1.json", "v2": EXAMPLE_RULES / "v2.json"}
+TARGETS = ["csv", "sqlite"]
+
+
+def output_tables(rules_file: Path) -> list[str]:
+    return sorted(json.loads(rules_file.read_text())["cdm"].keys())
+
+
+def count_outputs(target: str, output: Path, tables: list[str]) -> dict[str, int]:
+    """count the rows written into each of the tables"""
+
+    if target == "csv":
+        counts = {}
+        for table in tables:
+            with (output / f"{table}.tsv").open("rb") as file:
+                counts[table] = sum(1 for _ in file) - 1
+        return counts
+
+    engine = sqlalchemy.create_engine(f"sqlite:///{output}")
+    try:
+        with engine.connect() as connection:
+            return {
+                table: connection.execute(
+                    sqlalchemy.text(f'SELECT COUNT(*) FROM "{table}"')
+                ).scalar_one()
+                for table in tables
+            }
+    finally:
+        engine.dispose()
+
+
+def run_measured(command: list[str], log: Path) -> tuple[float, int | None]:
+    """run a command and return how long it took and its peak rss in bytes (if that can be measured)"""
+
+    start = time.perf_counter()
+    with log.open("w") as log_file:
+        process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+
+    if not hasattr(os, "wait4"):
+        status = process.wait()
+        peak_rss = None
+    else:
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        status = process.returncode
+
+        # linux reports kilobytes, macos reports bytes
+        peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    seconds = time.perf_counter() - start
+    if 0 != status:
+        raise click.ClickException(f"{command=} failed with {status=} - see {log}")
+
+    return seconds, peak_rss
+
+
+def bench_run(
+    engine: str, target: str, inputs: Path, workdir: Path, input_rows: int
+) -> dict:
+    """map the inputs once and measure it"""
+
+    rules_file = ENGINES[engine]
+    output = workdir / f"{engine}-{target}"
+    output_arg = str(output) if target == "csv" else f"sqlite:///{output}.db"
+
+    # a reused --workdir would otherwise have the last run's rows added to
+    output.with_suffix(".db").unlink(missing_ok=True)
+
+    seconds, peak_rss = run_measured(
+        [
+            sys.executable,
+            "-m",
+            "carrottransform.cli.command",
+            "run",
+            engine,
+            "--inputs",
+            str(inputs),
+            "--rules-file",
+            str(rules_file),
+            "--person",
+            PERSON_TABLE,
+            "--output",
+            output_arg,
+        ],
+        output.with_suffix(".log"),
+    )
+
+    start = time.perf_counter()
+    output_rows = count_outputs(
+        target,
+        output if target == "csv" else output.with_suffix(".db"),
+        output_tables(rules_file),
+    )
+    counted = time.perf_counter() - start
+
+    return {
+        "engine": engine,
+        "target": target,
+        "input_rows": input_rows,
+        "output_rows": output_rows,
+        "rows_per_sec": input_rows / seconds,
+        "peak_rss_bytes": peak_rss,
+        "stages": {"map": seconds, "count": counted},
+    }
+
+
+@click.command()
+@click.option(
+    "--persons",
+    type=click.IntRange(min=1),
+    default=10_000,
+    help="Number of people to generate",
+)
+@click.option(
+    "--rows-per-person",
+    type=click.IntRange(min=1),
+    default=5,
+    help="Rows generated for each person in the tables other than the person table",
+)
+@click.option(
+    "--distinct-dates",
+    type=click.IntRange(min=1),
+    default=365,
+    help="Number of different days the generated dates are picked from",
+)
+@click.option("--seed", type=int, default=0, help="Seed for the generated values")
+@click.option(
+    "--engine",
+    "engines",
+    type=click.Choice(list(ENGINES)),
+    multiple=True,
+    default=list(ENGINES),
+    help="Which of v1/v2 to run - can be repeated",
+)
+@click.option(
+    "--target",
+    "targets",
+    type=click.Choice(TARGETS),
+    multiple=True,
+    default=TARGETS,
+    help="Which outputs to write - can be repeated",
+)
+@click.option(
+    "--workdir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Folder to generate/write into - a temporary one (that's deleted) if not set",
+)
+@click.option(
+    "--report",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="File to write the json report into - stdout if not set",
+)
+def bench(
+    persons: int,
+    rows_per_person: int,
+    distinct_dates: int,
+    seed: int,
+    engines: tuple[str, ...],
+    targets: tuple[str, ...],
+    workdir: Path | None,
+    report: Path | None,
+):
+    """Generate synthetic inputs and time mapping them"""
+
+    with tempfile.TemporaryDirectory(prefix="carrot-bench-") as temp:
+        into = Path(temp) if workdir is None else workdir
+        into.mkdir(parents=True, exist_ok=True)
+
+        start = time.perf_counter()
+        inputs = into / "inputs"
+        rows_written = generate_inputs(
+            inputs,
+            TABLES,
+            PERSON_TABLE,
+            persons,
+            rows_per_person=rows_per_person,
+            distinct_dates=distinct_dates,
+            seed=seed,
+        )
+        generated = time.perf_counter() - start
+
+        input_rows = sum(rows_written.values())
+        runs = []
+        for engine in engines:
+            for target in targets:
+                logger.info(f"benchmarking {engine} into {target}")
+                runs.append(bench_run(engine, target, inputs, into, input_rows))
+
+    result = {
+        "persons": persons,
+        "rows_per_person": rows_per_person,
+        "distinct_dates": distinct_dates,
+        "seed": seed,
+        "input_rows": rows_written,
+        "stages": {"generate": generated},
+        "runs": runs,
+    }
+
+    text = json.dumps(result, indent=2)
+    if report is None:
+        click.echo(text)
+    else:
+        report.write_text(text + "\n")
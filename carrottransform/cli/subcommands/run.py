@@ -14,13 +14,13 @@ from carrottransform.tools.args import (
     person_rules_check,
     remove_csv_extension,
 )
-from carrottransform.tools.core import get_target_records
+from carrottransform.tools.compiled_rules import compile_source_plan
 from carrottransform.tools.date_helpers import normalise_to8601
+from carrottransform.tools.id_allocator import IdAllocator
 from carrottransform.tools.logger import logger_setup
-from carrottransform.tools.person_helpers import (
-    load_last_used_ids,
-    read_person_ids,
-)
+from carrottransform.tools.person_helpers import read_person_ids
+from carrottransform.tools.person_index import PersonIndex, empty_person_lookup
+from carrottransform.tools.person_registry import PersonRegistry
 
 logger = logger_setup()
 
@@ -46,6 +46,7 @@ logger = logger_setup()
     default=0,
     help="Lower outcount limit for logfile output",
 )
+@args.people_and_summary
 def mapstream(
     rules_file: Path,
     person: str,
@@ -56,6 +57,9 @@ def mapstream(
     use_input_person_ids,
     last_used_ids_file: Path | None,
     log_file_threshold,
+    summary_top: int | None,
+    person_index_dir: Path | None,
+    person_registry: Path | None,
 ):
     # the write-mode needs to be reimplemented
     write_mode: str = "w"
@@ -125,22 +129,42 @@ def mapstream(
 
     ## set record number
     ## will keep track of the current record number in each file, e.g., measurement_id, observation_id.
-    record_numbers = {}
-    for output_file in output_files:
-        record_numbers[output_file] = 1
     if (last_used_ids_file is not None) and last_used_ids_file.is_file():
-        record_numbers = load_last_used_ids(last_used_ids_file, record_numbers)
+        record_numbers = IdAllocator.load(last_used_ids_file, output_files)
+    else:
+        record_numbers = IdAllocator(output_files)
 
     fhd = {}
     tgtcolmaps = {}
 
     try:
+        ## start from the people that earlier runs numbered
+        registry = None if person_registry is None else PersonRegistry(person_registry)
+        require(
+            registry is None or use_input_person_ids == "N",
+            "--person-registry only works when the person ids are renumbered",
+        )
+
+        ## the people go in a dict - or the compact index if it's going to be paged from disk
+        person_ids = empty_person_lookup(
+            use_input_person_ids != "N", compact=person_index_dir is not None
+        )
+        if registry is not None:
+            registry.load(person_ids)
+
         ## get all person_ids from file and either renumber with an int or take directly, and add to a dict
         person_lookup, rejected_person_count = read_person_ids(
             inputs.open(remove_csv_extension(person)),
             mappingrules,
             use_input_person_ids != "N",
+            person_ids,
         )
+        if registry is not None:
+            registry.save(person_lookup)
+
+        # page the lookup from disk rather than holding it in memory
+        if person_index_dir is not None and isinstance(person_lookup, PersonIndex):
+            person_lookup = person_lookup.spill(person_index_dir)
 
         ## open person_ids output file with a header
         fhpout = output.start("person_ids", ["SOURCE_SUBJECT", "TARGET_SUBJECT"])
@@ -186,10 +210,14 @@ def mapstream(
     for srcfilename in rules_input_files:
         rcount = 0
 
-        csvr = inputs.open(remove_csv_extension(srcfilename))
+        # only the columns the rules use - for sources that can skip the others
+        csvr = inputs.open(
+            remove_csv_extension(srcfilename),
+            mappingrules.get_infile_columns(srcfilename),
+        )
 
         ## create dict for input file, giving the data and output file
-        tgtfiles, src_to_tgt = mappingrules.parse_rules_src_to_tgt(srcfilename)
+        tgtfiles, _ = mappingrules.parse_rules_src_to_tgt(srcfilename)
         infile_datetime_source, infile_person_id_source = (
             mappingrules.get_infile_date_person_id(srcfilename)
         )
@@ -200,15 +228,15 @@ def mapstream(
             outcounts[tgtfile] = 0
             rejcounts[tgtfile] = 0
 
-        datacolsall = []
         csv_column_headers = next(csvr)
-        dflist = mappingrules.get_infile_data_fields(srcfilename)
-        for colname in csv_column_headers:
-            datacolsall.append(colname)
         inputcolmap = omopcdm.get_column_map(csv_column_headers)
-        pers_id_col = inputcolmap[infile_person_id_source]
         datetime_col = inputcolmap[infile_datetime_source]
 
+        ## compile the rules for this input once, so the row loop only does indexed lookups
+        plan = compile_source_plan(
+            srcfilename, csv_column_headers, mappingrules, omopcdm
+        )
+
         logger.info(
             "--------------------------------------------------------------------------------"
         )
@@ -241,52 +269,39 @@ def mapstream(
                 )
                 continue
 
-            for tgtfile in tgtfiles:
-                tgtcolmap = tgtcolmaps[tgtfile]
-                auto_num_col = omopcdm.get_omop_auto_number_field(tgtfile)
-                pers_id_col = omopcdm.get_omop_person_id_field(tgtfile)
-
-                datacols = datacolsall
-                if tgtfile in dflist:
-                    datacols = dflist[tgtfile]
-
-                for datacol in datacols:
-                    built_records, outrecords, metrics = get_target_records(
-                        tgtfile,
-                        tgtcolmap,
-                        src_to_tgt,
-                        datacol,
-                        indata,
-                        inputcolmap,
-                        srcfilename,
-                        omopcdm,
-                        metrics,
-                    )
+            for target in plan.targets:
+                tgtfile = target.tgtfilename
+                auto_num_index = target.auto_num_index
+                pers_id_index = target.person_id_index
+                fh = fhd[tgtfile]
+
+                for column in target.columns:
+                    built_records, outrecords = column.build(indata, metrics)
 
                     if built_records:
                         for outrecord in outrecords:
-                            if auto_num_col is not None:
-                                outrecord[tgtcolmap[auto_num_col]] = str(
-                                    record_numbers[tgtfile]
+                            if auto_num_index is not None:
+                                outrecord[auto_num_index] = str(
+                                    record_numbers.next_id(tgtfile)
                                 )
                                 ### most of the rest of this section is actually to do with metrics
-                                record_numbers[tgtfile] += 1
 
-                            if (outrecord[tgtcolmap[pers_id_col]]) in person_lookup:
-                                outrecord[tgtcolmap[pers_id_col]] = person_lookup[
-                                    outrecord[tgtcolmap[pers_id_col]]
-                                ]
+                            assigned_person_id = person_lookup.get(
+                                outrecord[pers_id_index]
+                            )
+                            if assigned_person_id is not None:
+                                outrecord[pers_id_index] = assigned_person_id
                                 outcounts[tgtfile] += 1
 
                                 metrics.increment_with_datacol(
                                     source_path=srcfilename,
                                     target_file=tgtfile,
-                                    datacol=datacol,
+                                    datacol=column.srcfield,
                                     out_record=outrecord,
                                 )
 
                                 # write the line to the file
-                                fhd[tgtfile].write(outrecord)
+                                fh.write(outrecord)
                             else:
                                 metrics.increment_key_count(
                                     source=srcfilename,
@@ -298,9 +313,6 @@ def mapstream(
                                 )
                                 rejidcounts[srcfilename] += 1
 
-                    if tgtfile == "person":
-                        break
-
         logger.info(
             f"INPUT file data : {srcfilename}: input count {rcount}, time since start {time.time() - start_time:.5} secs"
         )
@@ -312,25 +324,9 @@ def mapstream(
         "--------------------------------------------------------------------------------"
     )
 
-    data_summary = metrics.get_mapstream_summary()
     try:
-        # convert the data into like-csv lines
-        csv_like_lines = map(lambda x: x.split("\t"), data_summary.split("\n")[:-1])
-
-        # loop through the lines writing them
-        summary: outputs.OutputTarget.Handle | None = None
-        for line in csv_like_lines:
-            if summary is None:
-                # we need the column names to "open" this sort of file/table, and, that'll be the first line
-                summary = output.start("summary_mapstream", line)
-            else:
-                # once the summary is open
-                summary.write(line)
-
-        # mypy needs a typecheck
-        if summary is not None:
-            summary.close()
-            summary = None
+        # stream the rows straight into the summary file/table
+        metrics.write_mapstream_summary(output, summary_top)
     except IOError as e:
         logger.exception(f"I/O error({e.errno}): {e.strerror}")
         logger.exception("Unable to write file")
@@ -343,6 +339,76 @@ def mapstream(
 
 @click.command()
 @args.common
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    required=False,
+    help="Number of worker processes to map the input files with",
+)
+@click.option(
+    "--shard-bytes",
+    type=click.IntRange(min=0),
+    default=0,
+    required=False,
+    help="With --workers, split csv inputs into ranges of about this many bytes (0 to only split by file). Quoted values must not contain line breaks",
+)
+@click.option(
+    "--last-used-ids-file",
+    type=PathArg,
+    default=None,
+    required=False,
+    help="File of the last used ids for OMOP tables - format: tablename\tlast_used_id. Ids start after these, and, the file is updated with the ids this run used",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=0),
+    default=0,
+    required=False,
+    help="Map the inputs in chunks of this many rows, looking each distinct value up once per chunk (0 to map one row at a time). The output is the same either way",
+)
+@click.option(
+    "--metrics-file",
+    type=PathArg,
+    default=None,
+    required=False,
+    help="json file of the summary counts. Counts from an earlier run are read from it and added to, and, the file is updated with the combined counts",
+)
+@click.option(
+    "--log-file-threshold",
+    type=click.IntRange(min=0),
+    default=0,
+    required=False,
+    help="Lower outcount limit for summary output",
+)
+@args.people_and_summary
+@click.option(
+    "--watermarks-file",
+    type=PathArg,
+    default=None,
+    required=False,
+    help="File of how many rows of each input have been mapped. Only the rows after those are mapped and added to the outputs - needs --last-used-ids-file and --checkpoint-file",
+)
+@click.option(
+    "--checkpoint-file",
+    type=PathArg,
+    default=None,
+    required=False,
+    help="File to save where the run has got to every so often. It's deleted when the run finishes - needs a tsv (without compression) or database output",
+)
+@click.option(
+    "--checkpoint-rows",
+    type=click.IntRange(min=1),
+    default=100_000,
+    required=False,
+    help="Number of input rows to map between checkpoints",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Carry on from the --checkpoint-file of a run that died (if there is one) rather than starting again",
+)
 def launch_v2(
     inputs: sources.SourceObject,
     output: outputs.OutputTarget,
@@ -350,6 +416,19 @@ def launch_v2(
     person: str,
     omop_ddl_file: Path,
     omop_config_file: Path,
+    workers: int,
+    shard_bytes: int,
+    last_used_ids_file: Path | None,
+    batch_size: int,
+    metrics_file: Path | None,
+    log_file_threshold: int,
+    summary_top: int | None,
+    person_index_dir: Path | None,
+    person_registry: Path | None,
+    watermarks_file: Path | None,
+    checkpoint_file: Path | None,
+    checkpoint_rows: int,
+    resume: bool,
 ):
     require(
         not person.endswith(".csv"),
@@ -371,6 +450,19 @@ def launch_v2(
         omop_config_file=omop_config_file,
         person=person,
         inputs=inputs,
+        workers=workers,
+        shard_bytes=shard_bytes,
+        last_used_ids_file=last_used_ids_file,
+        batch_size=batch_size,
+        metrics_file=metrics_file,
+        log_file_threshold=log_file_threshold,
+        summary_top=summary_top,
+        person_index_dir=person_index_dir,
+        person_registry=person_registry,
+        watermarks_file=watermarks_file,
+        checkpoint_file=checkpoint_file,
+        checkpoint_rows=checkpoint_rows,
+        resume=resume,
     )
 
     # close/flush these because we need the files on-disk for unit test valiation
@@ -8,7 +8,6 @@ from pathlib import Path
 from carrottransform.tools import outputs, sources
 from carrottransform.tools.logger import logger_setup
 from carrottransform.tools.orchestrator import V2ProcessingOrchestrator
-from carrottransform.tools.record_builder import RecordBuilderFactory
 
 logger = logger_setup()
 
@@ -21,14 +20,24 @@ def process_common_logic(
     person: str,
     omop_config_file: Path,
     inputs: sources.SourceObject,
+    workers: int = 1,
+    shard_bytes: int = 0,
+    last_used_ids_file: Path | None = None,
+    batch_size: int = 0,
+    metrics_file: Path | None = None,
+    log_file_threshold: int = 0,
+    summary_top: int | None = None,
+    person_index_dir: Path | None = None,
+    person_registry: Path | None = None,
+    watermarks_file: Path | None = None,
+    checkpoint_file: Path | None = None,
+    checkpoint_rows: int = 100_000,
+    resume: bool = False,
 ):
     """Common processing logic for both modes"""
 
     start_time = time.time()
 
-    # clearing the cache at startup fixes a issue in testing with the cached records
-    RecordBuilderFactory.clear_person_cache()
-
     try:
         # Create orchestrator and execute processing (pass explicit kwargs to satisfy typing)
         orchestrator = V2ProcessingOrchestrator(
@@ -39,6 +48,19 @@ def process_common_logic(
             omop_ddl_file=omop_ddl_file,
             omop_config_file=omop_config_file,
             write_mode=write_mode,
+            workers=workers,
+            shard_bytes=shard_bytes,
+            last_used_ids_file=last_used_ids_file,
+            batch_size=batch_size,
+            metrics_file=metrics_file,
+            log_file_threshold=log_file_threshold,
+            summary_top=summary_top,
+            person_index_dir=person_index_dir,
+            person_registry=person_registry,
+            watermarks_file=watermarks_file,
+            checkpoint_file=checkpoint_file,
+            checkpoint_rows=checkpoint_rows,
+            resume=resume,
         )
 
         logger.info(
@@ -13,6 +13,7 @@ import carrottransform.tools.sources as sources
 from carrottransform import require
 from carrottransform.tools import at_path, outputs
 from carrottransform.tools.mappingrules import MappingRules
+from carrottransform.tools.sources import SourceTableNotFound
 
 # only matches strings which can be used as SQL (et al) tables
 PERSON_TABLE_PATTERN = r"^[a-zA-Z_][a-zA-Z0-9_]*$"
@@ -135,9 +136,9 @@ def person_rules_check_v2_injected(
         )
 
     ##
-    # try to open the person table/file/source - this should detect a missing one
-    # ... won't work if the SourceObject changes and isn't "keen" about reading the first row ASAP
-    sources.open(person)
+    # check the person table/file/source is there - without reading it; the ids are loaded from it later
+    if not sources.has_table(person):
+        raise SourceTableNotFound(person)
 
     ##
     # get the person rules object
@@ -360,7 +361,7 @@ def common(func):
         envvar="OUTPUT",
         type=outputs.TargetArgument,
         required=True,
-        help="define the output directory for OMOP-format tsv files",
+        help="define the output directory for OMOP-format tsv files (use tsv:DIR?compression=gz&part-bytes=N to compress them, as gz or zst, and/or split them into parts - and minio:...?concurrency=N&memory-budget=N to tune the uploads to a bucket)",
     )(func)
 
     func = click.option(
@@ -393,3 +394,33 @@ def common(func):
     )(func)
 
     return func
+
+
+def people_and_summary(func):
+    """Decorator for the person lookup and summary options used by mapstream and v2"""
+
+    func = click.option(
+        "--person-registry",
+        type=PathArg,
+        default=None,
+        required=False,
+        help="File of the person ids handed out by earlier runs. People in it keep their ids and new people are added to it. Everyone in it is looked up (and written to person_ids) even if they aren't in this run's person table",
+    )(func)
+
+    func = click.option(
+        "--person-index-dir",
+        type=PathArg,
+        default=None,
+        required=False,
+        help="Folder to save the person id lookup into. It's then memory mapped from there rather than held in memory",
+    )(func)
+
+    func = click.option(
+        "--summary-top",
+        type=click.IntRange(min=0),
+        default=None,
+        required=False,
+        help="Only write the summary rows with the highest outcounts - this many of them",
+    )(func)
+
+    return func
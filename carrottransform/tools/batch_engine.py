@@ -0,0 +1,451 @@
+"""
+a batch engine for the v2 StreamProcessor.
+
+the row engine creates a RecordContext and a record builder for every (row, target, column) and then works out the concepts for that one value.
+this takes a chunk of input rows, pulls each mapped column out of the chunk, and looks each distinct value up once - building the "template" records for the value's concepts.
+the records are then written row by row from those templates, so they (and their ids) come out in the same order as the row engine would write them.
+
+the metrics are tallied for the chunk and added in one go at the end of it - the summary is sorted so this doesn't change it.
+
+the person table is still done by the row engine; its records are merged across all of the columns and de-duplicated per person
+"""
+
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+from case_insensitive_dict import CaseInsensitiveDict
+
+import carrottransform.tools.outputs as outputs
+from carrottransform.tools.concept_helpers import (
+    generate_combinations,
+    get_value_mapping,
+)
+from carrottransform.tools.date_helpers import get_datetime_value, normalise_to8601
+from carrottransform.tools.logger import logger_setup
+from carrottransform.tools.mapping_types import ConceptMapping, V2TableMapping
+from carrottransform.tools.validation import valid_value
+
+if TYPE_CHECKING:
+    from carrottransform.tools.orchestrator import StreamProcessor
+
+logger = logger_setup()
+
+# the date operations for a target. each op is a tuple starting with one of these
+DATE_PARTS = 0  # (DATE_PARTS, index, year_index, month_index, day_index) - the part indexes can be None
+DATE_LINKED = (
+    1  # (DATE_LINKED, index, date_only_index) - the date only index can be None
+)
+DATE_SIMPLE = 2  # (DATE_SIMPLE, index)
+
+# the lookup result for a blank value
+INVALID: list[list[str]] = []
+
+
+@dataclass
+class BatchColumn:
+    """one mapped input column for one target"""
+
+    field: str
+    source_index: int
+    concept_mapping: ConceptMapping | None
+
+
+@dataclass
+class BatchTarget:
+    """the precomputed rules for writing one target table from the input file"""
+
+    tgtfilename: str
+    tgtcolmap: CaseInsensitiveDict[str, int]
+    write: Callable[[list[str]], Any]
+    template: list[str]
+    columns: list[BatchColumn]
+    auto_num_index: int | None
+    person_id_index: int
+
+    # (source index, target index) if the person id is copied across
+    person_id_copy: tuple[int, int] | None
+
+    date_source_index: int | None
+    date_ops: list[tuple]
+
+
+class BatchEngine:
+    """maps chunks of rows from one input file"""
+
+    def __init__(
+        self,
+        processor: "StreamProcessor",
+        source_filename: str,
+        input_column_map: CaseInsensitiveDict[str, int],
+        applicable_targets: set[str],
+        datetime_col_idx: int,
+        file_meta: dict[str, Any],
+    ):
+        self._processor = processor
+        self._context = processor.context
+        self._source_filename = source_filename
+        self._input_column_map = input_column_map
+        self._datetime_col_idx = datetime_col_idx
+        self._file_meta = file_meta
+
+        # keep the row engine's order - it's the order that the records are written in
+        self._targets: list[BatchTarget | str] = [
+            "person"
+            if target_file == "person"
+            else self._build_target(target_file, file_meta)
+            for target_file in applicable_targets
+        ]
+
+    def _build_target(self, target_file: str, file_meta: dict[str, Any]) -> BatchTarget:
+        """precompute everything about a target that doesn't depend on the row"""
+
+        v2_mapping: V2TableMapping = self._context.mappingrules.v2_mappings[
+            target_file
+        ][self._source_filename]
+        tgtcolmap = self._context.target_column_maps[target_file]
+        target_meta = self._processor.cache.target_metadata_cache[target_file]
+        srccolmap = self._input_column_map
+
+        template = [""] * len(tgtcolmap)
+        for req_integer in target_meta["notnull_numeric_fields"]:
+            if req_integer in tgtcolmap:
+                template[tgtcolmap[req_integer]] = "0"
+
+        columns = [
+            BatchColumn(
+                field=data_column,
+                source_index=srccolmap[data_column],
+                concept_mapping=v2_mapping.concept_mappings.get(data_column),
+            )
+            for data_column in file_meta["data_fields"].get(target_file, [])
+            if data_column in srccolmap
+        ]
+
+        person_id_copy = None
+        person_id_mapping = v2_mapping.person_id_mapping
+        if (
+            person_id_mapping
+            and person_id_mapping.dest_field in tgtcolmap
+            and person_id_mapping.source_field in srccolmap
+        ):
+            person_id_copy = (
+                srccolmap[person_id_mapping.source_field],
+                tgtcolmap[person_id_mapping.dest_field],
+            )
+
+        date_source_index = None
+        date_ops: list[tuple] = []
+        date_mapping = v2_mapping.date_mapping
+        if date_mapping and date_mapping.source_field not in srccolmap:
+            logger.warning(
+                f"Date mapping source field not found in source data: {date_mapping.source_field}"
+            )
+        elif date_mapping:
+            date_source_index = srccolmap[date_mapping.source_field]
+
+            def index(field: str | None) -> int | None:
+                return (
+                    None
+                    if field is None or field not in tgtcolmap
+                    else tgtcolmap[field]
+                )
+
+            for dest_field in date_mapping.dest_fields:
+                if dest_field not in tgtcolmap:
+                    continue
+                if dest_field in target_meta["date_component_data"]:
+                    parts = target_meta["date_component_data"][dest_field]
+                    date_ops.append(
+                        (
+                            DATE_PARTS,
+                            tgtcolmap[dest_field],
+                            index(parts.get("year")),
+                            index(parts.get("month")),
+                            index(parts.get("day")),
+                        )
+                    )
+                elif dest_field in target_meta["date_col_data"]:
+                    date_ops.append(
+                        (
+                            DATE_LINKED,
+                            tgtcolmap[dest_field],
+                            index(target_meta["date_col_data"][dest_field]),
+                        )
+                    )
+                else:
+                    date_ops.append((DATE_SIMPLE, tgtcolmap[dest_field]))
+
+        auto_num_col = target_meta["auto_num_col"]
+        into = self._context.file_handles[target_file]
+
+        # injection needs the records, the-old-ways expect you to tabbify the record for it
+        write: Callable[[list[str]], Any]
+        if isinstance(into, outputs.OutputTarget.Handle):
+            write = into.write
+        else:
+            write = lambda record: into.write("\t".join(record) + "\n")  # noqa: E731
+
+        return BatchTarget(
+            tgtfilename=target_file,
+            tgtcolmap=tgtcolmap,
+            write=write,
+            template=template,
+            columns=columns,
+            auto_num_index=(None if auto_num_col is None else tgtcolmap[auto_num_col]),
+            person_id_index=tgtcolmap[target_meta["person_id_col"]],
+            person_id_copy=person_id_copy,
+            date_source_index=date_source_index,
+            date_ops=date_ops,
+        )
+
+    def _templates(
+        self, target: BatchTarget, column: BatchColumn, value: str
+    ) -> list[list[str]] | None:
+        """build the records for one value of a column - without the person or dates. None if there aren't any"""
+
+        if not valid_value(value):
+            return INVALID
+
+        concept_mapping = column.concept_mapping
+        if concept_mapping is None:
+            return None
+
+        value_mapping = get_value_mapping(concept_mapping, value)
+        if not value_mapping and not concept_mapping.original_value_fields:
+            return None
+
+        templates = []
+        for concept_combo in generate_combinations(value_mapping):
+            record = target.template.copy()
+            for dest_field, concept_id in concept_combo.items():
+                if dest_field in target.tgtcolmap:
+                    record[target.tgtcolmap[dest_field]] = str(concept_id)
+            for dest_field in concept_mapping.original_value_fields:
+                if dest_field in target.tgtcolmap:
+                    record[target.tgtcolmap[dest_field]] = value
+            templates.append(record)
+
+        return templates if templates else None
+
+    def process(self, rows: list[list[str]]) -> tuple[dict[str, int], int]:
+        """map a chunk of rows; returns the output counts and the rejected count"""
+
+        source_filename = self._source_filename
+        datetime_col_idx = self._datetime_col_idx
+
+        output_counts: dict[str, int] = {}
+        rejected_count = 0
+
+        # (source, fieldname, tablename, concept_id, additional, count_type) -> count
+        tally: Counter[tuple[str, str, str, str, str, str]] = Counter()
+        # (target, field, concept) -> [a record, count]
+        outputs_tally: dict[tuple[str, str, str], list] = {}
+
+        # normalise the dates first - the date column could be mapped too
+        valid_rows = []
+        for row in rows:
+            fulldate = normalise_to8601(row[datetime_col_idx])
+            if fulldate is None:
+                tally[
+                    (source_filename, "all", "all", "all", "", "input_date_fields")
+                ] += 1
+                rejected_count += 1
+                continue
+            row[datetime_col_idx] = fulldate
+            valid_rows.append(row)
+        tally[(source_filename, "all", "all", "all", "", "input_count")] += len(rows)
+
+        # look up each distinct value of each column once
+        lookups: dict[str, list[list[list[list[str]] | None]]] = {}
+        for target in self._targets:
+            if isinstance(target, str):
+                continue
+            lookups[target.tgtfilename] = []
+            for column in target.columns:
+                cache: dict[str, list[list[str]] | None] = {}
+                looked = []
+                for row in valid_rows:
+                    value = row[column.source_index]
+                    if value in cache:
+                        looked.append(cache[value])
+                    else:
+                        looked.append(
+                            cache.setdefault(
+                                value, self._templates(target, column, value)
+                            )
+                        )
+                lookups[target.tgtfilename].append(looked)
+
+        # parsed dates for the date part fields
+        dates: dict[str, datetime | None] = {}
+
+        # write the records out in the row engine's order
+        for i, row in enumerate(valid_rows):
+            for target in self._targets:
+                if isinstance(target, str):
+                    count, rejected = self._processor._process_row_for_target_stream(
+                        source_filename,
+                        row,
+                        self._input_column_map,
+                        target,
+                        self._file_meta,
+                    )
+                    output_counts[target] = output_counts.get(target, 0) + count
+                    rejected_count += rejected
+                    continue
+
+                target_count = 0
+                for column, looked in zip(target.columns, lookups[target.tgtfilename]):
+                    templates = looked[i]
+
+                    if templates is INVALID:
+                        tally[
+                            (
+                                source_filename,
+                                column.field,
+                                target.tgtfilename,
+                                "all",
+                                "",
+                                "invalid_source_fields",
+                            )
+                        ] += 1
+                        rejected_count += 1
+                        continue
+
+                    if templates is None:
+                        rejected_count += 1
+                        continue
+
+                    written = self._write(
+                        target, column, row, templates, dates, tally, outputs_tally
+                    )
+                    if written is None:
+                        rejected_count += 1
+                    else:
+                        target_count += written
+
+                output_counts[target.tgtfilename] = (
+                    output_counts.get(target.tgtfilename, 0) + target_count
+                )
+
+        metrics = self._context.metrics
+        for key, count in tally.items():
+            metrics.increment_key_count(*key, count=count)
+        for (target_file, field, _), (record, count) in outputs_tally.items():
+            metrics.increment_with_datacol(
+                source_path=source_filename,
+                target_file=target_file,
+                datacol=field,
+                out_record=record,
+                count=count,
+            )
+
+        return output_counts, rejected_count
+
+    def _write(
+        self,
+        target: BatchTarget,
+        column: BatchColumn,
+        row: list[str],
+        templates: list[list[str]],
+        dates: dict[str, datetime | None],
+        tally: Counter,
+        outputs_tally: dict[tuple[str, str, str], list],
+    ) -> int | None:
+        """write the records for one column of one row. None if the column was rejected - which can happen after some were written"""
+
+        context = self._context
+        record_numbers = context.record_numbers
+        person_lookup = context.person_lookup
+        tgtfilename = target.tgtfilename
+
+        count = 0
+        for template in templates:
+            record = template.copy()
+
+            if target.person_id_copy is not None:
+                source_index, target_index = target.person_id_copy
+                record[target_index] = row[source_index]
+
+            if target.date_source_index is not None:
+                source_date = row[target.date_source_index]
+                if not self._apply_dates(
+                    target, column, record, source_date, dates, tally
+                ):
+                    logger.warning(f"Failed to apply date mappings for {column.field}")
+                    return None
+
+            if target.auto_num_index is not None:
+                record[target.auto_num_index] = str(record_numbers.next_id(tgtfilename))
+
+            assigned_person_id = person_lookup.get(record[target.person_id_index])
+            if assigned_person_id is None:
+                tally[
+                    (
+                        self._source_filename,
+                        "all",
+                        tgtfilename,
+                        "all",
+                        "",
+                        "invalid_person_ids",
+                    )
+                ] += 1
+                return None
+            record[target.person_id_index] = assigned_person_id
+
+            key = (tgtfilename, column.field, record[2])
+            if key in outputs_tally:
+                outputs_tally[key][1] += 1
+            else:
+                outputs_tally[key] = [record, 1]
+
+            target.write(record)
+            count += 1
+
+        return count
+
+    def _apply_dates(
+        self,
+        target: BatchTarget,
+        column: BatchColumn,
+        record: list[str],
+        source_date: str,
+        dates: dict[str, datetime | None],
+        tally: Counter,
+    ) -> bool:
+        for op in target.date_ops:
+            if op[0] == DATE_SIMPLE:
+                record[op[1]] = source_date
+            elif op[0] == DATE_LINKED:
+                record[op[1]] = source_date
+                if op[2] is not None:
+                    record[op[2]] = source_date[:10]
+            else:
+                day = source_date.split(" ")[0]
+                if day not in dates:
+                    dates[day] = get_datetime_value(day)
+                dt = dates[day]
+                if dt is None:
+                    tally[
+                        (
+                            self._source_filename,
+                            column.field,
+                            target.tgtfilename,
+                            "all",
+                            "",
+                            "invalid_date_fields",
+                        )
+                    ] += 1
+                    logger.warning(f"Invalid date fields: {column.field}")
+                    return False
+                if op[2] is not None:
+                    record[op[2]] = str(dt.year)
+                if op[3] is not None:
+                    record[op[3]] = str(dt.month)
+                if op[4] is not None:
+                    record[op[4]] = str(dt.day)
+                record[op[1]] = source_date
+        return True
@@ -0,0 +1,107 @@
+"""
+saves where a v2 run had got to every so often - so that a run that dies part way through can be resumed rather than started again.
+
+a checkpoint holds the rows mapped from each input (as Watermarks), the inputs that are finished, the ids used, the people whose person record has been written, the Metrics, and, where each output had got to.
+the first is taken once the outputs are open - before any rows are mapped. the outputs are flushed (and sql committed) before each checkpoint is written, and from the first on sql is only committed at the checkpoints. on resume, anything written to a csv after it is cut off (sql was never committed) and the outputs are appended to.
+
+with --workers a checkpoint is taken after each shard is merged; a resumed run maps the rest of a half-finished input as one shard
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from carrottransform.tools import outputs
+from carrottransform.tools.logger import logger_setup
+from carrottransform.tools.types import ProcessingContext
+
+logger = logger_setup()
+
+
+@dataclass
+class Checkpoint:
+    """where a run had got to"""
+
+    # the rows mapped from each input
+    rows: dict[str, int]
+
+    # the inputs that have been mapped to the end
+    finished: list[str]
+
+    last_used_ids: dict[str, int]
+
+    # the people whose person record has been written
+    persons: dict[str, Any]
+
+    metrics: dict[str, Any]
+
+    # where each output had got to - the size of the csv files
+    outputs: dict[str, int]
+
+    def save(self, path: Path) -> None:
+        """write the checkpoint - replacing the last one in one step"""
+        temp = path.with_name(path.name + ".tmp")
+        with temp.open("w", encoding="utf-8") as file:
+            json.dump(asdict(self), file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, path)
+
+    @staticmethod
+    def load(path: Path) -> "Checkpoint":
+        with path.open(encoding="utf-8") as file:
+            return Checkpoint(**json.load(file))
+
+
+class Checkpointer:
+    """takes a checkpoint after every `every` rows have been mapped"""
+
+    def __init__(
+        self,
+        path: Path,
+        every: int,
+        output: outputs.OutputTarget,
+        resumed: Checkpoint | None = None,
+    ):
+        self._path = path
+        self._every = every
+        self._output = output
+        self._rows = 0
+        self.finished: list[str] = [] if resumed is None else list(resumed.finished)
+
+    def tick(self, context: ProcessingContext, rows: int = 1) -> None:
+        """count some mapped rows - taking a checkpoint if enough have been"""
+        self._rows += rows
+        if self._every <= self._rows:
+            self.save(context)
+
+    def finish(self, context: ProcessingContext, source_filename: str) -> None:
+        """note that an input has been mapped to the end"""
+        self.finished.append(source_filename)
+        self.save(context)
+
+    def save(self, context: ProcessingContext) -> None:
+        self._rows = 0
+
+        watermarks = context.watermarks
+        if watermarks is None:
+            raise RuntimeError("checkpoints need the watermarks to count the rows")
+
+        # the outputs need to be on disk before the checkpoint says they are
+        positions = self._output.mark()
+
+        Checkpoint(
+            rows=watermarks.to_dict(),
+            finished=self.finished,
+            last_used_ids=context.record_numbers.last_used(),
+            persons=context.processed_persons.to_dict(),
+            metrics=context.metrics.to_dict(),
+            outputs=positions,
+        ).save(self._path)
+        logger.info(f"saved a checkpoint into {self._path}")
+
+    def done(self) -> None:
+        """the run finished - so there's nothing to resume"""
+        self._path.unlink(missing_ok=True)
@@ -0,0 +1,331 @@
+"""
+compiles the v1 mapping rules for a single input file into a "plan" before the mapstream row loop starts.
+
+`core.get_target_records()` rebuilds the `srcfile~field~value~target` keys, re-fetches the DDL derived field dicts, and re-resolves column names for every (row, target table, data column).
+none of that depends on the row, so, here it's done once per input file and the row loop is left with indexed lookups.
+
+the records produced are the same as `get_target_records()` produces - including the order they're produced in.
+"""
+
+from dataclasses import dataclass
+
+from case_insensitive_dict import CaseInsensitiveDict
+
+import carrottransform.tools as tools
+from carrottransform.tools.date_helpers import get_datetime_value
+from carrottransform.tools.mappingrules import MappingRules
+from carrottransform.tools.omopcdm import OmopCDM
+
+# opcodes for the compiled field operations. each op is a tuple starting with one of these
+OP_SET = 0  # (OP_SET, target_index, term) - write a constant (like a concept id)
+OP_COPY = 1  # (OP_COPY, target_index, source_index) - copy the source value across
+OP_LOOKUP = 2  # (OP_LOOKUP, source_index, {value: ops}) - person term mappings
+OP_DATE_PARTS = 3  # (OP_DATE_PARTS, source_index, target_index, year, month, day)
+OP_DATE_LINKED = 4  # (OP_DATE_LINKED, source_index, target_index, date_only_index)
+
+Ops = tuple[tuple, ...]
+
+
+@dataclass
+class ColumnPlan:
+    """the compiled rules for one data column of the input mapped into one target table"""
+
+    srcfilename: str
+    srcfield: str
+    tgtfilename: str
+    source_index: int
+
+    # records built for every valid value - the person rules or the `srcfile~field~target` rules
+    leading: tuple[Ops, ...]
+    trailing: tuple[Ops, ...]
+
+    # records built only for specific values - the `srcfile~field~value~target` rules
+    by_value: dict[str, tuple[Ops, ...]]
+
+    # set if records are built regardless of the value (and may be none at all)
+    always_build: bool
+
+    # the "blank" record for the target table with the not-null numeric fields set to "0"
+    template: list[str]
+
+    def build(
+        self, srcdata: list[str], metrics: tools.metrics.Metrics
+    ) -> tuple[bool, list[list[str]]]:
+        """build all target records for this column of the row. matches `get_target_records()`"""
+
+        value = str(srcdata[self.source_index])
+
+        if value.strip() == "":
+            metrics.increment_key_count(
+                source=self.srcfilename,
+                fieldname=self.srcfield,
+                tablename=self.tgtfilename,
+                concept_id="all",
+                additional="",
+                count_type="invalid_source_fields",
+            )
+            return False, []
+
+        matched = self.by_value.get(value)
+
+        if matched is None:
+            if not self.always_build:
+                return False, []
+            elements = self.leading + self.trailing
+        else:
+            elements = self.leading + matched + self.trailing
+
+        records = []
+        for ops in elements:
+            record = self.template.copy()
+            if self._apply(ops, record, srcdata, metrics):
+                records.append(record)
+
+        return True, records
+
+    def _apply(
+        self,
+        ops: Ops,
+        record: list[str],
+        srcdata: list[str],
+        metrics: tools.metrics.Metrics,
+    ) -> bool:
+        """run the ops for one record. returns False if the record should be dropped"""
+
+        valid = True
+        for op in ops:
+            code = op[0]
+            if code == OP_SET:
+                record[op[1]] = op[2]
+            elif code == OP_COPY:
+                record[op[1]] = srcdata[op[2]]
+            elif code == OP_LOOKUP:
+                for inner in op[2].get(str(srcdata[op[1]]), ()):
+                    if inner[0] == OP_SET:
+                        record[inner[1]] = inner[2]
+                    else:
+                        record[inner[1]] = srcdata[inner[2]]
+            elif code == OP_DATE_LINKED:
+                source_date = srcdata[op[1]]
+                record[op[2]] = source_date
+                record[op[3]] = source_date[:10]
+            else:
+                # OP_DATE_PARTS
+                source_date = srcdata[op[1]]
+                dt = get_datetime_value(source_date.split(" ")[0])
+                if dt is None:
+                    metrics.increment_key_count(
+                        source=self.srcfilename,
+                        fieldname=self.srcfield,
+                        tablename=self.tgtfilename,
+                        concept_id="all",
+                        additional="",
+                        count_type="invalid_date_fields",
+                    )
+                    valid = False
+                else:
+                    record[op[3]] = str(dt.year)
+                    record[op[4]] = str(dt.month)
+                    record[op[5]] = str(dt.day)
+                    record[op[2]] = source_date
+        return valid
+
+
+@dataclass
+class TargetPlan:
+    """the compiled rules for one target table fed by the input file"""
+
+    tgtfilename: str
+    auto_num_index: int | None
+    person_id_index: int
+    columns: list[ColumnPlan]
+
+
+@dataclass
+class SourcePlan:
+    """the compiled rules for one input file"""
+
+    srcfilename: str
+    targets: list[TargetPlan]
+
+
+def compile_source_plan(
+    srcfilename: str,
+    column_headers: list[str],
+    mappingrules: MappingRules,
+    omopcdm: OmopCDM,
+) -> SourcePlan:
+    """compile the rules for `srcfilename` given the column headers read from it"""
+
+    srccolmap = omopcdm.get_column_map(column_headers)
+    tgtfiles, rulesmap = mappingrules.parse_rules_src_to_tgt(srcfilename)
+    dflist = mappingrules.get_infile_data_fields(srcfilename)
+
+    targets = []
+    for tgtfilename in tgtfiles:
+        tgtcolmap = omopcdm.get_omop_column_map(tgtfilename)
+
+        auto_num_col = omopcdm.get_omop_auto_number_field(tgtfilename)
+        person_id_col = omopcdm.get_omop_person_id_field(tgtfilename)
+
+        datacols = dflist.get(tgtfilename, list(column_headers))
+
+        # the person table only ever uses the first data column
+        if tgtfilename == "person":
+            datacols = datacols[:1]
+
+        columns = [
+            _compile_column(
+                srcfilename,
+                datacol,
+                tgtfilename,
+                rulesmap,
+                srccolmap,
+                tgtcolmap,
+                omopcdm,
+            )
+            for datacol in datacols
+        ]
+
+        targets.append(
+            TargetPlan(
+                tgtfilename=tgtfilename,
+                auto_num_index=(
+                    None if auto_num_col is None else tgtcolmap[auto_num_col]
+                ),
+                person_id_index=tgtcolmap[person_id_col],
+                columns=columns,
+            )
+        )
+
+    return SourcePlan(srcfilename=srcfilename, targets=targets)
+
+
+def _compile_column(
+    srcfilename: str,
+    srcfield: str,
+    tgtfilename: str,
+    rulesmap: dict[str, list[dict]],
+    srccolmap: CaseInsensitiveDict[str, int],
+    tgtcolmap: CaseInsensitiveDict[str, int],
+    omopcdm: OmopCDM,
+) -> ColumnPlan:
+    """compile the rules for one input column into one target table"""
+
+    date_col_data = omopcdm.get_omop_datetime_linked_fields(tgtfilename)
+    date_component_data = omopcdm.get_omop_date_field_components(tgtfilename)
+
+    def compile_elements(dictkey: str) -> tuple[Ops, ...]:
+        return tuple(
+            _compile_element(
+                out_data_elem,
+                tgtfilename,
+                srccolmap,
+                tgtcolmap,
+                date_col_data,
+                date_component_data,
+            )
+            for out_data_elem in rulesmap.get(dictkey, [])
+        )
+
+    srckey = f"{srcfilename}~{srcfield}~{tgtfilename}"
+    trailing = compile_elements(srckey) if srckey in rulesmap else ()
+
+    leading: tuple[Ops, ...] = ()
+    by_value: dict[str, tuple[Ops, ...]] = {}
+    if tgtfilename == "person":
+        leading = compile_elements(srcfilename + "~person")
+    else:
+        # the full keys are `srcfile~field~value~target` - pull the values out of the ones for this field
+        prefix = f"{srcfilename}~{srcfield}~"
+        suffix = f"~{tgtfilename}"
+        for key in rulesmap:
+            if (
+                len(key) >= len(prefix) + len(suffix)
+                and key.startswith(prefix)
+                and key.endswith(suffix)
+            ):
+                by_value[key[len(prefix) : -len(suffix)]] = compile_elements(key)
+
+    template = [""] * len(tgtcolmap)
+    for req_integer in omopcdm.get_omop_notnull_numeric_fields(tgtfilename):
+        template[tgtcolmap[req_integer]] = "0"
+
+    return ColumnPlan(
+        srcfilename=srcfilename,
+        srcfield=srcfield,
+        tgtfilename=tgtfilename,
+        source_index=srccolmap[srcfield],
+        leading=leading,
+        trailing=trailing,
+        by_value=by_value,
+        always_build=tgtfilename == "person" or srckey in rulesmap,
+        template=template,
+    )
+
+
+def _compile_element(
+    out_data_elem: dict,
+    tgtfilename: str,
+    srccolmap: CaseInsensitiveDict[str, int],
+    tgtcolmap: CaseInsensitiveDict[str, int],
+    date_col_data: dict[str, str],
+    date_component_data: dict[str, dict[str, str]],
+) -> Ops:
+    """compile one rule element (one output record) into a sequence of ops"""
+
+    def assign(output_col_data: str, infield: str) -> tuple:
+        if "~" in output_col_data:
+            outcol, term = output_col_data.split("~")
+            return (OP_SET, tgtcolmap[outcol], term)
+        return (OP_COPY, tgtcolmap[output_col_data], srccolmap[infield])
+
+    ops: list[tuple] = []
+    for infield, outfield_list in out_data_elem.items():
+        if tgtfilename == "person" and isinstance(outfield_list, dict):
+            ops.append(
+                (
+                    OP_LOOKUP,
+                    srccolmap[infield],
+                    {
+                        value: tuple(
+                            assign(output_col_data, infield)
+                            for output_col_data in outputs
+                        )
+                        for value, outputs in outfield_list.items()
+                    },
+                )
+            )
+            continue
+
+        for output_col_data in outfield_list:
+            ops.append(assign(output_col_data, infield))
+
+        if not outfield_list:
+            continue
+
+        # the date handling only ever looked at the last output column for the field
+        output_col_data = outfield_list[-1]
+        if output_col_data in date_component_data:
+            components = date_component_data[output_col_data]
+            ops.append(
+                (
+                    OP_DATE_PARTS,
+                    srccolmap[infield],
+                    tgtcolmap[output_col_data],
+                    tgtcolmap[components["year"]],
+                    tgtcolmap[components["month"]],
+                    tgtcolmap[components["day"]],
+                )
+            )
+        elif output_col_data in date_col_data:
+            ops.append(
+                (
+                    OP_DATE_LINKED,
+                    srccolmap[infield],
+                    tgtcolmap[output_col_data],
+                    tgtcolmap[date_col_data[output_col_data]],
+                )
+            )
+
+    return tuple(ops)
@@ -0,0 +1,198 @@
+"""
+reads compressed inputs (`.gz`, `.bz2` or `.zst`) as a stream - without decompressing them to disk first - and writes compressed outputs (`.gz` or `.zst`).
+
+the decompressing is done on a thread that stays a few chunks ahead of the reader, so it overlaps with the mapping. the compressing is done on a thread a few chunks behind the writer.
+zstd needs the zstandard package - install carrot_transform[zstd]
+"""
+
+import bz2
+import gzip
+import io
+import queue
+import threading
+from typing import BinaryIO, Callable
+
+# how much is decompressed at a time, and, how many of those can be waiting to be read
+CHUNK_SIZE = 1024 * 1024
+CHUNKS_AHEAD = 4
+
+# how much the reader takes from the read-ahead at a time
+READ_SIZE = 64 * 1024
+
+
+def zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise Exception(
+            ".zst files need zstandard - install carrot_transform[zstd]"
+        ) from e
+    return zstandard
+
+
+def zstd_reader(raw: BinaryIO) -> BinaryIO:
+    return (
+        zstandard()
+        .ZstdDecompressor()
+        .stream_reader(raw, read_across_frames=True, closefd=True)
+    )
+
+
+def zstd_writer(raw: BinaryIO) -> BinaryIO:
+    return zstandard().ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+
+
+DECOMPRESSORS: dict[str, Callable[[BinaryIO], io.BufferedIOBase | BinaryIO]] = {
+    ".gz": lambda raw: gzip.GzipFile(fileobj=raw),
+    ".bz2": lambda raw: bz2.BZ2File(raw),
+    ".zst": zstd_reader,
+}
+
+SUFFIXES = tuple(DECOMPRESSORS.keys())
+
+COMPRESSORS: dict[str, Callable[[BinaryIO], io.BufferedIOBase | BinaryIO]] = {
+    ".gz": lambda raw: gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6),
+    ".zst": zstd_writer,
+}
+
+
+class ReadAhead(io.RawIOBase):
+    """reads chunks from a stream on a thread - keeping up to `ahead` of them ready. the stream (and what it reads from) is closed once it's done with"""
+
+    def __init__(
+        self,
+        stream: io.BufferedIOBase | BinaryIO,
+        raw: BinaryIO,
+        ahead: int = CHUNKS_AHEAD,
+    ):
+        self._stream = stream
+        self._raw = raw
+        self._chunks: queue.Queue[bytes | BaseException] = queue.Queue(ahead)
+
+        # the chunk being read, and, how far into it the reads have got - slicing the bytes would copy the rest of it each time
+        self._chunk = memoryview(b"")
+        self._offset = 0
+        self._done = False
+        self._closing = threading.Event()
+        self._thread = threading.Thread(
+            target=self._read, name="read-ahead", daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item: bytes | BaseException) -> bool:
+        while not self._closing.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self) -> None:
+        try:
+            while True:
+                chunk = self._stream.read(CHUNK_SIZE)
+                if not self._put(chunk) or not chunk:
+                    return
+        except BaseException as e:
+            self._put(e)
+        finally:
+            self._stream.close()
+            self._raw.close()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._chunk) <= self._offset:
+            if self._done:
+                return 0
+            chunk = self._chunks.get()
+            if isinstance(chunk, BaseException):
+                self._done = True
+                raise chunk
+            if not chunk:
+                self._done = True
+                return 0
+            self._chunk = memoryview(chunk)
+            self._offset = 0
+
+        count = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:count] = self._chunk[self._offset : self._offset + count]
+        self._offset += count
+        return count
+
+    def close(self) -> None:
+        if not self.closed:
+            self._closing.set()
+            self._thread.join()
+        super().close()
+
+
+def suffix_of(name: str) -> str | None:
+    """the compression suffix a file or object name ends with - if any"""
+    for suffix in SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def decompressed(raw: BinaryIO, suffix: str) -> io.BufferedReader:
+    """decompress a binary stream (on a thread) - this closes the stream when it's finished with"""
+    return io.BufferedReader(ReadAhead(DECOMPRESSORS[suffix](raw), raw), READ_SIZE)
+
+
+class WriteBehind:
+    """writes chunks to a stream on a thread - with up to `behind` of them waiting. the stream (and what it writes to) is closed by `close()`"""
+
+    def __init__(
+        self,
+        stream: io.BufferedIOBase | BinaryIO,
+        raw: BinaryIO,
+        behind: int = CHUNKS_AHEAD,
+    ):
+        self._stream = stream
+        self._raw = raw
+        self._chunks: queue.Queue[bytes | None] = queue.Queue(behind)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(
+            target=self._write, name="write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def _write(self) -> None:
+        try:
+            while (chunk := self._chunks.get()) is not None:
+                # after a failure the chunks are dropped - so the writer doesn't block
+                if self._error is None:
+                    try:
+                        self._stream.write(chunk)
+                    except BaseException as e:
+                        self._error = e
+        finally:
+            try:
+                self._stream.close()
+                self._raw.close()
+            except BaseException as e:
+                self._error = self._error or e
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def write(self, chunk: bytes) -> None:
+        self._check()
+        self._chunks.put(chunk)
+
+    def close(self) -> None:
+        """write what's left, and, close the stream - raising anything that went wrong"""
+        self._chunks.put(None)
+        self._thread.join()
+        self._check()
+
+
+def compressing(raw: BinaryIO, suffix: str | None) -> WriteBehind:
+    """write to a binary stream (on a thread) compressing it unless the suffix is None"""
+    if suffix is None:
+        return WriteBehind(raw, raw)
+    return WriteBehind(COMPRESSORS[suffix](raw), raw)
@@ -1,4 +1,5 @@
 import datetime
+import functools
 import re
 
 from carrottransform.tools.logger import logger_setup
@@ -28,22 +29,54 @@ def get_datetime_value(item: str) -> datetime.datetime | None:
     return None
 
 
+# the same handful of dates tend to be repeated over and over, so, the results are cached
+NORMALISE_CACHE_SIZE = 65536
+
+_DATE_YMD = re.compile(r"(?P<year>\d{4})[-/](?P<month>\d{2})[-/](?P<day>\d{2})")
+_DATE_DMY = re.compile(r"(?P<day>\d{2})[-/](?P<month>\d{2})[-/](?P<year>\d{4})")
+_TIME = re.compile(r"(?P<hour>\d{2}):(?P<minute>\d{2})(:(?P<second>\d{2})(\.\d{6})?)?")
+
+# values that are already normalised (or are missing the time) don't need to be taken apart
+# ... these are ascii only; \d would let other digits through that the slow path converts
+_ISO_DATETIME = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}")
+_ISO_DATE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+
+
 def normalise_to8601(item: str) -> str | None:
     """parses, normalises, and formats a date value using regexes
 
     could use just one regex but that seems bad.
     """
 
+    value = _normalise_to8601(item)
+    if value is None:
+        logger.warning(f"{item} couldn't be normalised to ISO 8601 date format")
+    return value
+
+
+def normalise_cache_info() -> functools._CacheInfo:
+    """the hits/misses of the normalise_to8601() cache"""
+    return _normalise_to8601.cache_info()
+
+
+def normalise_cache_clear() -> None:
+    _normalise_to8601.cache_clear()
+
+
+@functools.lru_cache(maxsize=NORMALISE_CACHE_SIZE)
+def _normalise_to8601(item: str) -> str | None:
+    if _ISO_DATETIME.fullmatch(item):
+        return item
+    if _ISO_DATE.fullmatch(item):
+        return item + " 00:00:00"
+
     both = item.split(" ")
 
-    match = re.match(r"(?P<year>\d{4})[-/](?P<month>\d{2})[-/](?P<day>\d{2})", both[0])
+    match = _DATE_YMD.match(both[0])
     if not match:
-        match = re.match(
-            r"(?P<day>\d{2})[-/](?P<month>\d{2})[-/](?P<year>\d{4})", both[0]
-        )
+        match = _DATE_DMY.match(both[0])
 
     if not match:
-        logger.warning(f"{item} couldn't be normalised to ISO 8601 date format")
         return None
     data = match.groupdict()
     year, month, day = data["year"], data["month"], data["day"]
@@ -55,9 +88,7 @@ def normalise_to8601(item: str) -> str | None:
     value += " "
 
     if 2 == len(both):
-        match = re.match(
-            r"(?P<hour>\d{2}):(?P<minute>\d{2})(:(?P<second>\d{2})(\.\d{6})?)?", both[1]
-        )
+        match = _TIME.match(both[1])
         if match:
             data = match.groupdict()
             hour, minute, second = data["hour"], data["minute"], data["second"]
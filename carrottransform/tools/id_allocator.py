@@ -0,0 +1,74 @@
+"""
+hands out the numbers for the auto-number columns (measurement_id, observation_id, etc.)
+
+ids are either taken one at a time with `next_id()` or as a contiguous block with `allocate()`.
+blocks are handed out in the order they're asked for, and, asking again for the same (table, shard) gives back the same block.
+so, as long as the shards are allocated in a fixed order, the same inputs get the same ids no matter how the work was split up.
+
+the high-water marks (the last id used in each table) are loaded/saved in the `--last-used-ids-file` format so that a later run can carry on from where this one stopped.
+"""
+
+from collections.abc import Iterable
+from pathlib import Path
+
+from carrottransform.tools.person_helpers import load_last_used_ids
+
+
+class IdAllocator:
+    """tracks the next auto-number id for each target table"""
+
+    def __init__(self, tables: Iterable[str] = ()):
+        self._next: dict[str, int] = {table: 1 for table in tables}
+        self._blocks: dict[tuple[str, int], range] = {}
+
+    @staticmethod
+    def load(last_used_ids_file: Path, tables: Iterable[str] = ()) -> "IdAllocator":
+        """start after the ids listed in a `tablename\\tlast_used_id` file"""
+        allocator = IdAllocator(tables)
+        load_last_used_ids(last_used_ids_file, allocator._next)
+        return allocator
+
+    @staticmethod
+    def restore(last_used: dict[str, int], tables: Iterable[str] = ()) -> "IdAllocator":
+        """start after the high-water marks that `last_used()` returned"""
+        allocator = IdAllocator(tables)
+        for table, last in last_used.items():
+            allocator._next[table] = last + 1
+        return allocator
+
+    def next_id(self, table: str) -> int:
+        """take the next id for the table"""
+        value = self._next.get(table, 1)
+        self._next[table] = value + 1
+        return value
+
+    def allocate(self, table: str, count: int, shard: int) -> range:
+        """reserve `count` contiguous ids for one shard's records in the table"""
+
+        key = (table, shard)
+        if key in self._blocks:
+            block = self._blocks[key]
+            if len(block) != count:
+                raise ValueError(
+                    f"{shard=} already has {len(block)} ids for {table=} but asked for {count}"
+                )
+            return block
+
+        if count < 0:
+            raise ValueError(f"can't allocate {count=} ids for {table=}")
+
+        start = self._next.get(table, 1)
+        block = range(start, start + count)
+        self._next[table] = block.stop
+        self._blocks[key] = block
+        return block
+
+    def last_used(self) -> dict[str, int]:
+        """the high-water mark for each table - 0 if none have been used"""
+        return {table: value - 1 for table, value in self._next.items()}
+
+    def save(self, last_used_ids_file: Path) -> None:
+        """write the high-water marks in the format `load()` reads"""
+        with last_used_ids_file.open("w", encoding="utf-8") as file:
+            for table, last in self.last_used().items():
+                file.write(f"{table}\t{last}\n")
@@ -260,6 +260,41 @@ class MappingRules:
 
         return datetime_source, person_id_source
 
+    def get_infile_columns(self, infilename: str) -> list[str]:
+        """all of the input file's columns that the rules read - the data fields, the dates and person ids (of every table the input is mapped to) and (for v1) any other field an output is copied from"""
+
+        columns: list[str] = []
+
+        def add(column: str) -> None:
+            if column and column not in columns:
+                columns.append(column)
+
+        for data_fields in self.get_infile_data_fields(infilename).values():
+            for data_field in data_fields:
+                add(data_field)
+
+        if self.is_v2_format:
+            # each table can take its date (and person id) from a different column
+            for table_mappings in self.v2_mappings.values():
+                mapping = table_mappings.get(infilename)
+                if mapping is None:
+                    continue
+                if mapping.date_mapping:
+                    add(mapping.date_mapping.source_field)
+                if mapping.person_id_mapping:
+                    add(mapping.person_id_mapping.source_field)
+        else:
+            for column in self.get_infile_date_person_id(infilename):
+                add(column)
+
+            _, outdata = self.parse_rules_src_to_tgt(infilename)
+            for outfield_data in outdata.values():
+                for outfield_elem in outfield_data:
+                    for infield in outfield_elem:
+                        add(infield)
+
+        return columns
+
     def get_person_source_field_info(self, tgtfilename: str):
         if self.is_v2_format:
             return self._get_person_source_field_info_v2(tgtfilename)
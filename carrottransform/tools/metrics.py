@@ -1,52 +1,43 @@
-from dataclasses import dataclass, field
-from typing import Dict
+import heapq
+import json
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Tuple
 
 from carrottransform.tools.logger import logger_setup
 
+if TYPE_CHECKING:
+    from carrottransform.tools import outputs
+
 logger = logger_setup()
 
 
-@dataclass
-class DataKey:
-    source: str
-    fieldname: str
-    tablename: str
-    concept_id: str
-    additional: str
+# the kinds of count kept for each key - in the order that they're held in the key's list
+COUNT_TYPES = (
+    "input_count",
+    "input_date_fields",
+    "invalid_person_ids",
+    "invalid_date_fields",
+    "invalid_source_fields",
+    "output_count",
+)
+COUNT_SLOTS = {count_type: slot for slot, count_type in enumerate(COUNT_TYPES)}
+OUTPUT_COUNT = COUNT_SLOTS["output_count"]
 
-    def __str__(self) -> str:
-        """
-        The original implementation used strings as keys, then split by `~`.
-        This is here in case that representation is needed somewhere
-        """
-        return f"{self.source}~{self.fieldname}~{self.tablename}~{self.concept_id}~{self.additional}"
-
-    def __hash__(self) -> int:
-        """
-        The DataKey is used as a key for a dictionary of key counts
-        """
-        return hash(
-            (
-                self.source,
-                self.fieldname,
-                self.tablename,
-                self.concept_id,
-                self.additional,
-            )
-        )
+# (source, fieldname, tablename, concept_id, additional)
+# plain tuples of strings are much cheaper to hash/compare than a dataclass; the strings cache their hashes
+CountKey = Tuple[str, str, str, str, str]
 
 
-@dataclass
-class CountData:
-    counts: dict[str, int] = field(default_factory=dict)
-
-    def increment(self, count_type: str):
-        if count_type not in self.counts:
-            self.counts[count_type] = 0
-        self.counts[count_type] += 1
-
-    def get_count(self, count_type: str, default: int = 0):
-        return self.counts.get(count_type, default)
+def key_str(key: CountKey) -> str:
+    """
+    The original implementation used strings as keys, then split by `~`.
+    The summary is still sorted by this
+    """
+    source, fieldname, tablename, concept_id, additional = key
+    return f"{source}~{fieldname}~{tablename}~{concept_id}~{additional}"
 
 
 @dataclass
@@ -65,9 +56,9 @@ class MapstreamSummaryRow:
     invalid_source_fields: int = 0
     output_count: int = 0
 
-    def to_tsv_row(self) -> str:
-        """Convert the row to a tab-separated string"""
-        row_list = [
+    def to_list(self) -> list[str]:
+        """Convert the row to the values for a summary OutputTarget"""
+        return [
             str(col)
             for col in [
                 self.dataset_name,
@@ -83,14 +74,17 @@ class MapstreamSummaryRow:
                 self.output_count,
             ]
         ]
+
+    def to_tsv_row(self) -> str:
+        """Convert the row to a tab-separated string"""
         # If python gets updated, you can move the row_str expression into the f-string
-        row_str = "\t".join(row_list)
+        row_str = "\t".join(self.to_list())
         return f"{row_str}\n"
 
     @classmethod
-    def get_header(cls) -> str:
-        """Return the TSV header row"""
-        header = [
+    def get_header_list(cls) -> list[str]:
+        """Return the column names"""
+        return [
             "dsname",
             "source",
             "source_field",
@@ -103,7 +97,11 @@ class MapstreamSummaryRow:
             "invalid_source",
             "outcount",
         ]
-        header_str = "\t".join(header)
+
+    @classmethod
+    def get_header(cls) -> str:
+        """Return the TSV header row"""
+        header_str = "\t".join(cls.get_header_list())
         return f"{header_str}\n"
 
 
@@ -115,8 +113,11 @@ class Metrics:
 
     def __init__(self, dataset_name, log_threshold=0):
         """
-        self.datasummary holds all the saved counts
+        self.counts holds all the saved counts - a list for each key, indexed by COUNT_SLOTS
+        self.outputs holds the output counts at the finest grain; the "all" levels are added up from these by roll_up()
         """
+        self.counts: dict[CountKey, list[int]] = {}
+        self.outputs: dict[CountKey, int] = {}
         self.datasummary = {}
         self.allcounts = {}
         self.dataset_name = dataset_name
@@ -178,15 +179,79 @@ class Metrics:
                 self.datasummary[dkey][counttype] = 0
             self.datasummary[dkey][counttype] += int(count_block[counttype])
 
+    def merge(self, other: "Metrics") -> None:
+        """
+        add the counts from another Metrics instance (such as one filled by a worker process) into this one
+        """
+        for key, other_counts in other.counts.items():
+            counts = self.counts.get(key)
+            if counts is None:
+                self.counts[key] = list(other_counts)
+            else:
+                for slot, count in enumerate(other_counts):
+                    counts[slot] += count
+
+        for key, count in other.outputs.items():
+            self.outputs[key] = self.outputs.get(key, 0) + count
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        the counts as lists of plain values that can be written out as json
+        """
+        return {
+            "dataset": self.dataset_name,
+            "count_types": list(COUNT_TYPES),
+            "counts": [list(key) + counts for key, counts in self.counts.items()],
+            "outputs": [list(key) + [count] for key, count in self.outputs.items()],
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, Any], log_threshold=0) -> "Metrics":
+        """
+        rebuild the Metrics that to_dict() was called on
+        """
+        metrics = Metrics(data["dataset"], log_threshold)
+
+        # the count types are named so that files still load if more are added
+        slots = [COUNT_SLOTS[count_type] for count_type in data["count_types"]]
+        for item in data["counts"]:
+            counts = [0] * len(COUNT_TYPES)
+            for slot, count in zip(slots, item[5:]):
+                counts[slot] = count
+            metrics.counts[tuple(item[:5])] = counts
+
+        for item in data["outputs"]:
+            metrics.outputs[tuple(item[:5])] = item[5]
+
+        return metrics
+
+    def save(self, path: Path) -> None:
+        """
+        write the counts to a json file - replacing it in one step so that a crash can't leave half a file
+        """
+        temp = path.with_name(path.name + ".tmp")
+        with temp.open("w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, separators=(",", ":"))
+        os.replace(temp, path)
+
+    @staticmethod
+    def load(path: Path, log_threshold=0) -> "Metrics":
+        """
+        read counts that were written by save()
+        """
+        with path.open(encoding="utf-8") as file:
+            return Metrics.from_dict(json.load(file), log_threshold)
+
     def increment_key_count(
-        self, source, fieldname, tablename, concept_id, additional, count_type
+        self, source, fieldname, tablename, concept_id, additional, count_type, count=1
     ):
-        dkey = DataKey(source, fieldname, tablename, concept_id, additional)
+        key = (source, fieldname, tablename, concept_id, additional)
 
-        if dkey not in self.datasummary:
-            self.datasummary[dkey] = CountData()
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * len(COUNT_TYPES)
 
-        self.datasummary[dkey].increment(count_type)
+        counts[COUNT_SLOTS[count_type]] += count
 
     def increment_with_datacol(
         self,
@@ -194,69 +259,52 @@ class Metrics:
         target_file: str,
         datacol: str,
         out_record: list[str],
+        count: int = 1,
     ) -> None:
-        # Are the parameters for DataKeys hierarchical?
-        # If so, a nested structure where a Source contains n Fields etc. and each has a method to sum its children would be better
-        # But I don't know if that's the desired behaviour
-
-        # A lot of these increment the same thing, so I have defined `increment_this`
-        def increment_this(
-            fieldname: str,
-            concept_id: str,
-            additional="",
-        ) -> None:
-            self.increment_key_count(
-                source=source_path,
-                fieldname=fieldname,
-                tablename=target_file,
-                concept_id=concept_id,
-                additional=additional,
-                count_type="output_count",
-            )
+        # only the finest grained count is kept here - the others are worked out in roll_up()
+        # the person table counts by the gender (and birth year) rather than the data column
+        if target_file == "person":
+            key = (source_path, datacol, target_file, out_record[1], out_record[2])
+        else:
+            key = (source_path, datacol, target_file, out_record[2], "")
 
-        self.increment_key_count(
-            source=source_path,
-            fieldname="all",
-            tablename="all",
-            concept_id="all",
-            additional="",
-            count_type="output_count",
-        )
+        self.outputs[key] = self.outputs.get(key, 0) + count
 
-        self.increment_key_count(
-            source="all",
-            fieldname="all",
-            tablename=target_file,
-            concept_id="all",
-            additional="",
-            count_type="output_count",
-        )
-        increment_this(fieldname="all", concept_id="all")
+    def roll_up(self) -> dict[CountKey, list[int]]:
+        """
+        the counts with the output counts added up into each of the levels they're reported at
+        """
+        summary = {key: list(counts) for key, counts in self.counts.items()}
+
+        for (
+            source,
+            datacol,
+            target,
+            concept_id,
+            additional,
+        ), count in self.outputs.items():
+            keys: list[CountKey] = [
+                (source, "all", "all", "all", ""),
+                ("all", "all", target, "all", ""),
+                (source, "all", target, "all", ""),
+            ]
 
-        if target_file == "person":
-            increment_this(fieldname="all", concept_id=out_record[1])
-            increment_this(
-                fieldname="all", concept_id=out_record[1], additional=out_record[2]
-            )
-        else:
-            increment_this(fieldname=datacol, concept_id=out_record[2])
-            increment_this(fieldname="all", concept_id=out_record[2])
-            self.increment_key_count(
-                source="all",
-                fieldname="all",
-                tablename=target_file,
-                concept_id=out_record[2],
-                additional="",
-                count_type="output_count",
-            )
-            self.increment_key_count(
-                source="all",
-                fieldname="all",
-                tablename="all",
-                concept_id=out_record[2],
-                additional="",
-                count_type="output_count",
-            )
+            if target == "person":
+                keys.append((source, "all", target, concept_id, ""))
+                keys.append((source, "all", target, concept_id, additional))
+            else:
+                keys.append((source, datacol, target, concept_id, ""))
+                keys.append((source, "all", target, concept_id, ""))
+                keys.append(("all", "all", target, concept_id, ""))
+                keys.append(("all", "all", "all", concept_id, ""))
+
+            for key in keys:
+                counts = summary.get(key)
+                if counts is None:
+                    counts = summary[key] = [0] * len(COUNT_TYPES)
+                counts[OUTPUT_COUNT] += count
+
+        return summary
 
     def get_summary(self):
         summary_str = "source\ttablename\tname\tcolumn name\tbefore\tafter content check\tpct reject content check\tafter date format check\tpct reject date format\n"
@@ -300,47 +348,81 @@ class Metrics:
         return summary_str
 
     def get_data_summary(self):
-        return self.datasummary
+        return self.roll_up()
 
-    def get_mapstream_summary_rows(self) -> list[MapstreamSummaryRow]:
+    def iter_mapstream_summary_rows(
+        self, top: int | None = None
+    ) -> Iterator[MapstreamSummaryRow]:
         """
-        Creates a list of MapstreamSummaryRow from the datasummary
+        Makes each MapstreamSummaryRow, in order, that meets the log_threshold
+        With top, only the rows with the `top` highest output counts are made (still in order)
         """
-        rows = []
 
-        for d_key in sorted(self.datasummary.keys(), key=str):
-            source = self.get_prefix(d_key.source)
-            count_data = self.datasummary[d_key]
+        summary = self.roll_up()
+        keys: Iterable[CountKey] = sorted(summary.keys(), key=key_str)
 
-            row = MapstreamSummaryRow(
+        threshold = self.log_threshold
+        if top is not None:
+            # pick the keys before making any rows - it's cheaper than making all of them
+            passed = (
+                (index, key)
+                for index, key in enumerate(keys)
+                if summary[key][OUTPUT_COUNT] >= threshold
+            )
+            picked = heapq.nlargest(
+                top, passed, key=lambda item: summary[item[1]][OUTPUT_COUNT]
+            )
+            keys = [key for _, key in sorted(picked)]
+
+        for key in keys:
+            source, fieldname, tablename, concept_id, additional = key
+            counts = summary[key]
+
+            if counts[OUTPUT_COUNT] < threshold:
+                continue
+
+            yield MapstreamSummaryRow(
                 dataset_name=self.dataset_name,
-                source=source,
-                fieldname=d_key.fieldname,
-                tablename=d_key.tablename,
-                concept_id=d_key.concept_id,
-                additional=d_key.additional,
-                input_count=count_data.get_count("input_count"),
-                invalid_person_ids=count_data.get_count("invalid_person_ids"),
-                invalid_date_fields=count_data.get_count("invalid_date_fields"),
-                invalid_source_fields=count_data.get_count("invalid_source_fields"),
-                output_count=count_data.get_count("output_count"),
+                source=self.get_prefix(source),
+                fieldname=fieldname,
+                tablename=tablename,
+                concept_id=concept_id,
+                additional=additional,
+                input_count=counts[COUNT_SLOTS["input_count"]],
+                invalid_person_ids=counts[COUNT_SLOTS["invalid_person_ids"]],
+                invalid_date_fields=counts[COUNT_SLOTS["invalid_date_fields"]],
+                invalid_source_fields=counts[COUNT_SLOTS["invalid_source_fields"]],
+                output_count=counts[OUTPUT_COUNT],
             )
 
-            if row.output_count >= self.log_threshold:
-                rows.append(row)
-        return rows
+    def get_mapstream_summary_rows(self) -> list[MapstreamSummaryRow]:
+        """
+        Creates a list of MapstreamSummaryRow from the datasummary
+        """
+        return list(self.iter_mapstream_summary_rows())
+
+    def write_mapstream_summary(
+        self, output: "outputs.OutputTarget", top: int | None = None
+    ) -> None:
+        """
+        Streams the mapstream summary into a "summary_mapstream" table/file of the output
+        """
+        summary = output.start(
+            "summary_mapstream", MapstreamSummaryRow.get_header_list()
+        )
+        try:
+            for row in self.iter_mapstream_summary_rows(top):
+                summary.write(row.to_list())
+        finally:
+            summary.close()
 
     def get_mapstream_summary(self) -> str:
         """
         Makes a TSV string of the mapstream summary
         """
-        summary_rows = self.get_mapstream_summary_rows()
-        result = MapstreamSummaryRow.get_header()
-
-        for row in summary_rows:
-            result += row.to_tsv_row()
-
-        return result
+        return MapstreamSummaryRow.get_header() + "".join(
+            row.to_tsv_row() for row in self.iter_mapstream_summary_rows()
+        )
 
     def get_mapstream_summary_dict(self) -> Dict:
         """
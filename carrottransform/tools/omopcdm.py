@@ -38,6 +38,7 @@ class OmopCDM:
         self.datetime_fields = self.get_columns("datetime_fields")
         self.person_id_field = self.get_columns("person_id_field")
         self.auto_number_field = self.get_columns("auto_number_field")
+        self.column_types = self.get_columns("column_types")
 
     def load_ddl(self, omopddl: Path):
         try:
@@ -59,6 +60,7 @@ class OmopCDM:
         output_dict["notnull_numeric_fields"] = {}
         output_dict["datetime_fields"] = {}
         output_dict["date_fields"] = {}
+        output_dict["column_types"] = {}
 
         ## matching for version number - matches '--postgres', any number of chars and some digits of the form X.Y, plus an end of string or end of line
         ver_rgx = re.compile(r"^--postgresql.*(\d+\.\d+)$")
@@ -105,9 +107,12 @@ class OmopCDM:
                         output_dict["datetime_fields"][tabname] = []
                     if tabname not in output_dict["date_fields"]:
                         output_dict["date_fields"][tabname] = []
+                    if tabname not in output_dict["column_types"]:
+                        output_dict["column_types"][tabname] = {}
 
                     # Add in required column / field data
                     output_dict["all_columns"][tabname].append(fname)
+                    output_dict["column_types"][tabname][fname] = ftype.lower()
                     if ftype.lower() in self.numeric_types:
                         output_dict["numeric_fields"][tabname].append(fname)
                     if (
@@ -209,3 +214,10 @@ class OmopCDM:
             if tablename in self.auto_number_field:
                 return self.auto_number_field[tablename]
         return None
+
+    def get_omop_column_types(self, tablename) -> dict[str, str]:
+        """the (lower case) type each column was declared with in the ddl - like integer, numeric, timestamp, date or varchar"""
+        if self.column_types is not None:
+            if tablename in self.column_types:
+                return self.column_types[tablename]
+        return {}
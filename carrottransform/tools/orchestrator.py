@@ -1,6 +1,7 @@
+import itertools
 from collections.abc import Iterator
 from pathlib import Path
-from typing import Any, Set, Tuple
+from typing import TYPE_CHECKING, Any, Set, Tuple
 
 from case_insensitive_dict import CaseInsensitiveDict
 
@@ -8,11 +9,21 @@ import carrottransform.tools as tools
 from carrottransform import require
 from carrottransform.tools import args, outputs, person_helpers, sources
 from carrottransform.tools.args import person_rules_check_v2, remove_csv_extension
+from carrottransform.tools.batch_engine import BatchEngine
+from carrottransform.tools.checkpoint import Checkpoint, Checkpointer
 from carrottransform.tools.date_helpers import normalise_to8601
 from carrottransform.tools.file_helpers import OutputFileManager
+from carrottransform.tools.id_allocator import IdAllocator
 from carrottransform.tools.logger import logger_setup
 from carrottransform.tools.mappingrules import MappingRules
 from carrottransform.tools.omopcdm import OmopCDM
+from carrottransform.tools.person_index import (
+    PersonIndex,
+    PersonLookup,
+    empty_person_lookup,
+)
+from carrottransform.tools.person_registry import PersonRegistry
+from carrottransform.tools.processed_persons import ProcessedPersons
 from carrottransform.tools.record_builder import RecordBuilderFactory
 from carrottransform.tools.stream_helpers import StreamingLookupCache
 from carrottransform.tools.types import (
@@ -20,6 +31,10 @@ from carrottransform.tools.types import (
     ProcessingResult,
     RecordContext,
 )
+from carrottransform.tools.watermarks import Watermarks
+
+if TYPE_CHECKING:
+    from carrottransform.tools.parallel import ParallelStreamProcessor
 
 logger = logger_setup()
 
@@ -32,11 +47,17 @@ class StreamProcessor:
         context: ProcessingContext,
         lookup_cache: StreamingLookupCache,
         source: sources.SourceObject,
+        batch_size: int = 0,
+        checkpoints: Checkpointer | None = None,
     ):
         self.context = context
         self.cache = lookup_cache
         self._source = source
 
+        # rows per chunk for the BatchEngine - 0 to map one row at a time
+        self._batch_size = batch_size
+        self._checkpoints = checkpoints
+
     def process_all_data(self) -> ProcessingResult:
         """Process all data with single-pass streaming approach"""
         logger.info("Processing data...")
@@ -45,6 +66,11 @@ class StreamProcessor:
 
         # Process each input file
         for source_filename in self.context.input_files:
+            # a resumed run has already mapped these
+            checkpoints = self._checkpoints
+            if checkpoints is not None and source_filename in checkpoints.finished:
+                continue
+
             try:
                 output_counts, rejected_count = self._process_input_file_stream(
                     source_filename
@@ -55,6 +81,9 @@ class StreamProcessor:
                     total_output_counts[target_file] += count
                 total_rejected_counts[source_filename] = rejected_count
 
+                if self._checkpoints is not None:
+                    self._checkpoints.finish(self.context, source_filename)
+
             except Exception as e:
                 logger.error(f"Error processing file {source_filename}: {str(e)}")
                 raise
@@ -62,7 +91,11 @@ class StreamProcessor:
         return ProcessingResult(total_output_counts, total_rejected_counts)
 
     def source_open(self, source_filename: str) -> Iterator[list[str]]:
-        return self._source.open(remove_csv_extension(source_filename))
+        # only the columns the rules use - for sources that can skip the others
+        return self._source.open(
+            remove_csv_extension(source_filename),
+            self.context.mappingrules.get_infile_columns(source_filename),
+        )
 
     def _process_input_file_stream(
         self,
@@ -89,6 +122,8 @@ class StreamProcessor:
 
         try:
             source = self.source_open(source_filename)
+            if self.context.watermarks is not None:
+                source = self.context.watermarks.skip(source_filename, source)
             column_headers = next(source)
             input_column_map = self.context.omopcdm.get_column_map(column_headers)
 
@@ -100,6 +135,24 @@ class StreamProcessor:
                 )
                 return output_counts, rejected_count
 
+            if 0 < self._batch_size:
+                engine = BatchEngine(
+                    self,
+                    source_filename,
+                    input_column_map,
+                    applicable_targets,
+                    datetime_col_idx,
+                    file_meta,
+                )
+                while rows := list(itertools.islice(source, self._batch_size)):
+                    batch_counts, batch_rejected = engine.process(rows)
+                    for target, count in batch_counts.items():
+                        output_counts[target] += count
+                    rejected_count += batch_rejected
+                    if self._checkpoints is not None:
+                        self._checkpoints.tick(self.context, len(rows))
+                return output_counts, rejected_count
+
             # Stream process each row
             for input_data in source:
                 row_counts, row_rejected = self._process_single_row_stream(
@@ -114,6 +167,8 @@ class StreamProcessor:
                 for target, count in row_counts.items():
                     output_counts[target] += count
                 rejected_count += row_rejected
+                if self._checkpoints is not None:
+                    self._checkpoints.tick(self.context)
 
         except Exception as e:
             logger.error(f"Error streaming file {source_filename}: {str(e)}")
@@ -262,6 +317,7 @@ class StreamProcessor:
             date_col_data=date_col_data,
             date_component_data=date_component_data,
             notnull_numeric_fields=notnull_numeric_fields,
+            processed_persons=self.context.processed_persons,
         )
 
         # Build records
@@ -289,6 +345,19 @@ class V2ProcessingOrchestrator:
         omop_ddl_file: Path,
         omop_config_file: Path,
         write_mode: str,
+        workers: int = 1,
+        shard_bytes: int = 0,
+        last_used_ids_file: Path | None = None,
+        batch_size: int = 0,
+        metrics_file: Path | None = None,
+        log_file_threshold: int = 0,
+        summary_top: int | None = None,
+        person_index_dir: Path | None = None,
+        person_registry: Path | None = None,
+        watermarks_file: Path | None = None,
+        checkpoint_file: Path | None = None,
+        checkpoint_rows: int = 100_000,
+        resume: bool = False,
     ):
         self.rules_file = rules_file
         self._output = output
@@ -297,6 +366,19 @@ class V2ProcessingOrchestrator:
         self.omop_ddl_file = omop_ddl_file
         self.omop_config_file = omop_config_file
         self.write_mode = write_mode
+        self.workers = workers
+        self.shard_bytes = shard_bytes
+        self.last_used_ids_file = last_used_ids_file
+        self.batch_size = batch_size
+        self.metrics_file = metrics_file
+        self.log_file_threshold = log_file_threshold
+        self.summary_top = summary_top
+        self.person_index_dir = person_index_dir
+        self.person_registry = person_registry
+        self.watermarks_file = watermarks_file
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_rows = checkpoint_rows
+        self.resume = resume
 
         # Initialize components immediately
         self.initialize_components()
@@ -322,7 +404,9 @@ class V2ProcessingOrchestrator:
                 logger.exception(f"Validation for person rules failed: {e}")
                 raise
 
-        self.metrics = tools.metrics.Metrics(self.mappingrules.get_dataset_name())
+        self.metrics = tools.metrics.Metrics(
+            self.mappingrules.get_dataset_name(), self.log_file_threshold
+        )
         self.output_manager = OutputFileManager(self._output, self.omopcdm)
 
         # Pre-compute lookup cache for efficient streaming
@@ -330,12 +414,35 @@ class V2ProcessingOrchestrator:
 
         self.engine_connection = None
 
-    def setup_person_lookup(self) -> Tuple[dict[str, str], int]:
+    def setup_person_lookup(self) -> Tuple[PersonLookup, int]:
         """Setup person ID lookup and save mapping"""
 
+        # start from the people that earlier runs numbered
+        registry = (
+            None
+            if self.person_registry is None
+            else PersonRegistry(self.person_registry)
+        )
+
+        # the people go in a dict - or the compact index if it's going to be paged from disk
+        person_ids = empty_person_lookup(
+            use_input_ids=False, compact=self.person_index_dir is not None
+        )
+        if registry is not None:
+            registry.load(person_ids)
+
         person_lookup, rejected_person_count = person_helpers.load_person_ids_v2_inject(
-            mappingrules=self.mappingrules, inputs=self._inputs, person=self._person
+            mappingrules=self.mappingrules,
+            inputs=self._inputs,
+            person=self._person,
+            person_ids=person_ids,
         )
+        if registry is not None:
+            registry.save(person_lookup)
+
+        # page the lookup from disk rather than holding it in memory
+        if self.person_index_dir is not None and isinstance(person_lookup, PersonIndex):
+            person_lookup = person_lookup.spill(self.person_index_dir)
 
         # now save the IDs
         id_out = self._output.start("person_ids", ["SOURCE_SUBJECT", "TARGET_SUBJECT"])
@@ -347,9 +454,76 @@ class V2ProcessingOrchestrator:
 
         return person_lookup, rejected_person_count
 
+    def create_processor(
+        self, context: ProcessingContext, checkpoints: Checkpointer | None = None
+    ) -> "StreamProcessor | ParallelStreamProcessor":
+        """pick the single process or the worker pool processor"""
+
+        from carrottransform.tools.parallel import (
+            ParallelStreamProcessor,
+            fork_available,
+        )
+
+        if self.workers <= 1:
+            return StreamProcessor(
+                context, self.lookup_cache, self._inputs, self.batch_size, checkpoints
+            )
+
+        if not fork_available():
+            logger.warning(
+                f"can't fork worker processes on this platform; ignoring {self.workers=}"
+            )
+            return StreamProcessor(
+                context, self.lookup_cache, self._inputs, self.batch_size, checkpoints
+            )
+
+        return ParallelStreamProcessor(
+            context,
+            self.lookup_cache,
+            self._inputs,
+            workers=self.workers,
+            shard_bytes=self.shard_bytes,
+            batch_size=self.batch_size,
+            checkpoints=checkpoints,
+        )
+
+    def check_options(self) -> None:
+        """check the options work together - before anything is written"""
+
+        if self.watermarks_file is not None:
+            require(
+                self.last_used_ids_file is not None,
+                "the watermarks file needs a last used ids file so that the ids carry on",
+            )
+
+            # the watermarks are only saved at the end, so a run that died would have added rows past them to the outputs.
+            # the checkpoints know where the outputs had got to, and, resuming cuts them back to there
+            require(
+                self.checkpoint_file is not None,
+                "the watermarks file needs a checkpoint file so that a run which dies part way through can be resumed rather than adding its rows again",
+            )
+
+        # only the plain tsv files and the databases can say where they've got to (and, be cut back to there)
+        require(
+            self.checkpoint_file is None or self._output._mark is not None,
+            "this output can't be checkpointed - the checkpoint file needs a tsv (without compression) or a database output",
+        )
+        require(
+            not self.resume or self.checkpoint_file is not None,
+            "resuming needs the checkpoint file",
+        )
+        require(
+            self.resume
+            or self.checkpoint_file is None
+            or not self.checkpoint_file.is_file(),
+            f"{self.checkpoint_file} is from a run that didn't finish - --resume it (or delete the checkpoint to start again)",
+        )
+
     def execute_processing(self) -> ProcessingResult:
         """Execute the complete processing pipeline with efficient streaming"""
 
+        self.check_options()
+
         try:
             # Setup person lookup
             person_lookup, rejected_person_count = self.setup_person_lookup()
@@ -358,6 +532,27 @@ class V2ProcessingOrchestrator:
                 f"person_id stats: total loaded {len(person_lookup)}, reject count {rejected_person_count}"
             )
 
+            # pick up from the last checkpoint of a run that died
+            resumed = None
+            if self.resume and self.checkpoint_file and self.checkpoint_file.is_file():
+                logger.info(f"resuming from {self.checkpoint_file}")
+                resumed = Checkpoint.load(self.checkpoint_file)
+
+            # carry on from the rows mapped by an earlier run - adding to its outputs
+            watermarks = None
+            append = False
+            if resumed is not None:
+                append = True
+                watermarks = Watermarks(resumed.rows)
+            elif self.watermarks_file is not None:
+                append = self.watermarks_file.is_file()
+                watermarks = (
+                    Watermarks.load(self.watermarks_file) if append else Watermarks()
+                )
+            elif self.checkpoint_file is not None:
+                # the checkpoints need the rows counting
+                watermarks = Watermarks()
+
             # Setup output files - keep all open for streaming
             output_files = self.mappingrules.get_all_outfile_names()
             target_column_maps = {}
@@ -372,43 +567,81 @@ class V2ProcessingOrchestrator:
                     raise Exception(f"need column map for {output_name=}")
 
                 file_handles[output_name] = self._output.start(
-                    output_name, output_header
+                    output_name,
+                    output_header,
+                    append,
+                    None if resumed is None else resumed.outputs.get(output_name),
                 )
                 target_column_maps[output_name] = target_column_map
 
+            # carry on from the ids used by an earlier run
+            if resumed is not None:
+                record_numbers = IdAllocator.restore(
+                    resumed.last_used_ids, output_files
+                )
+            elif (
+                self.last_used_ids_file is not None
+            ) and self.last_used_ids_file.is_file():
+                record_numbers = IdAllocator.load(self.last_used_ids_file, output_files)
+            else:
+                record_numbers = IdAllocator(output_files)
+
+            # add on to the counts from an earlier run
+            if resumed is not None:
+                self.metrics = tools.metrics.Metrics.from_dict(
+                    resumed.metrics, self.log_file_threshold
+                )
+            elif (self.metrics_file is not None) and self.metrics_file.is_file():
+                self.metrics.merge(tools.metrics.Metrics.load(self.metrics_file))
+
             # Create processing context
             context = ProcessingContext(
                 mappingrules=self.mappingrules,
                 omopcdm=self.omopcdm,
                 inputs=self._inputs,
                 person_lookup=person_lookup,
-                record_numbers={output_file: 1 for output_file in output_files},
+                record_numbers=record_numbers,
                 file_handles=file_handles,
                 target_column_maps=target_column_maps,
                 metrics=self.metrics,
+                processed_persons=ProcessedPersons(person_lookup)
+                if resumed is None
+                else ProcessedPersons.from_dict(resumed.persons, person_lookup),
+                watermarks=watermarks,
             )
 
+            checkpoints = (
+                None
+                if self.checkpoint_file is None
+                else Checkpointer(
+                    self.checkpoint_file, self.checkpoint_rows, self._output, resumed
+                )
+            )
+
+            # checkpoint before any rows are mapped, so a run that dies before the first one is still cut back to here.
+            # it also marks the outputs - so sql only commits at the checkpoints from now on
+            if checkpoints is not None:
+                checkpoints.save(context)
+
             # Process data using efficient streaming approach
-            processor = StreamProcessor(context, self.lookup_cache, self._inputs)
-            result = processor.process_all_data()
+            result = self.create_processor(context, checkpoints).process_all_data()
 
             for target_file, count in result.output_counts.items():
                 logger.info(f"TARGET: {target_file}: output count {count}")
 
+            # so the next run can start after these ids
+            if self.last_used_ids_file is not None:
+                record_numbers.save(self.last_used_ids_file)
+            if self.metrics_file is not None:
+                self.metrics.save(self.metrics_file)
+            if self.watermarks_file is not None and watermarks is not None:
+                watermarks.save(self.watermarks_file)
+
             # Write summary
-            data_summary = None
-            for line in self.metrics.get_mapstream_summary().strip().split("\n"):
-                row = line.split("\t")
-
-                if data_summary is None:
-                    data_summary = self._output.start("summary_mapstream", row)
-                else:
-                    data_summary.write(row)
-
-            require(data_summary is not None)
-            if data_summary is not None:
-                data_summary.close()
-                data_summary = None
+            self.metrics.write_mapstream_summary(self._output, self.summary_top)
+
+            if checkpoints is not None:
+                checkpoints.done()
 
             return result
 
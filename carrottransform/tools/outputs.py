@@ -2,11 +2,19 @@
 this file contains several "output target" classes. each class is used to write carrot-transform output data in a different way. all classes are operated the same way - so - which output is in use can be selected by the CLICK argument type - also defined in this file.
 """
 
+import csv
 import io
 import logging
+import os
 import re
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import IntEnum
 from pathlib import Path
+from typing import IO, TYPE_CHECKING
 
 import boto3
 import click
@@ -14,7 +22,10 @@ import sqlalchemy
 from sqlalchemy import Column, MetaData, Table, Text, insert
 
 from carrottransform import require
-from carrottransform.tools import at_path
+from carrottransform.tools import at_path, compressed
+
+if TYPE_CHECKING:
+    from carrottransform.tools.omopcdm import OmopCDM
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +37,18 @@ class RateLimits(IntEnum):
 class OutputTarget:
     """the OutputTarget classes provide a common abstraction for writing tables of data out of the program. each implementation offers an identical interface to some underlying storage mechanism"""
 
-    def __init__(self, start, write, close):
+    def __init__(self, start, write, close, append=None, mark=None):
         self._start = start
         self._write = write
         self._close = close
         self._active = {}
 
+        # opens a table/file to add to what's already there - for the targets that can
+        self._append = append
+
+        # makes what's been written durable and returns where it's got to - for the targets that can
+        self._mark = mark
+
     class Handle:
         """
         a handle is a streaming connection to an individual table or file for a given output-target implementation
@@ -59,12 +76,21 @@ class OutputTarget:
             # remove the handle fromt he list of handles
             del self._host._active[self._name]
 
-    def start(self, name: str, header: list[str]) -> Handle:
+    def start(
+        self, name: str, header: list[str], append: bool = False, at: int | None = None
+    ) -> Handle:
         """
         opens a single handle to a single table or file with the given column names.
+
+        with `append` the records are added after any that are already there, rather than replacing them.
+        `at` is a position from `mark()` - anything written after it is dropped first
         """
 
         require(name not in self._active)
+        require(
+            not append or self._append is not None,
+            f"this output can't be appended to (opening {name=})",
+        )
 
         length = len(header)
         shorten = header[-1] == ""
@@ -75,13 +101,20 @@ class OutputTarget:
         handle = self.Handle(
             host=self,
             name=name,
-            item=self._start(name, header),
+            item=self._append(name, header, at)
+            if append
+            else self._start(name, header),
             shorten=shorten,
             length=length,
         )
         self._active[name] = handle
         return handle
 
+    def mark(self) -> dict[str, int]:
+        """flush all active streams so what's been written is durable - returning where each has got to (for `start(..., at=)`)"""
+        require(self._mark is not None, "this output can't be checkpointed")
+        return {name: self._mark(handle._item) for name, handle in self._active.items()}
+
     def close(self):
         """closes all active streams but doesn't prevent new ones from being opened"""
 
@@ -93,8 +126,30 @@ class OutputTarget:
             self._active[name].close()
 
 
-def csv_output_target(into: Path) -> OutputTarget:
-    """creates an instance of the OutputTarget that points at a folder of csv files"""
+def csv_output_target(
+    into: Path, compression: str | None = None, part_bytes: int | None = None
+) -> OutputTarget:
+    """
+    creates an instance of the OutputTarget that points at a folder of csv files
+
+    with a `compression` (".gz" or ".zst") the files are compressed, and, with `part_bytes` each table is split into `name.part-0001.tsv` (etc.) files of about that many (uncompressed) bytes - each with the header.
+    either way the files are written on a thread for each table - and they can't be appended to or checkpointed
+    """
+
+    require(
+        compression is None or compression in compressed.COMPRESSORS,
+        f"{compression=} isn't one of {list(compressed.COMPRESSORS)}",
+    )
+    require(part_bytes is None or 0 < part_bytes, f"{part_bytes=}")
+
+    if compression is not None or part_bytes is not None:
+        return OutputTarget(
+            lambda name, header: CompressedTsv(
+                into, name, header, compression, part_bytes
+            ),
+            lambda item, record: item.write(record),
+            lambda item: item.close(),
+        )
 
     def start(name: str, header: list[str]):
         path = (into / name).with_suffix(".tsv")
@@ -103,6 +158,28 @@ def csv_output_target(into: Path) -> OutputTarget:
         file.write("\t".join(header) + "\n")
         return file
 
+    def append(name: str, header: list[str], at: int | None):
+        path = (into / name).with_suffix(".tsv")
+        if not path.is_file():
+            return start(name, header)
+
+        with path.open("r") as existing:
+            first = existing.readline()
+        require(
+            first == "\t".join(header) + "\n",
+            f"can't append to {path=} because its header is {first=}",
+        )
+        file = path.open("a")
+        if at is not None:
+            file.truncate(at)
+            file.seek(0, os.SEEK_END)
+        return file
+
+    def mark(item) -> int:
+        item.flush()
+        os.fsync(item.fileno())
+        return item.tell()
+
     def write(item, record):
         require(not isinstance(record, str))
         item.write("\t".join(record) + "\n")
@@ -111,18 +188,325 @@ def csv_output_target(into: Path) -> OutputTarget:
         start,
         lambda item, record: write(item, record),
         lambda item: item.close(),
+        append,
+        mark,
     )
 
 
-def sql_output_target(connection: sqlalchemy.engine.Engine | str) -> OutputTarget:
-    """creates an instance of the OutputTarget using the given SQLAlchemy connection"""
+class CompressedTsv:
+    """the (compressed) file being written for one table - and which part it's up to"""
+
+    # how much of the records are joined up before they're handed to the writer thread
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        into: Path,
+        name: str,
+        header: list[str],
+        compression: str | None,
+        part_bytes: int | None,
+    ):
+        self._into = into
+        self._name = name
+        self._header = ("\t".join(header) + "\n").encode("utf-8")
+        self._compression = compression
+        self._part_bytes = part_bytes
+
+        self._part = 0
+        self._lines: list[bytes] = []
+        self._buffered = 0
+        self._written = 0
+
+        # clear out the parts from any earlier run - there might have been more of them
+        if part_bytes is not None:
+            for stale in into.glob(f"{name}.part-*.tsv{compression or ''}"):
+                stale.unlink()
+
+        self._file = self._open()
+
+    def path(self) -> Path:
+        stem = (
+            self._name
+            if self._part_bytes is None
+            else f"{self._name}.part-{self._part:04d}"
+        )
+        return self._into / f"{stem}.tsv{self._compression or ''}"
+
+    def _open(self) -> compressed.WriteBehind:
+        self._part += 1
+        path = self.path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        file = compressed.compressing(path.open("wb"), self._compression)
+        file.write(self._header)
+        self._written = len(self._header)
+        return file
+
+    def _flush(self) -> None:
+        if self._lines:
+            self._file.write(b"".join(self._lines))
+            self._lines = []
+            self._buffered = 0
+
+    def write(self, record: list[str]) -> None:
+        require(not isinstance(record, str))
+        line = ("\t".join(record) + "\n").encode("utf-8")
+
+        # start the next part - unless this one only has the header
+        if (
+            self._part_bytes is not None
+            and len(self._header) < self._written
+            and self._part_bytes < self._written + len(line)
+        ):
+            self._flush()
+            self._file.close()
+            self._file = self._open()
+
+        self._lines.append(line)
+        self._buffered += len(line)
+        self._written += len(line)
+        if self.BUFFER_SIZE <= self._buffered:
+            self._flush()
+
+    def close(self) -> None:
+        self._flush()
+        self._file.close()
+
+
+def parquet_output_target(
+    into: Path, omopcdm: "OmopCDM | None" = None, row_group_size: int = 100_000
+) -> OutputTarget:
+    """
+    creates an instance of the OutputTarget that points at a folder of parquet files
+
+    the columns are typed by their declaration in the `OmopCDM`'s ddl (the default one unless another is passed) - integer, numeric, timestamp and date - with blank values written as nulls.
+    anything else (including tables that aren't in the ddl, like the summary) is written as strings.
+    records are buffered for each table and written `row_group_size` at a time
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise Exception(
+            "writing parquet needs pyarrow - install carrot_transform[parquet]"
+        ) from e
+
+    require(0 < row_group_size, f"{row_group_size=}")
+
+    if omopcdm is None:
+        from carrottransform.tools.omopcdm import OmopCDM
+
+        omopcdm = OmopCDM(
+            at_path.carrot / "config/OMOPCDM_postgresql_5.3_ddl.sql",
+            at_path.carrot / "config/config.json",
+        )
+    column_types = omopcdm.get_omop_column_types
+
+    arrow_types = {
+        "integer": pa.int64(),
+        "numeric": pa.float64(),
+        "timestamp": pa.timestamp("us"),
+        "date": pa.date32(),
+    }
+
+    def to_arrow(name: str, column: str, values, arrow_type):
+        array = pa.array(values, pa.string())
+        if arrow_type == pa.string():
+            return array
+
+        # blanks in the records are missing values
+        array = pc.if_else(pc.equal(array, ""), pa.scalar(None, pa.string()), array)
+
+        # date fields are sometimes given the whole datetime
+        if arrow_type == pa.date32():
+            array = pc.utf8_slice_codeunits(array, 0, 10)
+
+        try:
+            return array.cast(arrow_type)
+        except pa.ArrowInvalid as e:
+            raise Exception(f"can't write {name}.{column} as {arrow_type} // {e=}", e)
+
+    class Writer:
+        """the parquet writer and buffered records for one table"""
+
+        def __init__(self, name: str, header: list[str]):
+            types = column_types(name)
+            self._name = name
+            self._schema = pa.schema(
+                [
+                    (column, arrow_types.get(types.get(column, ""), pa.string()))
+                    for column in header
+                ]
+            )
+            path = (into / name).with_suffix(".parquet")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(path, self._schema)
+            self._rows: list[list[str]] = []
+
+        def write(self, record: list[str]) -> None:
+            require(not isinstance(record, str))
+            self._rows.append(record)
+            if row_group_size <= len(self._rows):
+                self.flush()
+
+        def flush(self) -> None:
+            if not self._rows:
+                return
+
+            columns = list(zip(*self._rows))
+            self._rows = []
+            self._writer.write_table(
+                pa.table(
+                    [
+                        to_arrow(self._name, field.name, values, field.type)
+                        for field, values in zip(self._schema, columns)
+                    ],
+                    schema=self._schema,
+                )
+            )
+
+        def close(self) -> None:
+            self.flush()
+            self._writer.close()
+
+    return OutputTarget(
+        lambda name, header: Writer(name, header),
+        lambda table, record: table.write(record),
+        lambda table: table.close(),
+    )
+
+
+def sql_output_target(
+    connection: sqlalchemy.engine.Engine | str,
+    batch_size: int = 1000,
+    transaction_size: int = 100_000,
+    copy: bool = True,
+) -> OutputTarget:
+    """creates an instance of the OutputTarget using the given SQLAlchemy connection
+
+    records are buffered for each table and inserted `batch_size` at a time, with a commit once `transaction_size` records (from all tables) are pending.
+    postgres connected through psycopg2 loads the batches with `COPY FROM STDIN` rather than INSERT, unless `copy` is False.
+    """
 
     SQL_TO_LOWER: bool = True
 
+    require(0 < batch_size, f"{batch_size=}")
+    require(0 < transaction_size, f"{transaction_size=}")
+
     if not isinstance(connection, sqlalchemy.engine.Engine):
         # if the parameter is not a connection; make it one
         # ... and fail-fast if it can't be used to open a connection
         connection = sqlalchemy.create_engine(connection)
+    engine: sqlalchemy.engine.Engine = connection
+
+    use_copy = (
+        copy
+        and engine.dialect.name == "postgresql"
+        and engine.dialect.driver == "psycopg2"
+    )
+
+    # all the tables share one connection/transaction; sqlite only allows one writer at a time
+    active: sqlalchemy.engine.Connection | None = None
+    pending = 0
+
+    # once the output has been marked it's only committed when it's marked again (or closed)
+    # so that the records after a checkpoint are rolled back if the run dies
+    marked = False
+
+    def begin() -> sqlalchemy.engine.Connection:
+        nonlocal active
+        if active is None:
+            active = engine.connect()
+        return active
+
+    def commit() -> None:
+        nonlocal active, pending
+        if active is not None:
+            active.commit()
+            active.close()
+            active = None
+        pending = 0
+
+    def rollback() -> None:
+        nonlocal active, pending
+        if active is not None:
+            active.rollback()
+            active.close()
+            active = None
+        pending = 0
+
+    def copy_rows(
+        conn: sqlalchemy.engine.Connection,
+        table: Table,
+        header: list[str],
+        rows: list[list[str]],
+    ) -> None:
+        # quote everything so that empty values arrive as '' rather than NULL - same as the INSERT does
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows(rows)
+        buffer.seek(0)
+
+        preparer = conn.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(name) for name in header)
+        statement = f"COPY {preparer.format_table(table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+        dbapi_connection = conn.connection.dbapi_connection
+        if dbapi_connection is None:
+            raise Exception(f"no psycopg2 connection to COPY into {table.name}")
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(statement, buffer)
+        finally:
+            cursor.close()
+
+    class Batch:
+        """the records buffered for one table"""
+
+        def __init__(self, name: str, header: list[str], table: Table):
+            self._name = name
+            self._header = header
+            self._table = table
+            self._rows: list[list[str]] = []
+
+        def write(self, record: list[str]) -> None:
+            self._rows.append(record)
+            if batch_size <= len(self._rows):
+                self.flush()
+
+        def flush(self) -> None:
+            nonlocal pending
+            if not self._rows:
+                return
+
+            rows = self._rows
+            self._rows = []
+
+            conn = begin()
+            try:
+                if use_copy:
+                    copy_rows(conn, self._table, self._header, rows)
+                else:
+                    conn.execute(
+                        insert(self._table),
+                        [dict(zip(self._header, record)) for record in rows],
+                    )
+            except Exception as e:
+                rollback()
+                raise Exception(
+                    f"failure trying to insert {len(rows)} records (starting {rows[0]=}) into {self._name}({self._header}) // {e=}",
+                    e,
+                )
+
+            pending += len(rows)
+            if not marked and transaction_size <= pending:
+                commit()
+
+        def close(self) -> None:
+            self.flush()
+            commit()
 
     def start(name: str, header: list[str]):
         if SQL_TO_LOWER:
@@ -132,35 +516,46 @@ def sql_output_target(connection: sqlalchemy.engine.Engine | str) -> OutputTarge
         # assume all columns are text - a better solution would be to lookup the ddl
         columns = [Column(name, Text()) for name in header]
 
-        # create the table - a better solution would be to check wether it already exists
+        # create the table (if it's not there) - a better solution would be to check the columns of one that is
         metadata = MetaData()
         table = Table(
             name,
             metadata,
             *(columns),
         )
-        metadata.create_all(connection, tables=[table])
+        # ... on the shared connection so that it doesn't wait on our own uncommitted records
+        metadata.create_all(begin(), tables=[table])
 
-        # use this lambda to write a single record
-        # ... rewriting the class "smells bad" when it already works and i'm struggling with s3
-        def upload(record):
-            with connection.begin() as conn:
-                try:
-                    rec = dict(zip(header, record))
-                    conn.execute(insert(table), rec)
-                except Exception as e:
-                    raise Exception(
-                        f"failure trying to insert {rec=} into {name}({header}) // {e=}",
-                        e,
-                    )
+        return Batch(name, header, table)
 
-        return upload
+    def mark(batch: Batch) -> int:
+        nonlocal marked
+        marked = True
+        batch.flush()
+        commit()
+        return 0
 
-    return OutputTarget(start, lambda upload, record: upload(record), lambda item: 0)
+    # the table is only created if it's not there; so, starting one always adds to it
+    return OutputTarget(
+        start,
+        lambda batch, record: batch.write(record),
+        lambda batch: batch.close(),
+        lambda name, header, at: start(name, header),
+        mark,
+    )
 
 
 class S3Tool:
-    """this class simplifies s3 connections"""
+    """
+    this class simplifies s3 connections
+
+    the parts of each upload are sent from a pool of `concurrency` threads so that the transform carries on while they upload.
+    a part that fails is retried (with an exponential backoff) `retries` times before the upload is aborted.
+    the parts waiting to be (or being) uploaded - from all the streams - are held to `max_pending` bytes; writing blocks until there's room
+
+    the streams' buffers (of the parts that are still being written) share `memory_budget` bytes of memory.
+    when they'd use more than that, the largest buffer is moved into a temporary file (in `spill_dir`) and that part is uploaded from the file
+    """
 
     class S3UploadStream:
         """this class tracks a single upload stream. there's no download stream sibling; downloading is not streamed"""
@@ -172,16 +567,55 @@ class S3Tool:
                 Bucket=self._tool._bucket_name, Key=(self._name)
             )
             self._upload_id = self._mpu["UploadId"]
-            self._buffer = io.BytesIO()
-            self._parts: list[dict[str, int | object]] = []
+            self._buffer: IO[bytes] = io.BytesIO()
+
+            # is the buffer a temporary file rather than in memory
+            self._spilled = False
+
+            # the parts that've been handed to the pool - in part number order
+            self._parts: list[Future] = []
             self._part_number = 1
 
-    def __init__(self, s3, bucket_name: str, bucket_path: str):
+    def __init__(
+        self,
+        s3,
+        bucket_name: str,
+        bucket_path: str,
+        part_size: int = RateLimits.S3_LIMIT,
+        concurrency: int = 4,
+        max_pending: int | None = None,
+        retries: int = 4,
+        backoff: float = 0.5,
+        memory_budget: int | None = None,
+        spill_dir: Path | None = None,
+    ):
+        require(0 < part_size, f"{part_size=}")
+        require(0 < concurrency, f"{concurrency=}")
+
         self._bucket_name = bucket_name
         self._bucket_path = bucket_path
         self._s3 = s3
         self._streams: dict[str, S3Tool.S3UploadStream] = {}
 
+        self._part_size = part_size
+        self._retries = retries
+        self._backoff = backoff
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="s3-upload"
+        )
+
+        # the bytes in parts that haven't finished uploading
+        self._max_pending = (
+            concurrency * part_size if max_pending is None else max_pending
+        )
+        self._pending = 0
+        self._pending_changed = threading.Condition()
+
+        # the bytes in the buffers that are in memory
+        self._memory_budget = 2 * part_size if memory_budget is None else memory_budget
+        self._buffered = 0
+        self._spill_dir = spill_dir
+
     def key_name(self, name):
         return self._bucket_path + name
 
@@ -217,40 +651,123 @@ class S3Tool:
         stream = self._streams[name]
 
         stream._buffer.write(data)
+        if not stream._spilled:
+            self._buffered += len(data)
+            if self._memory_budget < self._buffered:
+                self._spill()
 
-        if stream._buffer.tell() >= RateLimits.S3_LIMIT:
+        if stream._buffer.tell() >= self._part_size:
             self.flush(stream)
 
+    def _spill(self) -> None:
+        """move the largest buffer that's in memory into a temporary file"""
+
+        largest = max(
+            (stream for stream in self._streams.values() if not stream._spilled),
+            key=lambda stream: stream._buffer.tell(),
+        )
+
+        file = tempfile.TemporaryFile(dir=self._spill_dir)
+        buffer = largest._buffer
+        assert isinstance(buffer, io.BytesIO)
+        file.write(buffer.getbuffer())
+
+        self._buffered -= buffer.tell()
+        largest._buffer = file
+        largest._spilled = True
+
     def complete_all(self):
-        for name in self._streams:
+        for name in list(self._streams):
             self.complete(name)
-        self._streams = {}
 
     def complete(self, name):
-        stream = self._streams[name]
-        self.flush(stream)
+        stream = self._streams.pop(name)
+
+        # s3 needs at least one part - even if it's empty
+        if stream._buffer.tell() or not stream._parts:
+            self.flush(stream)
+
+        try:
+            parts = [future.result() for future in stream._parts]
+        except Exception:
+            self._s3.abort_multipart_upload(
+                Bucket=self._bucket_name, Key=stream._name, UploadId=stream._upload_id
+            )
+            raise
+
         self._s3.complete_multipart_upload(
             Bucket=self._bucket_name,
             Key=stream._name,
             UploadId=stream._upload_id,
-            MultipartUpload={"Parts": stream._parts},
+            MultipartUpload={"Parts": parts},
         )
 
-    def flush(self, stream):
-        # upload the part
-        stream._buffer.seek(0)
-        resp = self._s3.upload_part(
-            Bucket=self._bucket_name,
-            Key=stream._name,
-            PartNumber=stream._part_number,
-            UploadId=stream._upload_id,
-            Body=stream._buffer.read(),
-        )
+    def flush(self, stream: "S3Tool.S3UploadStream") -> None:
+        """hand the buffered data to the pool as the stream's next part"""
+
+        size = stream._buffer.tell()
+        body: bytes | IO[bytes]
+        if stream._spilled:
+            body = stream._buffer
+        else:
+            assert isinstance(stream._buffer, io.BytesIO)
+            body = stream._buffer.getvalue()
+            self._buffered -= size
+        stream._buffer = io.BytesIO()
+        stream._spilled = False
 
-        # reset the buffer and parts
-        stream._parts.append({"PartNumber": stream._part_number, "ETag": resp["ETag"]})
+        self._reserve(size)
+        stream._parts.append(
+            self._pool.submit(
+                self._upload_part, stream, stream._part_number, body, size
+            )
+        )
         stream._part_number += 1
-        stream._buffer = io.BytesIO()
+
+    def _reserve(self, size: int) -> None:
+        """wait until there's room for another part - there's always room for one"""
+        with self._pending_changed:
+            while self._pending and self._max_pending < self._pending + size:
+                self._pending_changed.wait()
+            self._pending += size
+
+    def _release(self, size: int) -> None:
+        with self._pending_changed:
+            self._pending -= size
+            self._pending_changed.notify_all()
+
+    def _upload_part(
+        self, stream, part_number: int, body: bytes | IO[bytes], size: int
+    ) -> dict[str, object]:
+        """upload one part (on one of the pool's threads) retrying it if it fails. the part is either bytes or a (spilled) file"""
+
+        try:
+            attempt = 0
+            while True:
+                if not isinstance(body, bytes):
+                    body.seek(0)
+                try:
+                    resp = self._s3.upload_part(
+                        Bucket=self._bucket_name,
+                        Key=stream._name,
+                        PartNumber=part_number,
+                        UploadId=stream._upload_id,
+                        Body=body,
+                    )
+                    return {"PartNumber": part_number, "ETag": resp["ETag"]}
+                except Exception as e:
+                    if self._retries <= attempt:
+                        raise
+                    delay = self._backoff * (2**attempt)
+                    attempt += 1
+                    logger.warning(
+                        f"retrying part {part_number} of {stream._name} in {delay}s // {e=}"
+                    )
+                    time.sleep(delay)
+        finally:
+            if not isinstance(body, bytes):
+                body.close()
+            self._release(size)
 
 
 # Pattern to extract all components
@@ -261,6 +778,8 @@ class MinioURL:
     """parses/breaks a MinioURL up into the intended components"""
 
     def __init__(self, text: str):
+        # minio:...?concurrency=8&memory-budget=N - any options are after the folder
+        text, _, query = text.partition("?")
         match = re.match(MINIO_URL_PATTERN, text)
 
         if not match:
@@ -273,12 +792,27 @@ class MinioURL:
         self._port = match.group(5)
         self._bucket = match.group(6)
         self._folder = match.group(7)
+        self._options = dict(urllib.parse.parse_qsl(query, strict_parsing=bool(query)))
 
 
 def minio_output_target(coordinate: str) -> OutputTarget:
-    """create an output target for a folder in an minio bucket"""
+    """
+    create an output target for a folder in an minio bucket
+
+    the upload can be tuned with `?part-size=N&concurrency=N&max-pending=N&memory-budget=N&spill-dir=DIR` on the end of the url - the sizes are in bytes, see S3Tool for what they do
+    """
 
     bucket = MinioURL(coordinate)
+    options = bucket._options
+    unknown = set(options) - {
+        "part-size",
+        "concurrency",
+        "max-pending",
+        "memory-budget",
+        "spill-dir",
+    }
+    if unknown:
+        raise Exception(f"unknown options {sorted(unknown)} in the minio URL")
 
     s3_client = boto3.client(
         "s3",
@@ -287,7 +821,18 @@ def minio_output_target(coordinate: str) -> OutputTarget:
         aws_secret_access_key=bucket._pass,
     )
 
-    s3_tool = S3Tool(s3_client, bucket._bucket, bucket._folder)
+    s3_tool = S3Tool(
+        s3_client,
+        bucket._bucket,
+        bucket._folder,
+        part_size=int(options.get("part-size", RateLimits.S3_LIMIT)),
+        concurrency=int(options.get("concurrency", 4)),
+        max_pending=int(options["max-pending"]) if "max-pending" in options else None,
+        memory_budget=int(options["memory-budget"])
+        if "memory-budget" in options
+        else None,
+        spill_dir=Path(options["spill-dir"]) if "spill-dir" in options else None,
+    )
 
     def start(name: str, header: list[str]):
         s3_tool.new_stream(name)
@@ -330,6 +875,25 @@ class OutputTargetArgumentType(click.ParamType):
         if value.startswith("minio:"):
             return minio_output_target(value)
 
+        if value.startswith("parquet:"):
+            return parquet_output_target(at_path.convert_path(value[len("parquet:") :]))
+
+        if value.startswith("tsv:"):
+            # tsv:PATH?compression=zst&part-bytes=N
+            path, _, query = value[len("tsv:") :].partition("?")
+            options = dict(urllib.parse.parse_qsl(query, strict_parsing=bool(query)))
+            unknown = set(options) - {"compression", "part-bytes"}
+            if unknown:
+                self.fail(f"unknown options {sorted(unknown)} in {value=}", param, ctx)
+            compression = options.get("compression")
+            return csv_output_target(
+                at_path.convert_path(path),
+                compression=None if compression is None else "." + compression,
+                part_bytes=int(options["part-bytes"])
+                if "part-bytes" in options
+                else None,
+            )
+
         try:
             return sql_output_target(sqlalchemy.create_engine(value))
         except sqlalchemy.exc.ArgumentError as argumentError:
@@ -0,0 +1,339 @@
+"""
+runs the v2 StreamProcessor over a pool of worker processes.
+
+each input file (or each line aligned range of a large csv) is a "shard" which a worker maps on its own - writing the records into spill files and counting into its own Metrics.
+the parent then copies the spilled records into the real outputs one shard at a time, in the same order as the single process version would have written them.
+the auto-number ids each shard used are moved into a block the IdAllocator reserves for that (table, shard) as it goes.
+this means that the output is identical regardless of how many workers were used.
+
+the workers are forked from the parent so that they inherit the rules, person lookup, and source objects without anything needing to be pickled.
+"""
+
+import csv
+import multiprocessing
+import shutil
+import tempfile
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import carrottransform.tools as tools
+from carrottransform.tools import outputs, sources
+from carrottransform.tools.args import remove_csv_extension
+from carrottransform.tools.checkpoint import Checkpointer
+from carrottransform.tools.id_allocator import IdAllocator
+from carrottransform.tools.logger import logger_setup
+from carrottransform.tools.orchestrator import StreamProcessor
+from carrottransform.tools.stream_helpers import StreamingLookupCache
+from carrottransform.tools.types import ProcessingContext, ProcessingResult
+from carrottransform.tools.watermarks import Watermarks
+
+logger = logger_setup()
+
+
+@dataclass
+class Shard:
+    """one unit of work for a worker - a whole input file or a range of one"""
+
+    index: int
+    source_filename: str
+    start: int = 0
+    end: int | None = None
+
+
+@dataclass
+class ShardResult:
+    """what a worker sends back to the parent after mapping a shard"""
+
+    shard: Shard
+    output_counts: dict[str, int]
+    rejected_count: int
+    metrics: tools.metrics.Metrics
+    spill_dir: Path
+
+    # how many ids the shard used in each table - including those for records that were rejected
+    ids_used: dict[str, int]
+
+    # how many rows the shard mapped - past the watermark
+    rows_read: int = 0
+
+
+# the state the workers inherit when they're forked. it's only set in the parent while the pool is running
+_worker_state: "ParallelStreamProcessor | None" = None
+
+
+def fork_available() -> bool:
+    """the workers need to be forked - which isn't possible on windows"""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def spill_output_target(into: Path) -> outputs.OutputTarget:
+    """an OutputTarget that writes csv files which can hold any value (tabs, newlines) and be read back exactly"""
+
+    def start(name: str, header: list[str]):
+        file = (into / name).with_suffix(".csv").open("w", encoding="utf-8", newline="")
+        return file, csv.writer(file)
+
+    return outputs.OutputTarget(
+        start,
+        lambda item, record: item[1].writerow(record),
+        lambda item: item[0].close(),
+    )
+
+
+def read_spill(into: Path, name: str) -> Iterator[list[str]]:
+    """read back the records written to a spill_output_target()"""
+    with (
+        (into / name)
+        .with_suffix(".csv")
+        .open("r", encoding="utf-8", newline="") as file
+    ):
+        yield from csv.reader(file)
+
+
+class ShardStreamProcessor(StreamProcessor):
+    """a StreamProcessor that only reads one shard of an input file"""
+
+    def __init__(
+        self,
+        context: ProcessingContext,
+        lookup_cache: StreamingLookupCache,
+        source: sources.SourceObject,
+        shard: Shard,
+        batch_size: int = 0,
+    ):
+        super().__init__(context, lookup_cache, source, batch_size)
+        self._shard = shard
+
+    def source_open(self, source_filename: str) -> Iterator[list[str]]:
+        if self._shard.start == 0 and self._shard.end is None:
+            return super().source_open(source_filename)
+        return self._source.open_range(
+            remove_csv_extension(source_filename),
+            self._shard.start,
+            self._shard.end,
+            self.context.mappingrules.get_infile_columns(source_filename),
+        )
+
+
+def _run_shard(shard: Shard) -> ShardResult:
+    """the worker's entry point - map one shard into a folder of spill files"""
+
+    state = _worker_state
+    if state is None:
+        raise RuntimeError("the worker wasn't forked from a ParallelStreamProcessor")
+
+    return state.map_shard(shard)
+
+
+class ParallelStreamProcessor:
+    """Processes the input files over a pool of forked worker processes"""
+
+    def __init__(
+        self,
+        context: ProcessingContext,
+        lookup_cache: StreamingLookupCache,
+        source: sources.SourceObject,
+        workers: int,
+        shard_bytes: int = 0,
+        batch_size: int = 0,
+        checkpoints: Checkpointer | None = None,
+    ):
+        self.context = context
+        self.cache = lookup_cache
+        self._source = source
+        self._workers = workers
+        self._shard_bytes = shard_bytes
+        self._batch_size = batch_size
+        self._checkpoints = checkpoints
+        self._spill_root: Path | None = None
+
+    def plan_shards(self) -> list[Shard]:
+        """list the shards in the order their output needs to be written"""
+
+        shards: list[Shard] = []
+        for source_filename in self.context.input_files:
+            # a resumed run has already mapped these
+            checkpoints = self._checkpoints
+            if checkpoints is not None and source_filename in checkpoints.finished:
+                continue
+
+            targets = self.cache.input_to_outputs.get(source_filename, set())
+
+            # splitting the person file would let a person be written twice; their dedupe is per-file
+            # ... and the rows before a watermark can only be skipped from the start of the file
+            ranges: list[tuple[int, int | None]] = [(0, None)]
+            watermarks = self.context.watermarks
+            if (
+                0 < self._shard_bytes
+                and "person" not in targets
+                and (watermarks is None or 0 == watermarks.rows(source_filename))
+            ):
+                ranges = self._source.shard(
+                    remove_csv_extension(source_filename), self._shard_bytes
+                )
+
+            for start, end in ranges:
+                shards.append(Shard(len(shards), source_filename, start, end))
+
+        return shards
+
+    def map_shard(self, shard: Shard) -> ShardResult:
+        """map a shard into spill files using a private context. this runs in the worker"""
+
+        spill_root = self._spill_root
+        if spill_root is None:
+            raise RuntimeError("no spill folder was set up")
+
+        spill_dir = spill_root / f"shard_{shard.index}"
+        spill_dir.mkdir()
+        spill = spill_output_target(spill_dir)
+
+        file_handles = {
+            output_file: spill.start(
+                output_file, self.context.omopcdm.get_omop_column_list(output_file)
+            )
+            for output_file in self.context.output_files
+        }
+
+        # the rows mapped by earlier runs - only whole files have any
+        source = shard.source_filename
+        mapped = (
+            None
+            if self.context.watermarks is None
+            else self.context.watermarks.rows(source)
+        )
+
+        context = ProcessingContext(
+            mappingrules=self.context.mappingrules,
+            omopcdm=self.context.omopcdm,
+            inputs=self.context.inputs,
+            person_lookup=self.context.person_lookup,
+            record_numbers=IdAllocator(file_handles),
+            file_handles=file_handles,
+            target_column_maps=self.context.target_column_maps,
+            metrics=tools.metrics.Metrics(self.context.metrics.dataset_name),
+            processed_persons=self.context.processed_persons,
+            watermarks=None if mapped is None else Watermarks({source: mapped}),
+        )
+
+        processor = ShardStreamProcessor(
+            context, self.cache, self._source, shard, self._batch_size
+        )
+        output_counts, rejected_count = processor._process_input_file_stream(
+            shard.source_filename
+        )
+        spill.close()
+
+        return ShardResult(
+            shard=shard,
+            output_counts=output_counts,
+            rejected_count=rejected_count,
+            metrics=context.metrics,
+            spill_dir=spill_dir,
+            ids_used=context.record_numbers.last_used(),
+            rows_read=0
+            if context.watermarks is None or mapped is None
+            else context.watermarks.rows(source) - mapped,
+        )
+
+    def merge_shard(self, result: ShardResult) -> None:
+        """copy a shard's spilled records into the real outputs, moving their ids into the shard's block"""
+
+        for output_file in self.context.output_files:
+            # the shard numbered its records from 1 - so offset them to the start of the block
+            block = self.context.record_numbers.allocate(
+                output_file, result.ids_used.get(output_file, 0), result.shard.index
+            )
+
+            auto_num_col = self.cache.target_metadata_cache[output_file]["auto_num_col"]
+            auto_num_idx = (
+                None
+                if auto_num_col is None
+                else self.context.target_column_maps[output_file][auto_num_col]
+            )
+            into = self.context.file_handles[output_file]
+
+            for record in read_spill(result.spill_dir, output_file):
+                if auto_num_idx is not None:
+                    record[auto_num_idx] = str(
+                        block.start + int(record[auto_num_idx]) - 1
+                    )
+                into.write(record)
+
+        self.context.metrics.merge(result.metrics)
+        if self.context.watermarks is not None:
+            self.context.watermarks.advance(
+                result.shard.source_filename, result.rows_read
+            )
+
+        # the records are in the real outputs now - so don't keep a second copy of them on disk
+        shutil.rmtree(result.spill_dir)
+
+    def checkpoint(self, shards: list[Shard], merged: Shard) -> None:
+        """take a checkpoint after a shard was merged - noting if it was its input's last"""
+
+        checkpoints = self._checkpoints
+        if checkpoints is None:
+            return
+
+        # the shards are listed by their index
+        following = merged.index + 1
+        if (
+            following < len(shards)
+            and shards[following].source_filename == merged.source_filename
+        ):
+            checkpoints.save(self.context)
+        else:
+            checkpoints.finish(self.context, merged.source_filename)
+
+    def process_all_data(self) -> ProcessingResult:
+        """Process all data across the worker pool"""
+        global _worker_state
+
+        shards = self.plan_shards()
+        workers = max(1, min(self._workers, len(shards)))
+        logger.info(f"Processing data in {len(shards)} shards over {workers} workers")
+
+        total_output_counts = {outfile: 0 for outfile in self.context.output_files}
+        total_rejected_counts = {infile: 0 for infile in self.context.input_files}
+
+        with tempfile.TemporaryDirectory(prefix="carrot-shards-") as spill_root:
+            self._spill_root = Path(spill_root)
+            _worker_state = self
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                ) as pool:
+                    futures = [pool.submit(_run_shard, shard) for shard in shards]
+
+                    # merge in shard order while the later shards are still running
+                    try:
+                        for shard, future in zip(shards, futures):
+                            try:
+                                result = future.result()
+                            except Exception as e:
+                                logger.error(
+                                    f"Error processing file {shard.source_filename}: {str(e)}"
+                                )
+                                raise
+
+                            self.merge_shard(result)
+                            self.checkpoint(shards, shard)
+
+                            for target_file, count in result.output_counts.items():
+                                total_output_counts[target_file] += count
+                            total_rejected_counts[shard.source_filename] += (
+                                result.rejected_count
+                            )
+                    except BaseException:
+                        # don't wait for the shards that haven't started before giving up
+                        pool.shutdown(cancel_futures=True)
+                        raise
+            finally:
+                _worker_state = None
+                self._spill_root = None
+
+        return ProcessingResult(total_output_counts, total_rejected_counts)
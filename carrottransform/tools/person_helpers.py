@@ -8,6 +8,7 @@ from case_insensitive_dict import CaseInsensitiveDict
 import carrottransform.tools.sources as sources
 from carrottransform.tools.logger import logger_setup
 from carrottransform.tools.mappingrules import MappingRules
+from carrottransform.tools.person_index import PersonDict, PersonLookup
 from carrottransform.tools.validation import valid_date_value, valid_value
 
 logger = logger_setup()
@@ -28,13 +29,13 @@ def load_person_ids_v2_inject(
     mappingrules: MappingRules,
     inputs: sources.SourceObject,
     person: str,
-):
-    # we used to try and load these, but, that's not happening now
-    person_ids = {}
-    person_number = 1
+    person_ids: PersonLookup | None = None,
+) -> tuple[PersonLookup, int]:
+    """load the people - adding them to person_ids (a PersonIndex, or, from a PersonRegistry) if that's passed so existing people keep their ids"""
 
-    # the re-use logic should be re-added
-    use_input_person_ids: str = "N"
+    if person_ids is None:
+        person_ids = PersonDict()
+    person_number = person_ids.next_assigned()
 
     #
     # so now ... load all existing persons?
@@ -75,14 +76,9 @@ def load_person_ids_v2_inject(
             reject_count += 1
             continue
 
-        if person_id not in person_ids:
-            if use_input_person_ids == "N":
-                # create a new integer person_id
-                person_ids[person_id] = str(person_number)
-                person_number += 1
-            else:
-                # use existing person_id
-                person_ids[person_id] = str(person_id)
+        # create a new integer person_id (which the index ignores if it's using the existing ids)
+        if person_ids.add(person_id, person_number):
+            person_number += 1
 
     return person_ids, reject_count
 
@@ -91,8 +87,12 @@ def read_person_ids(
     csvr: Iterator[list[str]],
     mappingrules: MappingRules,
     use_input_person_ids: bool,
-):
-    """revised loading method that accepts an itterator eitehr for a file or for a database connection"""
+    person_ids: PersonLookup | None = None,
+) -> tuple[PersonLookup, int]:
+    """revised loading method that accepts an itterator eitehr for a file or for a database connection
+
+    people are added to person_ids (a PersonIndex, or, from a PersonRegistry) if that's passed so existing people keep their ids
+    """
 
     if not isinstance(use_input_person_ids, bool):
         raise Exception(
@@ -101,8 +101,9 @@ def read_person_ids(
     if not isinstance(csvr, Iterator):
         raise Exception(f"csvr needs to be iterable but it was {type(csvr)=}")
 
-    person_ids = {}
-    person_number = 1
+    if person_ids is None:
+        person_ids = PersonDict(use_input_ids=use_input_person_ids)
+    person_number = person_ids.next_assigned()
 
     # allow situations where SQL is case insensitive (SQL the language is case insensitive)
     # Trino seems to flip column names around and SQL is case insensitive
@@ -135,18 +136,9 @@ def read_person_ids(
         if not valid_date_value(persondata[person_columns[birth_datetime_source]]):
             reject_count += 1
             continue
-        if (
-            persondata[person_col] not in person_ids
-        ):  # if not already in person_ids dict, add it
-            if not use_input_person_ids:
-                person_ids[persondata[person_col]] = str(
-                    person_number
-                )  # create a new integer person_id
-                person_number += 1
-            else:
-                person_ids[persondata[person_col]] = str(
-                    persondata[person_col]
-                )  # use existing person_id
+        # if not already in person_ids, add it with a new integer person_id (or the existing one with use_input_person_ids)
+        if person_ids.add(persondata[person_col], person_number):
+            person_number += 1
 
     return person_ids, reject_count
 
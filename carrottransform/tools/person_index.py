@@ -0,0 +1,215 @@
+"""
+a compact, read-mostly, lookup from the source person ids to the person ids that're written out.
+
+a dict of str -> str costs a couple of python objects (and ~150 bytes) for each person; which is tens of GB for a national cohort.
+this keeps the source ids as utf-8 bytes in one buffer, the assigned ids as integers in an array, and, finds them with an open addressing hash table of indexes into those.
+so each person costs the length of their id and ~32 bytes.
+
+the arrays can be saved into a folder and memory mapped back - so the lookup is paged in from disk (and shared by forked workers) rather than being held in memory.
+lookups are still one hash and (usually) one comparison - but that's python rather than a dict's C, so it's only used with --person-index-dir. otherwise the people are kept in a PersonDict
+"""
+
+import json
+import mmap
+import zlib
+from array import array
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Literal
+
+# each of the arrays is held in one file of the saved folder
+ARRAY_FILES: dict[str, tuple[str, Literal["B", "Q", "q"]]] = {
+    "_keys": ("keys.bin", "B"),
+    "_offsets": ("offsets.bin", "Q"),
+    "_values": ("values.bin", "q"),
+    "_table": ("table.bin", "q"),
+}
+
+# the slot value for an empty slot in the table
+EMPTY = -1
+
+
+def key_hash(key: bytes | bytearray | memoryview) -> int:
+    """a hash that's the same in every process - so a saved table still works when loaded"""
+    return zlib.crc32(key)
+
+
+class PersonDict(dict[str, str]):
+    """the usual lookup from the source person ids to the assigned ones - a dict, with the same add() and next_assigned() as the PersonIndex"""
+
+    def __init__(self, use_input_ids: bool = False):
+        super().__init__()
+
+        # when the input ids are used, they're looked up as-is
+        self._use_input_ids = use_input_ids
+        self._next = 1
+
+    def add(self, person_id: str, assigned: int) -> bool:
+        """add a person - returns False (and changes nothing) if they're already in the dict"""
+        if person_id in self:
+            return False
+        self[person_id] = person_id if self._use_input_ids else str(assigned)
+        self._next = max(self._next, assigned + 1)
+        return True
+
+    def next_assigned(self) -> int:
+        """the assigned id to give the next person added"""
+        return self._next
+
+
+class PersonIndex(Mapping[str, str]):
+    """maps the source person ids to the assigned ones. the ids are iterated in the order they were added"""
+
+    def __init__(self, use_input_ids: bool = False, capacity: int = 1024):
+        # when the input ids are used, they're looked up as-is
+        self._use_input_ids = use_input_ids
+
+        # the source ids; entry i is _keys[_offsets[i]:_offsets[i + 1]]
+        self._keys: bytearray | memoryview = bytearray()
+        self._offsets: array | memoryview = array("Q", [0])
+        self._values: array | memoryview = array("q")
+
+        # the hash table of entry indexes. it's kept under half full
+        size = 1
+        while size < capacity:
+            size *= 2
+        self._table: array | memoryview = array("q", [EMPTY]) * size
+
+        self._mapped: list[mmap.mmap] = []
+
+    def _find(self, key: bytes) -> tuple[int, int]:
+        """find the slot for a key and the entry in it - or EMPTY if the key isn't there"""
+
+        table = self._table
+        offsets = self._offsets
+        keys = self._keys
+        mask = len(table) - 1
+
+        slot = key_hash(key) & mask
+        while True:
+            entry = table[slot]
+            if entry == EMPTY or keys[offsets[entry] : offsets[entry + 1]] == key:
+                return slot, entry
+            slot = (slot + 1) & mask
+
+    def add(self, person_id: str, assigned: int) -> bool:
+        """add a person - returns False (and changes nothing) if they're already in the index"""
+
+        if self._mapped:
+            raise ValueError("a memory mapped PersonIndex can't be added to")
+
+        key = person_id.encode("utf-8")
+        slot, entry = self._find(key)
+        if entry != EMPTY:
+            return False
+
+        assert isinstance(self._keys, bytearray)
+        assert isinstance(self._offsets, array)
+        assert isinstance(self._values, array)
+        assert isinstance(self._table, array)
+
+        self._table[slot] = len(self._values)
+        self._keys += key
+        self._offsets.append(len(self._keys))
+        self._values.append(assigned)
+
+        if len(self._table) < 2 * len(self._values):
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        """double the size of the table and re-insert every entry"""
+
+        table = array("q", [EMPTY]) * (2 * len(self._table))
+        mask = len(table) - 1
+        keys = self._keys
+        offsets = self._offsets
+
+        for entry in range(len(self._values)):
+            slot = key_hash(keys[offsets[entry] : offsets[entry + 1]]) & mask
+            while table[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            table[slot] = entry
+
+        self._table = table
+
+    def next_assigned(self) -> int:
+        """the assigned id to give the next person added"""
+        return 1 + max(self._values, default=0)
+
+    def _value(self, key: str, entry: int) -> str:
+        return key if self._use_input_ids else str(self._values[entry])
+
+    def __getitem__(self, person_id: str) -> str:
+        _, entry = self._find(person_id.encode("utf-8"))
+        if entry == EMPTY:
+            raise KeyError(person_id)
+        return self._value(person_id, entry)
+
+    def get(self, person_id: str, default=None):
+        _, entry = self._find(person_id.encode("utf-8"))
+        if entry == EMPTY:
+            return default
+        return self._value(person_id, entry)
+
+    def __contains__(self, person_id: object) -> bool:
+        if not isinstance(person_id, str):
+            return False
+        return EMPTY != self._find(person_id.encode("utf-8"))[1]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self._keys
+        offsets = self._offsets
+        for entry in range(len(self._values)):
+            yield bytes(keys[offsets[entry] : offsets[entry + 1]]).decode("utf-8")
+
+    def save(self, folder: Path) -> None:
+        """write the index into a folder that map() can read"""
+
+        folder.mkdir(parents=True, exist_ok=True)
+        for name, (filename, _) in ARRAY_FILES.items():
+            (folder / filename).write_bytes(getattr(self, name))
+        (folder / "index.json").write_text(
+            json.dumps({"use_input_ids": self._use_input_ids, "count": len(self)})
+        )
+
+    @staticmethod
+    def map(folder: Path) -> "PersonIndex":
+        """memory map an index that was saved into a folder - it can't be added to"""
+
+        meta = json.loads((folder / "index.json").read_text())
+        index = PersonIndex(meta["use_input_ids"])
+
+        for name, (filename, typecode) in ARRAY_FILES.items():
+            with (folder / filename).open("rb") as file:
+                # empty files can't be mapped - but then there's nothing to map
+                if 0 == (folder / filename).stat().st_size:
+                    view: memoryview = memoryview(array(typecode))
+                else:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    index._mapped.append(mapped)
+                    view = memoryview(mapped).cast(typecode)
+            setattr(index, name, view)
+
+        if meta["count"] != len(index):
+            raise ValueError(f"{folder=} holds {len(index)} people not {meta['count']}")
+        return index
+
+    def spill(self, folder: Path) -> "PersonIndex":
+        """save the index and map it back - so that it's paged from disk rather than held in memory"""
+        self.save(folder)
+        return PersonIndex.map(folder)
+
+
+# the people are looked up in either
+PersonLookup = PersonDict | PersonIndex
+
+
+def empty_person_lookup(use_input_ids: bool, compact: bool) -> PersonLookup:
+    """an empty lookup - the compact PersonIndex (to be spilled to disk) or the quicker PersonDict"""
+    if compact:
+        return PersonIndex(use_input_ids=use_input_ids)
+    return PersonDict(use_input_ids=use_input_ids)
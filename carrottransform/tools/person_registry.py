@@ -0,0 +1,78 @@
+"""
+keeps the person ids that've been handed out between runs - so that a person keeps their id, and, new people get new ones.
+
+the registry is an append-only file of `source_id\\tassigned_id` lines; each run reads it into the person lookup and then appends the people it added.
+since the ids are only ever appended, a run that dies part way through can only lose the people it was adding (and would add them again next time)
+a line that was cut off part way through is ignored (and cut off the file when the next people are appended)
+
+everyone in the registry is in the run's person lookup - and so in its person_ids output - even if they're not in this run's person table.
+that's on purpose; a delta load's person table only has the new people, but the new rows of the other tables still need the earlier people's ids.
+(their person records aren't written again though - those only come from the person table)
+"""
+
+import itertools
+import os
+from pathlib import Path
+
+from carrottransform.tools.logger import logger_setup
+from carrottransform.tools.person_index import PersonDict, PersonLookup
+
+logger = logger_setup()
+
+
+class PersonRegistry:
+    """the person ids handed out by earlier runs"""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._saved = 0
+
+        # the length of the complete lines in the file
+        self._length = 0
+
+    def load(self, index: PersonLookup | None = None) -> PersonLookup:
+        """read the ids that earlier runs handed out into the (empty) lookup - a PersonDict unless one's passed"""
+
+        if index is None:
+            index = PersonDict()
+        length = 0
+        if self._path.is_file():
+            with self._path.open("rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        logger.warning(
+                            f"ignoring the incomplete last line of {self._path}"
+                        )
+                        break
+                    source_id, assigned = line[:-1].decode("utf-8").split("\t")
+                    index.add(source_id, int(assigned))
+                    length += len(line)
+
+        self._saved = len(index)
+        self._length = length
+        return index
+
+    def save(self, index: PersonLookup) -> None:
+        """append the people that have been added to the index since it was loaded"""
+
+        # the lookups keep the order people were added in - so the new people are the ones after those that were loaded
+        added = len(index) - self._saved
+        if added <= 0:
+            return
+
+        data = "".join(
+            f"{source_id}\t{assigned}\n"
+            for source_id, assigned in itertools.islice(
+                index.items(), self._saved, None
+            )
+        ).encode("utf-8")
+        with self._path.open("ab") as file:
+            # an earlier run might have died part way through a line
+            file.truncate(self._length)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        self._saved = len(index)
+        self._length += len(data)
+        logger.info(f"added {added} people to {self._path}")
@@ -0,0 +1,70 @@
+"""
+remembers which people have had their person record written - so that each person is only written once for each source file.
+
+the people in the person lookup are kept as one bit at their assigned id, so it's an eighth of a byte for each person rather than a string in a set.
+anyone that isn't in the lookup (whose records are rejected anyway), or, whose id isn't one that was numbered, is kept by their source id
+"""
+
+import base64
+from collections.abc import Mapping
+from typing import Any
+
+
+class ProcessedPersons:
+    """the people whose person record has been written - for one run"""
+
+    def __init__(self, person_lookup: Mapping[str, str]):
+        self._person_lookup = person_lookup
+
+        # a bitmap of the assigned ids for each source file
+        self._bits: dict[str, bytearray] = {}
+
+        # the people without a (numbered) assigned id
+        self._others: set[str] = set()
+
+    def add(self, source_filename: str, person_id: str) -> bool:
+        """note that the person's record is being written - False if it already was"""
+
+        # the numbered ids run from 1 to the size of the lookup - the input ids (when they're used) can be anything
+        assigned = self._person_lookup.get(person_id)
+        if (
+            assigned is None
+            or not (assigned.isascii() and assigned.isdigit())
+            or len(self._person_lookup) < int(assigned)
+        ):
+            key = f"{source_filename}:{person_id}"
+            if key in self._others:
+                return False
+            self._others.add(key)
+            return True
+
+        number = int(assigned)
+        byte, bit = number >> 3, 1 << (number & 7)
+
+        bits = self._bits.setdefault(source_filename, bytearray())
+        if len(bits) <= byte:
+            bits.extend(bytes(max(byte + 1 - len(bits), len(bits))))
+        elif bits[byte] & bit:
+            return False
+
+        bits[byte] |= bit
+        return True
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "bits": {
+                source: base64.b64encode(bits).decode("ascii")
+                for source, bits in self._bits.items()
+            },
+            "others": sorted(self._others),
+        }
+
+    @staticmethod
+    def from_dict(
+        data: dict[str, Any], person_lookup: Mapping[str, str]
+    ) -> "ProcessedPersons":
+        processed = ProcessedPersons(person_lookup)
+        for source, bits in data["bits"].items():
+            processed._bits[source] = bytearray(base64.b64decode(bits))
+        processed._others = set(data["others"])
+        return processed
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Set, Tuple
+from typing import Tuple
 
 from carrottransform.tools.concept_helpers import (
     generate_combinations,
@@ -151,15 +151,15 @@ class TargetRecordBuilder(ABC):
         # Set auto-increment ID
         if self.context.auto_num_col is not None:
             output_record[self.context.tgtcolmap[self.context.auto_num_col]] = str(
-                self.context.record_numbers[self.context.tgtfilename]
+                self.context.record_numbers.next_id(self.context.tgtfilename)
             )
-            self.context.record_numbers[self.context.tgtfilename] += 1
 
         # Map person ID
         person_id = output_record[self.context.tgtcolmap[self.context.person_id_col]]
-        if person_id in self.context.person_lookup:
+        assigned_person_id = self.context.person_lookup.get(person_id)
+        if assigned_person_id is not None:
             output_record[self.context.tgtcolmap[self.context.person_id_col]] = (
-                self.context.person_lookup[person_id]
+                assigned_person_id
             )
 
             # Update metrics
@@ -199,26 +199,22 @@ class TargetRecordBuilder(ABC):
 class PersonRecordBuilder(TargetRecordBuilder):
     """Specialized builder for person table records"""
 
-    def __init__(self, context: RecordContext):
-        super().__init__(context)
-        self.processed_cache: Set[str] = set()
-
     def build_records(self) -> RecordResult:
         """Build person table records with special merging logic"""
         # Check if person ID mapping exists
         if not self.context.v2_mapping.person_id_mapping:
             return RecordResult(False, 0, self.context.metrics)
 
-        # Create a unique key for this source row
-        person_key = f"{self.context.srcfilename}:{self.context.srcdata[self.context.srccolmap[self.context.v2_mapping.person_id_mapping.source_field]]}"
+        person_id = self.context.srcdata[
+            self.context.srccolmap[
+                self.context.v2_mapping.person_id_mapping.source_field
+            ]
+        ]
 
-        # Only process if we haven't already processed this person record
-        if person_key in self.processed_cache:
+        # Only process (and mark as processed) if we haven't already processed this person record
+        if not self.context.processed_persons.add(self.context.srcfilename, person_id):
             return RecordResult(False, 0, self.context.metrics)
 
-        # Mark this person as processed
-        self.processed_cache.add(person_key)
-
         # Collect all mappings from all fields
         all_concept_mappings, all_original_values = self._collect_all_mappings()
 
@@ -398,21 +394,10 @@ class StandardRecordBuilder(TargetRecordBuilder):
 class RecordBuilderFactory:
     """Factory for creating appropriate record builders"""
 
-    # Class-level cache for person records
-    _person_processed_cache: Set[str] = set()
-
     @classmethod
     def create_builder(cls, context: RecordContext) -> TargetRecordBuilder:
         """Create the appropriate record builder based on table type"""
         if context.tgtfilename == "person":
-            builder = PersonRecordBuilder(context)
-            # Share the class-level cache across all person builders
-            builder.processed_cache = cls._person_processed_cache
-            return builder
+            return PersonRecordBuilder(context)
         else:
             return StandardRecordBuilder(context)
-
-    @classmethod
-    def clear_person_cache(cls):
-        """Clear the person processed cache (useful for testing or new runs)"""
-        cls._person_processed_cache.clear()
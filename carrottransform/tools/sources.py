@@ -1,18 +1,25 @@
+import collections
 import csv
 import io
 import itertools
 import logging
+import operator
+import os
 import re
+import weakref
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterator
+from typing import Any, Iterator
 
 import boto3
+import botocore.exceptions
 import click
 import sqlalchemy
-from sqlalchemy import MetaData, select
+from sqlalchemy import MetaData, Table, select
 
 from carrottransform import require
-from carrottransform.tools import at_path, outputs
+from carrottransform.tools import at_path, compressed, outputs
 from carrottransform.tools.outputs import s3_bucket_folder
 
 logger = logging.getLogger(__name__)
@@ -30,6 +37,42 @@ def keen_head(data):
     return itertools.chain([first], data)
 
 
+def project(
+    rows: Iterator[list[str]], columns: list[str] | None
+) -> Iterator[list[str]]:
+    """
+    only pass on the `columns` of the header and rows - all of them if that's None.
+
+    the column names are matched case insensitively (as the rules' are) and kept in the table's order
+    """
+
+    if columns is None:
+        yield from rows
+        return
+
+    header = next(rows, None)
+    if header is None:
+        return
+
+    wanted = {column.lower() for column in columns}
+    keep = [index for index, name in enumerate(header) if name.lower() in wanted]
+    yield [header[index] for index in keep]
+
+    if len(keep) == len(header):
+        yield from rows
+    elif 1 == len(keep):
+        only = keep[0]
+        for row in rows:
+            yield [row[only]]
+    elif keep:
+        pick = operator.itemgetter(*keep)
+        for row in rows:
+            yield list(pick(row))
+    else:
+        for _ in rows:
+            yield []
+
+
 class SourceNotFound(Exception):
     def __init__(self, path):
         super().__init__(f"couldn't open the source at {path=}")
@@ -46,13 +89,45 @@ class SourceObject:
     def __init__(self):
         pass
 
-    def open(self, table: str) -> Iterator[list[str]]:
+    def open(self, table: str, columns: list[str] | None = None) -> Iterator[list[str]]:
+        """
+        open a table - yielding the header and then each row.
+
+        `columns` lists the columns that will be used. sources that can skip reading the others only yield those (in the table's order) - the rest yield everything
+        """
         require(not table.endswith(".csv"))  # debugging check
         raise Exception("virtual method called")
 
     def close(self):
         raise Exception("virtual method called")
 
+    def has_table(self, table: str) -> bool:
+        """check that a table can be opened - sources that can check without reading anything override this"""
+        try:
+            keen_head(self.open(table))
+        except SourceTableNotFound:
+            return False
+        return True
+
+    def shard(self, table: str, size: int) -> list[tuple[int, int | None]]:
+        """
+        split a table into (start, end) ranges of roughly `size` bytes that can be read independently with `open_range()`.
+
+        sources that can't be split return a single range covering everything
+        """
+        return [(0, None)]
+
+    def open_range(
+        self,
+        table: str,
+        start: int,
+        end: int | None,
+        columns: list[str] | None = None,
+    ) -> Iterator[list[str]]:
+        """open one of the ranges from `shard()` - this yields the header first, as `open()` does"""
+        require(start == 0 and end is None, "this source can't be split into ranges")
+        return self.open(table, columns)
+
 
 class SourceObjectArgumentType(click.ParamType):
     name = "a connection to the/a source (whatever that may be)"
@@ -63,6 +138,9 @@ class SourceObjectArgumentType(click.ParamType):
             # TODO; do something else with the separators
             return minio_source_object(value, "\t")
 
+        if value.startswith("parquet:"):
+            return parquet_source_object(at_path.convert_path(value[len("parquet:") :]))
+
         if re.match(r"[\w]+://.+", value):
             return sql_source_object(sqlalchemy.create_engine(value))
 
@@ -73,9 +151,48 @@ class SourceObjectArgumentType(click.ParamType):
 SourceArgument = SourceObjectArgumentType()
 
 
-def sql_source_object(connection: sqlalchemy.engine.Engine | str) -> SourceObject:
+# the tables reflected from each engine - so that each one is only reflected once
+_reflected: "weakref.WeakKeyDictionary[sqlalchemy.engine.Engine, MetaData]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def reflected_table(connection: sqlalchemy.engine.Connection, table: str) -> Table:
+    """get the reflected metadata for a table, reflecting it the first time it's used with the engine"""
+
+    metadata = _reflected.setdefault(connection.engine, MetaData())
+    if table not in metadata.tables:
+        try:
+            metadata.reflect(bind=connection, only=[table])
+        except sqlalchemy.exc.InvalidRequestError:
+            raise SourceTableNotFound(table)
+    return metadata.tables[table]
+
+
+# the engines the sql sources read through. worker processes are forked from this one; they must not reuse the parent's pooled connections
+_engines: "weakref.WeakSet[sqlalchemy.engine.Engine]" = weakref.WeakSet()
+
+
+def _dispose_engines_after_fork() -> None:
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+
+def sql_source_object(
+    connection: sqlalchemy.engine.Engine | str, fetch_size: int = 10_000
+) -> SourceObject:
+    """
+    reads tables through SQLAlchemy.
+
+    rows are streamed from a server side cursor (where the driver has them) `fetch_size` at a time so large tables don't need to fit in memory
+    """
     SQL_TO_LOWER: bool = True
 
+    require(0 < fetch_size, f"{fetch_size=}")
+
     # if the parameter is not a connection; make it one
     # ... and fail-fast if it can't be used to open a connection
     engine: sqlalchemy.engine.Engine = (
@@ -84,6 +201,8 @@ def sql_source_object(connection: sqlalchemy.engine.Engine | str) -> SourceObjec
         else sqlalchemy.create_engine(connection)
     )
 
+    _engines.add(engine)
+
     class SO(SourceObject):
         def __init__(self):
             pass
@@ -91,7 +210,16 @@ def sql_source_object(connection: sqlalchemy.engine.Engine | str) -> SourceObjec
         def close(self):
             pass
 
-        def open(self, table: str) -> Iterator[list[str]]:
+        def has_table(self, table: str) -> bool:
+            table = table.lower() if SQL_TO_LOWER else table
+            metadata = _reflected.get(engine)
+            if metadata is not None and table in metadata.tables:
+                return True
+            return sqlalchemy.inspect(engine).has_table(table)
+
+        def open(
+            self, table: str, columns: list[str] | None = None
+        ) -> Iterator[list[str]]:
             require(
                 not table.endswith(".csv"),
                 f"table names shouldn't have a file extension {table=}",
@@ -103,16 +231,34 @@ def sql_source_object(connection: sqlalchemy.engine.Engine | str) -> SourceObjec
 
             def sql() -> Iterator[list[str]]:
                 with engine.connect() as connection:
-                    metadata = MetaData()
-                    metadata.reflect(bind=connection, only=[table])
-                    source = metadata.tables[table]
-                    result = connection.execute(select(source))
-
-                    header: list[str]
-                    try:
-                        header = list(result.keys())
-                    except Exception as e:
-                        raise Exception(f"{table} raised error on .keys(); {e=}")
+                    source = reflected_table(connection, table)
+
+                    # only select the columns that are used
+                    selected = list(source.columns)
+                    if columns is not None:
+                        wanted = {column.lower() for column in columns}
+                        selected = [
+                            column
+                            for column in selected
+                            if column.name.lower() in wanted
+                        ]
+
+                    # ... but there need to be some to count the rows with
+                    query = (
+                        select(*selected)
+                        if selected
+                        else select(sqlalchemy.literal(1)).select_from(source)
+                    )
+                    result = connection.execution_options(yield_per=fetch_size).execute(
+                        query
+                    )
+
+                    header: list[str] = []
+                    if selected:
+                        try:
+                            header = list(result.keys())
+                        except Exception as e:
+                            raise Exception(f"{table} raised error on .keys(); {e=}")
 
                     if SQL_TO_LOWER:
                         header = list(map(lambda a: a.lower(), header))
@@ -120,7 +266,7 @@ def sql_source_object(connection: sqlalchemy.engine.Engine | str) -> SourceObjec
                     yield header
 
                     for row in result:
-                        yield list(row)
+                        yield list(row) if selected else []
 
             return keen_head(sql())
 
@@ -145,110 +291,501 @@ def csv_source_object(path: Path, sep: str) -> SourceObject:
         def close(self):
             pass
 
-        def open(self, table: str) -> Iterator[list[str]]:
-            return keen_head(self.open_really(table))
+        def open(
+            self, table: str, columns: list[str] | None = None
+        ) -> Iterator[list[str]]:
+            return keen_head(project(self.open_really(table), columns))
 
-        def open_really(self, table: str) -> Iterator[list[str]]:
+        def has_table(self, table: str) -> bool:
             require(not table.endswith(".csv"))
+            return self.find(table) is not None
 
-            file = path / (table + ext)
+        def find(self, table: str) -> Path | None:
+            """the file for the table - either `table.csv` or a compressed `table.csv.gz` (etc.)"""
+            for suffix in ["", *compressed.SUFFIXES]:
+                file = path / (table + ext + suffix)
+                if file.is_file():
+                    return file
+            return None
 
-            if not file.is_file():
+        def file(self, table: str) -> Path:
+            require(not table.endswith(".csv"))
+
+            file = self.find(table)
+
+            if file is None:
                 logger.error(f"couldn't find {table=} in csvs at path {path=}")
                 raise SourceTableNotFound(table)
 
-            # csvs can have trailing commas (from excel)
-            # we remove the last column if the column name is "" and check that each row's entry is also ""
-            trimmed = False  # are we trimming off the last entry for this object?
-            count = -1
+            return file
 
-            for row in csv.reader(file.open("r", encoding="utf-8-sig"), delimiter=sep):
-                if count == -1:
-                    count = len(row)
-                    if row[-1].strip() == "":
-                        trimmed = True
-                        count = len(row) - 1
+        def shard(self, table: str, size: int) -> list[tuple[int, int | None]]:
+            file = self.file(table)
 
-                if trimmed:
-                    require(row[-1].strip() == "")
-                    row = row[:-1]
+            # there's no seeking into the middle of a compressed file
+            if compressed.suffix_of(file.name) is not None:
+                return [(0, None)]
 
-                require(len(row) == count)
+            return line_aligned_ranges(file, size)
 
-                yield row
+        def open_range(
+            self,
+            table: str,
+            start: int,
+            end: int | None,
+            columns: list[str] | None = None,
+        ) -> Iterator[list[str]]:
+            return keen_head(
+                project(self.open_range_really(table, start, end), columns)
+            )
+
+        def open_range_really(
+            self, table: str, start: int, end: int | None
+        ) -> Iterator[list[str]]:
+            file = self.file(table)
+
+            if compressed.suffix_of(file.name) is not None:
+                require(start == 0 and end is None, "compressed files can't be split")
+                yield from self.open_really(table)
+                return
+
+            with file.open("rb") as raw:
+                header_line = raw.readline()
+
+                def lines() -> Iterator[str]:
+                    # the ranges are line aligned, but, the header has already been read from the first one
+                    position = max(start, len(header_line))
+                    raw.seek(position)
+                    while end is None or position < end:
+                        line = raw.readline()
+                        if not line:
+                            break
+                        position += len(line)
+                        yield line.decode("utf-8")
+
+                yield from trim_rows(
+                    csv.reader(
+                        itertools.chain([header_line.decode("utf-8-sig")], lines()),
+                        delimiter=sep,
+                    )
+                )
+
+        def open_really(self, table: str) -> Iterator[list[str]]:
+            file = self.file(table)
+
+            suffix = compressed.suffix_of(file.name)
+            if suffix is None:
+                text = file.open("r", encoding="utf-8-sig")
+            else:
+                text = io.TextIOWrapper(
+                    compressed.decompressed(file.open("rb"), suffix),
+                    encoding="utf-8-sig",
+                )
+
+            with text:
+                yield from trim_rows(csv.reader(text, delimiter=sep))
 
     return SO()
 
 
-def s3_source_object(coordinate: str, sep: str) -> SourceObject:
+def trim_rows(rows: Iterator[list[str]]) -> Iterator[list[str]]:
+    """checks the rows of a csv all have the header's length"""
+
+    # csvs can have trailing commas (from excel)
+    # we remove the last column if the column name is "" and check that each row's entry is also ""
+    trimmed = False  # are we trimming off the last entry for this object?
+    count = -1
+
+    for row in rows:
+        if count == -1:
+            count = len(row)
+            if row[-1].strip() == "":
+                trimmed = True
+                count = len(row) - 1
+
+        if trimmed:
+            require(row[-1].strip() == "")
+            row = row[:-1]
+
+        require(len(row) == count)
+
+        yield row
+
+
+def line_aligned_ranges(file: Path, size: int) -> list[tuple[int, int | None]]:
+    """
+    split a delimited text file into (start, end) byte ranges of roughly `size` bytes which each begin at the start of a line.
+
+    the first range starts at 0 so it includes the header. this assumes that quoted values don't contain line breaks
+    """
+
+    require(0 < size, f"ranges need a positive size but {size=}")
+
+    total = file.stat().st_size
+    starts = [0]
+
+    with file.open("rb") as raw:
+        position = len(raw.readline())
+        while position + size < total:
+            raw.seek(position + size)
+            raw.readline()
+            position = raw.tell()
+            if position >= total:
+                break
+            starts.append(position)
+
+    ends: list[int | None] = [*starts[1:], None]
+    return list(zip(starts, ends))
+
+
+def parquet_source_object(path: Path, batch_size: int = 10_000) -> SourceObject:
+    """
+    reads a folder of `<table>.parquet` files.
+
+    the files are read `batch_size` rows at a time, and, only the columns that were asked for are read.
+    arrow casts the values to strings so the rows look like they would from a csv - with nulls as ""
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise Exception(
+            "reading parquet needs pyarrow - install carrot_transform[parquet]"
+        ) from e
+
+    if not path.is_dir():
+        raise SourceNotFound(path)
+
     class SO(SourceObject):
-        def __init__(self, coordinate: str):
-            [b, f] = s3_bucket_folder(coordinate)
-            self._bucket_resource = boto3.resource("s3").Bucket(b)
-            self._bucket_folder = f
+        def __init__(self):
+            pass
 
         def close(self):
-            self._bucket_resource = None
+            pass
 
-        def open(self, table: str) -> Iterator[list[str]]:
-            require(not table.endswith(".csv"))
+        def file(self, table: str) -> Path:
+            require(not table.endswith(".parquet"))
 
-            key = self._bucket_folder + table
+            file = path / (table + ".parquet")
 
-            # Example: read CSV from S3
-            try:
-                obj = self._bucket_resource.Object(key)
+            if not file.is_file():
+                logger.error(f"couldn't find {table=} in parquet files at path {path=}")
+                raise SourceTableNotFound(table)
 
-                # Stream the content without loading everything into memory
-                stream = obj.get()["Body"]
-                text_stream = io.TextIOWrapper(stream, encoding="utf-8")
-                reader = csv.reader(text_stream, delimiter=sep)
+            return file
+
+        def has_table(self, table: str) -> bool:
+            return (path / (table + ".parquet")).is_file()
+
+        def open(
+            self, table: str, columns: list[str] | None = None
+        ) -> Iterator[list[str]]:
+            return keen_head(self.open_really(table, 0, None, columns))
+
+        def shard(self, table: str, size: int) -> list[tuple[int, int | None]]:
+            """split the file into runs of row groups, rather than bytes"""
+            require(0 < size, f"ranges need a positive size but {size=}")
+
+            metadata = pq.ParquetFile(self.file(table)).metadata
+            starts = [0]
+            total = 0
+            for index in range(metadata.num_row_groups):
+                if size <= total:
+                    starts.append(index)
+                    total = 0
+                total += metadata.row_group(index).total_byte_size
+
+            ends: list[int | None] = [*starts[1:], None]
+            return list(zip(starts, ends))
+
+        def open_range(
+            self,
+            table: str,
+            start: int,
+            end: int | None,
+            columns: list[str] | None = None,
+        ) -> Iterator[list[str]]:
+            return keen_head(self.open_really(table, start, end, columns))
+
+        def open_really(
+            self,
+            table: str,
+            start: int,
+            end: int | None,
+            columns: list[str] | None,
+        ) -> Iterator[list[str]]:
+            with pq.ParquetFile(self.file(table)) as parquet:
+                header = list(parquet.schema_arrow.names)
+                if columns is not None:
+                    # the rules' column names are case insensitive
+                    wanted = {column.lower() for column in columns}
+                    header = [name for name in header if name.lower() in wanted]
+
+                yield header
+
+                row_groups = list(
+                    range(start, parquet.num_row_groups if end is None else end)
+                )
+                if not row_groups or not header:
+                    return
+
+                for batch in parquet.iter_batches(
+                    batch_size=batch_size, row_groups=row_groups, columns=header
+                ):
+                    values = [
+                        column.cast(pa.string()).fill_null("").to_pylist()
+                        for column in batch.columns
+                    ]
+                    for row in zip(*values):
+                        yield list(row)
 
-                for row in reader:
-                    yield row
-                stream.close()
-            except Exception as e:
-                logger.error(f"Failed to read {table=} from S3: {e=} w/ {key=}")
-                exit(1)
+    return SO()
 
-    return SO(coordinate)
+
+# the size of the ranges objects are fetched in, and, how many are fetched at once
+OBJECT_CHUNK_SIZE = 8 * 1024 * 1024
+OBJECT_READ_AHEAD = 4
+
+# how much is fetched at a time when looking for the end of a line
+LINE_PROBE_SIZE = 64 * 1024
 
 
-def minio_source_object(coordinate: str, sep: str) -> SourceObject:
+def fetch_ranges(
+    fetch: Callable[[int, int], bytes],
+    start: int,
+    end: int,
+    chunk_size: int = OBJECT_CHUNK_SIZE,
+    read_ahead: int = OBJECT_READ_AHEAD,
+) -> Iterator[bytes]:
+    """yield the bytes from start to end - fetched as chunk_size ranges, read_ahead of them at once - in order"""
+
+    require(0 < chunk_size, f"{chunk_size=}")
+    require(0 < read_ahead, f"{read_ahead=}")
+
+    offsets = iter(range(start, end, chunk_size))
+    with ThreadPoolExecutor(
+        max_workers=read_ahead, thread_name_prefix="object-read"
+    ) as pool:
+        pending: collections.deque[Future[bytes]] = collections.deque()
+
+        def more() -> None:
+            for offset in itertools.islice(offsets, read_ahead - len(pending)):
+                pending.append(
+                    pool.submit(fetch, offset, min(offset + chunk_size, end))
+                )
+
+        more()
+        try:
+            while pending:
+                chunk = pending.popleft().result()
+                more()
+                yield chunk
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class ChunkStream(io.RawIOBase):
+    """a readable stream of the chunks from an iterator - so they can be decoded and parsed as one"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+
+        # the chunk being read, and, how far into it the reads have got - slicing the bytes would copy the rest of it each time
+        self._chunk = memoryview(b"")
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._chunk) <= self._offset:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+            self._offset = 0
+
+        count = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:count] = self._chunk[self._offset : self._offset + count]
+        self._offset += count
+        return count
+
+    def close(self) -> None:
+        # stop fetching anything that's still to come
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+
+def line_end(fetch: Callable[[int, int], bytes], total: int, position: int) -> int:
+    """the position after the end of the line that position is in - or the end of the object"""
+
+    while position < total:
+        probe = fetch(position, min(position + LINE_PROBE_SIZE, total))
+        newline = probe.find(b"\n")
+        if -1 != newline:
+            return position + newline + 1
+        position += len(probe)
+    return total
+
+
+def object_line_aligned_ranges(
+    fetch: Callable[[int, int], bytes], total: int, size: int
+) -> list[tuple[int, int | None]]:
+    """the same ranges as `line_aligned_ranges()` - for an object that's read with ranged requests"""
+
+    require(0 < size, f"ranges need a positive size but {size=}")
+
+    starts = [0]
+    position = line_end(fetch, total, 0)
+    while position + size < total:
+        position = line_end(fetch, total, position + size)
+        if position >= total:
+            break
+        starts.append(position)
+
+    ends: list[int | None] = [*starts[1:], None]
+    return list(zip(starts, ends))
+
+
+def bucket_source_object(
+    connect: Callable[[], Any],
+    bucket: str,
+    folder: str,
+    sep: str,
+    chunk_size: int = OBJECT_CHUNK_SIZE,
+    read_ahead: int = OBJECT_READ_AHEAD,
+) -> SourceObject:
+    """
+    reads delimited text objects out of a folder of an s3 (or minio) bucket.
+
+    objects are fetched as ranges of `chunk_size` bytes with `read_ahead` of them being fetched at once; `connect` makes the (thread safe) boto3 client to fetch them with.
+    they can also be split into line aligned ranges that are read independently
+    """
+
     class SO(SourceObject):
-        def __init__(self, coordinate: str):
-            bucket = outputs.MinioURL(coordinate)
+        def __init__(self) -> None:
+            # a client for each process - the --workers are forked, and, a client's connections can't be shared with the parent
+            self._clients: dict[int, Any] = {}
 
-            self._bucket_resource = boto3.resource(
-                "s3",
-                endpoint_url=f"{bucket._protocol}://{bucket._host}:{bucket._port}",
-                aws_access_key_id=bucket._user,
-                aws_secret_access_key=bucket._pass,
-            ).Bucket(bucket._bucket)
-            self._bucket_folder = bucket._folder
+        def client(self):
+            pid = os.getpid()
+            if pid not in self._clients:
+                self._clients[pid] = connect()
+            return self._clients[pid]
 
         def close(self):
-            self._bucket_resource = None
+            pass
 
-        def open(self, table: str) -> Iterator[list[str]]:
+        def locate(self, table: str) -> tuple[str, int]:
+            """the key and size of the table's object - either `table` or a compressed `table.gz` (etc.)"""
             require(not table.endswith(".csv"))
 
-            key = self._bucket_folder + table
+            client = self.client()
+            for suffix in ["", *compressed.SUFFIXES]:
+                key = folder + table + suffix
+                try:
+                    head = client.head_object(Bucket=bucket, Key=key)
+                except botocore.exceptions.ClientError as e:
+                    if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                        continue
+                    raise
+                return key, head["ContentLength"]
+
+            raise SourceTableNotFound(table)
+
+        def fetcher(self, key: str) -> Callable[[int, int], bytes]:
+            # the client is got here - the fetches happen on the read-ahead threads
+            client = self.client()
+
+            def fetch(start: int, end: int) -> bytes:
+                response = client.get_object(
+                    Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}"
+                )
+                return response["Body"].read()
+
+            return fetch
+
+        def open(
+            self, table: str, columns: list[str] | None = None
+        ) -> Iterator[list[str]]:
+            return self.open_range(table, 0, None, columns)
+
+        def shard(self, table: str, size: int) -> list[tuple[int, int | None]]:
+            key, total = self.locate(table)
+
+            # there's no starting in the middle of a compressed object
+            if compressed.suffix_of(key) is not None:
+                return [(0, None)]
+
+            return object_line_aligned_ranges(self.fetcher(key), total, size)
+
+        def open_range(
+            self,
+            table: str,
+            start: int,
+            end: int | None,
+            columns: list[str] | None = None,
+        ) -> Iterator[list[str]]:
+            key = folder + table
 
-            # Example: read CSV from S3
             try:
-                obj = self._bucket_resource.Object(key)
-
-                # Stream the content without loading everything into memory
-                stream = obj.get()["Body"]
-                text_stream = io.TextIOWrapper(stream, encoding="utf-8")
-                reader = csv.reader(text_stream, delimiter=sep)
-
-                for row in reader:
-                    yield row
-                stream.close()
+                key, total = self.locate(table)
+                fetch = self.fetcher(key)
+
+                suffix = compressed.suffix_of(key)
+                if suffix is not None:
+                    require(
+                        start == 0 and end is None, "compressed objects can't be split"
+                    )
+                    binary = compressed.decompressed(
+                        io.BufferedReader(
+                            ChunkStream(
+                                fetch_ranges(fetch, 0, total, chunk_size, read_ahead)
+                            )
+                        ),
+                        suffix,
+                    )
+                else:
+                    # the ranges are line aligned, but, every one starts with the header
+                    stop = total if end is None else end
+                    header_end = line_end(fetch, total, 0)
+                    chunks = itertools.chain(
+                        [fetch(0, header_end)] if header_end else [],
+                        fetch_ranges(
+                            fetch, max(start, header_end), stop, chunk_size, read_ahead
+                        ),
+                    )
+                    binary = io.BufferedReader(ChunkStream(chunks))
+
+                with io.TextIOWrapper(binary, encoding="utf-8") as text_stream:
+                    reader = csv.reader(text_stream, delimiter=sep)
+
+                    yield from project(reader, columns)
             except Exception as e:
                 logger.error(f"Failed to read {table=} from S3: {e=} w/ {key=}")
                 exit(1)
 
-    return SO(coordinate)
+    return SO()
+
+
+def s3_source_object(coordinate: str, sep: str) -> SourceObject:
+    [bucket, folder] = s3_bucket_folder(coordinate)
+    return bucket_source_object(lambda: boto3.client("s3"), bucket, folder, sep)
+
+
+def minio_source_object(coordinate: str, sep: str) -> SourceObject:
+    bucket = outputs.MinioURL(coordinate)
+
+    def connect():
+        return boto3.client(
+            "s3",
+            endpoint_url=f"{bucket._protocol}://{bucket._host}:{bucket._port}",
+            aws_access_key_id=bucket._user,
+            aws_secret_access_key=bucket._pass,
+        )
+
+    return bucket_source_object(connect, bucket._bucket, bucket._folder, sep)
@@ -0,0 +1,87 @@
+"""
+generates synthetic inputs, of any size, that have the same shape as the example inputs in `carrottransform/examples/test/inputs`.
+
+each column is filled with values picked (from a seeded random) out of the values the example has in that column - so the example rules still map them.
+the person table gets one row per person, the others get some rows for each person, and, the dates are picked out of a pool of `distinct_dates` days.
+"""
+
+import csv
+import hashlib
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+from carrottransform.tools.date_helpers import get_datetime_value
+from carrottransform.tools.logger import logger_setup
+
+logger = logger_setup()
+
+# the example inputs the generated ones are modelled on
+EXAMPLE_INPUTS = Path(__file__).parent.parent / "examples/test/inputs"
+
+# the first day in the pool of dates
+FIRST_DATE = date(2019, 1, 1)
+
+
+def is_date_column(values: list[str]) -> bool:
+    """the column is a date if every value starts with one"""
+    return all(get_datetime_value(value.split(" ")[0]) is not None for value in values)
+
+
+def person_id(seed: int, index: int) -> str:
+    """a made-up person id that looks like the (hashed) ones in the examples"""
+    return hashlib.sha256(f"{seed}:{index}".encode()).hexdigest()
+
+
+def generate_inputs(
+    into: Path,
+    tables: list[str],
+    person_table: str,
+    persons: int,
+    rows_per_person: int = 1,
+    distinct_dates: int = 365,
+    seed: int = 0,
+    examples: Path = EXAMPLE_INPUTS,
+) -> dict[str, int]:
+    """write the synthetic tables into a folder and return the number of rows written into each"""
+
+    into.mkdir(parents=True, exist_ok=True)
+    rows_written: dict[str, int] = {}
+
+    for table in tables:
+        with (examples / f"{table}.csv").open(encoding="utf-8", newline="") as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            example = list(reader)
+
+        columns = list(zip(*example))
+
+        # the pools of values for each column. the first column is the person id
+        pools: list[list[str]] = [sorted(set(column)) for column in columns]
+        for index, column in enumerate(columns[1:], start=1):
+            if not is_date_column(list(column)):
+                continue
+
+            # keep whatever time suffix the example has
+            suffix = column[0][10:]
+            pools[index] = [
+                (FIRST_DATE + timedelta(days=day)).isoformat() + suffix
+                for day in range(distinct_dates)
+            ]
+
+        # a separate random for each table so that the tables don't change if others are added
+        rand = random.Random(f"{seed}:{table}")
+        count = 1 if table == person_table else rows_per_person
+
+        with (into / f"{table}.csv").open("w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for person in range(persons):
+                pid = person_id(seed, person)
+                for _ in range(count):
+                    writer.writerow([pid] + [rand.choice(pool) for pool in pools[1:]])
+
+        rows_written[table] = persons * count
+        logger.info(f"generated {rows_written[table]} rows for {table}")
+
+    return rows_written
@@ -6,9 +6,12 @@ from case_insensitive_dict import CaseInsensitiveDict
 import carrottransform.tools as tools
 import carrottransform.tools.outputs as outputs
 import carrottransform.tools.sources as sources
+from carrottransform.tools.id_allocator import IdAllocator
 from carrottransform.tools.mapping_types import V2TableMapping
 from carrottransform.tools.mappingrules import MappingRules
 from carrottransform.tools.omopcdm import OmopCDM
+from carrottransform.tools.processed_persons import ProcessedPersons
+from carrottransform.tools.watermarks import Watermarks
 
 
 @dataclass
@@ -17,13 +20,19 @@ class ProcessingContext:
 
     mappingrules: MappingRules
     omopcdm: OmopCDM
-    person_lookup: dict[str, str]
-    record_numbers: dict[str, int]
+    person_lookup: Mapping[str, str]
+    record_numbers: IdAllocator
     file_handles: dict[str, outputs.OutputTarget.Handle]
     target_column_maps: dict[str, CaseInsensitiveDict[str, int]]
     metrics: tools.metrics.Metrics
     inputs: sources.SourceObject
 
+    # the people whose person record has been written in this run
+    processed_persons: ProcessedPersons
+
+    # when set, only the rows past these are mapped
+    watermarks: Watermarks | None = None
+
     @property
     def input_files(self) -> list[str]:
         return self.mappingrules.get_all_infile_names()
@@ -55,14 +64,15 @@ class RecordContext:
     srcfilename: str
     omopcdm: OmopCDM
     metrics: tools.metrics.Metrics
-    person_lookup: dict[str, str]
-    record_numbers: dict[str, int]
+    person_lookup: Mapping[str, str]
+    record_numbers: IdAllocator
     file_handles: Mapping[str, TextIO | outputs.OutputTarget.Handle]
     auto_num_col: str | None
     person_id_col: str
     date_col_data: dict[str, str]
     date_component_data: dict[str, dict[str, str]]
     notnull_numeric_fields: list[str]
+    processed_persons: ProcessedPersons
 
 
 @dataclass
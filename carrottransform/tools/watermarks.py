@@ -0,0 +1,69 @@
+"""
+tracks how many rows of each input have been mapped - so that a later run can map only the rows that've been added since.
+
+this assumes the inputs are only ever appended to; an input with fewer rows than were mapped last time has been replaced, and, the run stops rather than guessing which rows are new.
+the watermarks are saved in the same `name\\tcount` format as the `--last-used-ids-file`
+"""
+
+import itertools
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+from carrottransform import require
+
+
+class Watermarks:
+    """the number of rows mapped from each input"""
+
+    def __init__(self, rows: dict[str, int] | None = None):
+        self._rows: dict[str, int] = {} if rows is None else dict(rows)
+
+    @staticmethod
+    def load(watermarks_file: Path) -> "Watermarks":
+        """read the rows mapped by an earlier run"""
+        watermarks = Watermarks()
+        with watermarks_file.open("r", encoding="utf-8") as file:
+            for line in file:
+                source, rows = line.rstrip("\n").split("\t")
+                watermarks._rows[source] = int(rows)
+        return watermarks
+
+    def save(self, watermarks_file: Path) -> None:
+        """write the watermarks (via a temporary file so that a failed write leaves the old ones)"""
+        temp = watermarks_file.with_name(watermarks_file.name + ".tmp")
+        with temp.open("w", encoding="utf-8") as file:
+            for source, rows in self._rows.items():
+                file.write(f"{source}\t{rows}\n")
+        os.replace(temp, watermarks_file)
+
+    def to_dict(self) -> dict[str, int]:
+        return dict(self._rows)
+
+    def rows(self, source: str) -> int:
+        """how many rows of the source have been mapped"""
+        return self._rows.get(source, 0)
+
+    def advance(self, source: str, rows: int) -> None:
+        """note that some more of the source's rows were mapped"""
+        self._rows[source] = self.rows(source) + rows
+
+    def skip(self, source: str, rows: Iterator[list[str]]) -> Iterator[list[str]]:
+        """yield the header and then only the rows past the watermark - moving it along as they're read"""
+
+        yield next(rows)
+
+        # count the rows as they're skipped, and, only check there were enough once they have been
+        mapped = self.rows(source)
+        skipped = 0
+        for skipped, _ in enumerate(itertools.islice(rows, mapped), 1):
+            pass
+        require(
+            skipped == mapped,
+            f"{source=} has {skipped} rows but {mapped} were mapped by an earlier run; it's been replaced rather than added to",
+        )
+
+        self._rows[source] = mapped
+        for row in rows:
+            self._rows[source] += 1
+            yield row
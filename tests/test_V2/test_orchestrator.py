@@ -6,6 +6,7 @@ import csv
 import json
 import shutil
 import tempfile
+from collections.abc import Mapping
 from pathlib import Path
 from unittest.mock import Mock, patch
 
@@ -274,7 +275,7 @@ class TestV2ProcessingOrchestrator:
         person_lookup, rejected_count = orchestrator.setup_person_lookup()
 
         # Check that person lookup was created correctly
-        assert isinstance(person_lookup, dict)
+        assert isinstance(person_lookup, Mapping)
 
         # Verify data quality validation worked correctly:
         # - 3 records should be rejected (empty ID, incomplete date, bad date format)
@@ -420,6 +421,7 @@ class TestStreamProcessor:
         context.omopcdm.get_column_map.return_value = {"person_id": 0, "birth_date": 1}
         context.db_connection = None
         context.schema = None
+        context.watermarks = None
         return context
 
     @pytest.fixture
@@ -0,0 +1,87 @@
+"""
+checks that the v2 batch engine writes exactly what the row engine writes
+
+# λ uv run pytest tests/test_batch_engine.py
+
+"""
+
+import shutil
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools import parallel
+from tests.testools import run_v2, test_data
+
+
+def awkward_inputs(tmp_path: Path) -> Path:
+    """the integration_test1 inputs with more rows, repeated values, and rows that get rejected in different ways"""
+
+    inputs = tmp_path / "inputs"
+    shutil.copytree(test_data / "integration_test1", inputs)
+
+    weights = inputs / "src_WEIGHT.csv"
+    lines = weights.read_text().splitlines()
+    with weights.open("w") as file:
+        file.write(lines[0] + "\n")
+        for i in range(50):
+            for line in lines[1:]:
+                person, date, kgs, _ = line.split(",")
+                file.write(f"{person},{date},{float(kgs) + i % 3},\n")
+            file.write(f"404,2023-10-12,{70 + i},\n")  # not a person
+            file.write("6789,2023-10-12,,\n")  # blank value
+            file.write("6789,sometime,71,\n")  # bad date
+
+    smoking = inputs / "src_SMOKING.csv"
+    lines = smoking.read_text().splitlines()
+    with smoking.open("w") as file:
+        file.write(lines[0] + "\n")
+        for i in range(20):
+            for line in lines[1:]:
+                file.write(line + "\n")
+            file.write('6789,"NEVER_HEARD_OF_IT",2025-05-12 21:20,1\n')  # no concept
+
+    return inputs
+
+
+def assert_same_outputs(expected: Path, actual: Path) -> None:
+    names = sorted(file.name for file in expected.glob("*.tsv"))
+    assert "measurement.tsv" in names
+    assert "summary_mapstream.tsv" in names
+    assert names == sorted(file.name for file in actual.glob("*.tsv"))
+
+    for name in names:
+        assert (expected / name).read_text() == (actual / name).read_text(), (
+            f"mismatch in {name}"
+        )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("batch_size", ["1", "7", "65536"])
+def test_batches_match_rows(tmp_path: Path, batch_size: str):
+    inputs = awkward_inputs(tmp_path)
+
+    run_v2(inputs, tmp_path / "rows")
+    run_v2(inputs, tmp_path / "batches", "--batch-size", batch_size)
+
+    assert_same_outputs(tmp_path / "rows", tmp_path / "batches")
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(not parallel.fork_available(), reason="workers need fork()")
+def test_batches_with_workers(tmp_path: Path):
+    inputs = awkward_inputs(tmp_path)
+
+    run_v2(inputs, tmp_path / "rows")
+    run_v2(
+        inputs,
+        tmp_path / "batches",
+        "--batch-size",
+        "16",
+        "--workers",
+        "2",
+        "--shard-bytes",
+        "256",
+    )
+
+    assert_same_outputs(tmp_path / "rows", tmp_path / "batches")
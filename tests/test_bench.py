@@ -0,0 +1,99 @@
+"""
+checks the synthetic inputs and the bench command that runs over them
+
+# λ uv run pytest tests/test_bench.py
+
+"""
+
+import csv
+import json
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from carrottransform.cli.command import transform
+from carrottransform.tools.synthetic import EXAMPLE_INPUTS, generate_inputs
+
+
+def read(path: Path) -> list[list[str]]:
+    with path.open(newline="") as file:
+        return list(csv.reader(file))
+
+
+@pytest.mark.unit
+def test_synthetic_inputs_look_like_the_examples(tmp_path: Path):
+    counts = generate_inputs(
+        tmp_path / "a",
+        ["Demographics", "Symptoms"],
+        "Demographics",
+        persons=50,
+        rows_per_person=3,
+        distinct_dates=10,
+    )
+    assert {"Demographics": 50, "Symptoms": 150} == counts
+
+    demographics = read(tmp_path / "a/Demographics.csv")
+    symptoms = read(tmp_path / "a/Symptoms.csv")
+
+    assert read(EXAMPLE_INPUTS / "Demographics.csv")[0] == demographics[0]
+    assert read(EXAMPLE_INPUTS / "Symptoms.csv")[0] == symptoms[0]
+
+    # one row per person in the person table, and, only those people elsewhere
+    people = [row[0] for row in demographics[1:]]
+    assert len(people) == len(set(people))
+    assert set(people) == {row[0] for row in symptoms[1:]}
+
+    # dates keep the example's format but come from the smaller pool
+    assert all(row[1].endswith(" 00:00:00.000000") for row in symptoms[1:])
+    assert 10 >= len({row[1] for row in symptoms[1:]})
+
+    # the same seed makes the same files
+    generate_inputs(
+        tmp_path / "b",
+        ["Demographics", "Symptoms"],
+        "Demographics",
+        persons=50,
+        rows_per_person=3,
+        distinct_dates=10,
+    )
+    assert demographics == read(tmp_path / "b/Demographics.csv")
+    assert symptoms == read(tmp_path / "b/Symptoms.csv")
+
+
+@pytest.mark.unit
+def test_bench_reports_each_run(tmp_path: Path):
+    result = CliRunner().invoke(
+        transform,
+        [
+            "bench",
+            "--persons",
+            "40",
+            "--rows-per-person",
+            "2",
+            "--engine",
+            "v2",
+            "--target",
+            "csv",
+            "--target",
+            "sqlite",
+            "--workdir",
+            str(tmp_path / "work"),
+            "--report",
+            str(tmp_path / "report.json"),
+        ],
+    )
+    if result.exception is not None:
+        raise result.exception
+
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert 40 + 2 * 40 + 2 * 40 == sum(report["input_rows"].values())
+    assert [("v2", "csv"), ("v2", "sqlite")] == [
+        (run["engine"], run["target"]) for run in report["runs"]
+    ]
+
+    # csv and sqlite get the same rows
+    [csv_run, sqlite_run] = report["runs"]
+    assert 40 == csv_run["output_rows"]["person"]
+    assert csv_run["output_rows"] == sqlite_run["output_rows"]
+    assert 0 < csv_run["rows_per_sec"]
@@ -0,0 +1,126 @@
+"""
+checks that a run which dies part way through can be resumed from its last checkpoint
+
+# λ uv run pytest tests/test_checkpoint.py
+
+"""
+
+import functools
+import gc
+from pathlib import Path
+
+import pytest
+import sqlalchemy
+
+from carrottransform.tools import outputs
+from carrottransform.tools.watermarks import Watermarks
+from tests.testools import run_v2, test_data
+
+inputs = test_data / "integration_test1"
+
+OUTPUTS = ["person.tsv", "measurement.tsv", "observation.tsv"]
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "extra",
+    [[], ["--batch-size", "2"], ["--workers", "2", "--shard-bytes", "40"]],
+)
+def test_resume_after_a_crash(tmp_path: Path, monkeypatch, extra: list[str]):
+    run_v2(inputs, tmp_path / "full", *extra)
+
+    checkpoint = tmp_path / "checkpoint.json"
+    args = [*extra, "--checkpoint-file", str(checkpoint), "--checkpoint-rows", "3"]
+
+    # die when the last smoking row is read - after the rows before it have been written
+    skip = Watermarks.skip
+
+    def crashing_skip(self, source, rows):
+        for row in skip(self, source, rows):
+            if "NEVER_SMOKER" in row:
+                raise Crash()
+            yield row
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Watermarks, "skip", crashing_skip)
+        with pytest.raises(Crash):
+            run_v2(inputs, tmp_path / "resumed", *args)
+    assert checkpoint.is_file()
+
+    # starting again over the top of it would keep the rows it had written
+    with pytest.raises(AssertionError, match="--resume"):
+        run_v2(inputs, tmp_path / "resumed", *args)
+
+    # a dead run can leave records (or half of one) past the checkpoint
+    with (tmp_path / "resumed/observation.tsv").open("a") as file:
+        file.write("1\t6789\t0\t2025-05-12")
+
+    run_v2(inputs, tmp_path / "resumed", *args, "--resume")
+    assert not checkpoint.is_file()
+
+    for name in OUTPUTS:
+        assert (tmp_path / "full" / name).read_text() == (
+            tmp_path / "resumed" / name
+        ).read_text()
+
+
+@pytest.mark.unit
+def test_outputs_that_cant_be_checkpointed_are_refused(tmp_path: Path):
+    # the compressed parts can't be cut back to a checkpoint - so it's refused before anything is mapped, rather than at the first checkpoint
+    with pytest.raises(AssertionError, match="can't be checkpointed"):
+        run_v2(
+            inputs,
+            f"tsv:{tmp_path / 'out'}?compression=gz",
+            "--checkpoint-file",
+            str(tmp_path / "checkpoint.json"),
+        )
+    assert not (tmp_path / "out").exists() or not any((tmp_path / "out").iterdir())
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+@pytest.mark.unit
+def test_sql_is_only_committed_at_the_checkpoints(tmp_path: Path, monkeypatch):
+    run_v2(inputs, tmp_path / "full")
+
+    # commit after every record - unless the output's been marked
+    monkeypatch.setattr(
+        outputs,
+        "sql_output_target",
+        functools.partial(outputs.sql_output_target, batch_size=1, transaction_size=1),
+    )
+    database = f"sqlite:///{(tmp_path / 'output.db').absolute()}"
+    args = ["--checkpoint-file", str(tmp_path / "checkpoint.json")]
+
+    # die part way through the first input - before the first checkpoint after the start
+    skip = Watermarks.skip
+
+    def crashing_skip(self, source, rows):
+        for row in skip(self, source, rows):
+            if "2023-11-21" in row:
+                raise Crash()
+            yield row
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Watermarks, "skip", crashing_skip)
+        with pytest.raises(Crash):
+            run_v2(inputs, database, *args)
+
+    # the dead run's connection goes (and rolls back) with it
+    gc.collect()
+
+    run_v2(inputs, database, *args, "--resume")
+
+    engine = sqlalchemy.create_engine(database)
+    for name in OUTPUTS:
+        lines = (tmp_path / "full" / name).read_text().splitlines()[1:]
+        with engine.connect() as connection:
+            rows = connection.execute(
+                sqlalchemy.text(f"SELECT * FROM {name[: -len('.tsv')]}")
+            ).fetchall()
+        assert sorted(line.split("\t") for line in lines) == sorted(
+            list(row) for row in rows
+        )
@@ -0,0 +1,112 @@
+"""
+checks that the compiled per-input rule plans build exactly what `get_target_records()` builds
+
+# λ uv run pytest tests/test_compiled_rules.py
+
+"""
+
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools.args import remove_csv_extension
+from carrottransform.tools.compiled_rules import compile_source_plan
+from carrottransform.tools.core import get_target_records
+from carrottransform.tools.date_helpers import normalise_to8601
+from carrottransform.tools.mappingrules import MappingRules
+from carrottransform.tools.metrics import Metrics
+from carrottransform.tools.omopcdm import OmopCDM
+from carrottransform.tools.sources import csv_source_object
+from tests.testools import package_root, test_data
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "inputs, rules",
+    [
+        (
+            package_root / "examples/test/inputs",
+            package_root / "examples/test/rules/rules_14June2021.json",
+        ),
+        (
+            test_data / "integration_test1",
+            test_data / "integration_test1/transform-rules.json",
+        ),
+        (test_data / "mapping_person", test_data / "mapping_person/multi_mapping.json"),
+        (test_data / "condition", test_data / "condition/mapping.json"),
+        (test_data / "floats", test_data / "floats/rules.json"),
+        (test_data / "only_m", test_data / "only_m/v1-rules.json"),
+    ],
+)
+def test_plan_matches_get_target_records(inputs: Path, rules: Path):
+    omopcdm = OmopCDM(
+        package_root / "config/OMOPCDM_postgresql_5.3_ddl.sql",
+        package_root / "config/config.json",
+    )
+    mappingrules = MappingRules(rules, omopcdm)
+    source = csv_source_object(inputs, ",")
+
+    expected_metrics = Metrics("test")
+    actual_metrics = Metrics("test")
+
+    for srcfilename in mappingrules.get_all_infile_names():
+        rows = source.open(remove_csv_extension(srcfilename))
+        header = next(rows)
+
+        _, rulesmap = mappingrules.parse_rules_src_to_tgt(srcfilename)
+        datetime_source, _ = mappingrules.get_infile_date_person_id(srcfilename)
+        srccolmap = omopcdm.get_column_map(header)
+
+        plan = compile_source_plan(srcfilename, header, mappingrules, omopcdm)
+
+        built = 0
+        for row in rows:
+            fulldate = normalise_to8601(row[srccolmap[datetime_source]])
+            if fulldate is None:
+                continue
+            row[srccolmap[datetime_source]] = fulldate
+
+            for target in plan.targets:
+                for column in target.columns:
+                    expected = get_target_records(
+                        target.tgtfilename,
+                        omopcdm.get_omop_column_map(target.tgtfilename),
+                        rulesmap,
+                        column.srcfield,
+                        row,
+                        srccolmap,
+                        srcfilename,
+                        omopcdm,
+                        expected_metrics,
+                    )
+                    actual = column.build(row, actual_metrics)
+
+                    assert (expected[0], expected[1]) == actual
+                    built += len(actual[1])
+
+        assert built > 0, f"no records were built for {srcfilename=}"
+
+    assert expected_metrics.get_mapstream_summary() == (
+        actual_metrics.get_mapstream_summary()
+    )
+
+
+@pytest.mark.unit
+def test_person_plan_uses_first_column_only():
+    """the mapstream loop only ever used the first data column for the person table"""
+
+    omopcdm = OmopCDM(
+        package_root / "config/OMOPCDM_postgresql_5.3_ddl.sql",
+        package_root / "config/config.json",
+    )
+    mappingrules = MappingRules(
+        test_data / "mapping_person/multi_mapping.json", omopcdm
+    )
+
+    header = next(csv_source_object(test_data / "mapping_person", ",").open("demos"))
+    plan = compile_source_plan("demos.csv", header, mappingrules, omopcdm)
+
+    [person] = [t for t in plan.targets if t.tgtfilename == "person"]
+    assert 1 == len(person.columns)
+    assert person.auto_num_index is None
+    assert 0 == person.person_id_index
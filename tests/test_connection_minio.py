@@ -30,6 +30,37 @@ def test_protocol_parser():
     assert obj._port == "58384"
     assert obj._bucket == "test-bucket-bae51f90a75dddab"
     assert obj._folder == ""  # (empty in this case)
+    assert obj._options == {}
+
+
+@pytest.mark.unit
+def test_upload_options(monkeypatch, tmp_path: Path):
+    text = f"minio:user:pass@http://127.0.0.1:58384/bucket/folder/?concurrency=8&part-size=6000000&memory-budget=30000000&max-pending=50000000&spill-dir={tmp_path}"
+
+    obj = outputs.MinioURL(text)
+    assert obj._bucket == "bucket"
+    assert obj._folder == "folder/"
+
+    # the options go to the uploads
+    made: dict[str, object] = {}
+
+    def S3Tool(s3, bucket_name, bucket_path, **options):
+        made.update(options, bucket_name=bucket_name, bucket_path=bucket_path)
+
+    monkeypatch.setattr(outputs, "S3Tool", S3Tool)
+    outputs.minio_output_target(text)
+    assert made == {
+        "bucket_name": "bucket",
+        "bucket_path": "folder/",
+        "part_size": 6000000,
+        "concurrency": 8,
+        "max_pending": 50000000,
+        "memory_budget": 30000000,
+        "spill_dir": tmp_path,
+    }
+
+    with pytest.raises(Exception, match="unknown options"):
+        outputs.minio_output_target(text + "&threads=2")
 
 
 @pytest.mark.docker
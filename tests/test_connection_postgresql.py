@@ -87,3 +87,29 @@ def test_connection(postgres, tmp_path: Path):
 
         # compare the two values
         assert expected == actual, f"mismatch in {table}"
+
+
+@pytest.mark.docker
+@pytest.mark.parametrize("copy", [True, False])
+def test_copy_and_insert_agree(postgres, copy: bool):
+    """the COPY fast path should store the same values as the INSERTs - including blanks and awkward text"""
+
+    engine = create_engine(postgres.config.connection)
+    table = f"awkward_{'copy' if copy else 'insert'}"
+
+    records = [
+        ["1", "", "plain"],
+        ["2", 'has "quotes"', "has,commas"],
+        ["3", "has\nnewline", "has\ttab"],
+        ["4", "\\N", "NULL"],
+        ["5", "", ""],
+    ]
+
+    outputTarget = outputs.sql_output_target(engine, batch_size=2, copy=copy)
+    handle = outputTarget.start(table, ["id", "a", "b"])
+    for record in records:
+        handle.write(record)
+    outputTarget.close()
+
+    rows = list(sources.sql_source_object(engine).open(table))
+    assert [["id", "a", "b"]] + records == rows
@@ -0,0 +1,41 @@
+import pytest
+
+from carrottransform.tools import date_helpers
+from carrottransform.tools.date_helpers import normalise_to8601
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "item, expected",
+    [
+        ("2023-10-12", "2023-10-12 00:00:00"),
+        ("2023-10-12 08:30:00", "2023-10-12 08:30:00"),
+        ("2023-10-12 08:30", "2023-10-12 08:30:00"),
+        ("2023-10-12 08:30:05.123456", "2023-10-12 08:30:05"),
+        ("2023/10/12", "2023-10-12 00:00:00"),
+        ("12-10-2023", "2023-10-12 00:00:00"),
+        ("12/10/2023 21:20", "2023-10-12 21:20:00"),
+        ("2023-10-12 noon", "2023-10-12 00:00:00"),
+        ("２０２３-10-12", "2023-10-12 00:00:00"),
+        ("sometime", None),
+        ("", None),
+    ],
+)
+def test_normalise_to8601(item: str, expected: str | None):
+    # twice - once to fill the cache, and once from it
+    assert expected == normalise_to8601(item)
+    assert expected == normalise_to8601(item)
+
+
+@pytest.mark.unit
+def test_normalise_counts_hits_and_misses():
+    date_helpers.normalise_cache_clear()
+
+    for _ in range(5):
+        normalise_to8601("2023-10-12")
+        normalise_to8601("12/10/2023")
+        normalise_to8601("sometime")
+
+    info = date_helpers.normalise_cache_info()
+    assert 3 == info.misses
+    assert 12 == info.hits
@@ -0,0 +1,88 @@
+"""
+checks the auto-number id allocator
+
+# λ uv run pytest tests/test_id_allocator.py
+
+"""
+
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools.id_allocator import IdAllocator
+from carrottransform.tools.person_helpers import load_last_used_ids
+from tests.testools import run_v2, test_data
+
+
+@pytest.mark.unit
+def test_next_id_counts_per_table():
+    allocator = IdAllocator(["measurement", "observation"])
+
+    assert [1, 2, 3] == [allocator.next_id("measurement") for _ in range(3)]
+    assert 1 == allocator.next_id("observation")
+    assert {"measurement": 3, "observation": 1} == allocator.last_used()
+
+
+@pytest.mark.unit
+def test_blocks_are_contiguous_and_repeatable():
+    allocator = IdAllocator(["measurement"])
+
+    first = allocator.allocate("measurement", 4, shard=0)
+    second = allocator.allocate("measurement", 0, shard=1)
+    third = allocator.allocate("measurement", 3, shard=2)
+
+    assert range(1, 5) == first
+    assert 0 == len(second)
+    assert range(5, 8) == third
+    assert 8 == allocator.next_id("measurement")
+
+    # asking again gives back the same block without using any more ids
+    assert first == allocator.allocate("measurement", 4, shard=0)
+    assert 9 == allocator.next_id("measurement")
+
+    with pytest.raises(ValueError):
+        allocator.allocate("measurement", 5, shard=0)
+
+
+@pytest.mark.unit
+def test_save_and_load(tmp_path: Path):
+    allocator = IdAllocator(["measurement", "observation"])
+    allocator.allocate("measurement", 10, shard=0)
+    allocator.next_id("observation")
+
+    saved = tmp_path / "last_used_ids.tsv"
+    allocator.save(saved)
+
+    # the file needs to be readable by the v1 loader
+    assert {"measurement": 11, "observation": 2} == load_last_used_ids(saved, {})
+
+    loaded = IdAllocator.load(saved, ["measurement", "observation", "person"])
+    assert 11 == loaded.next_id("measurement")
+    assert 2 == loaded.next_id("observation")
+    assert 1 == loaded.next_id("person")
+
+
+@pytest.mark.unit
+def test_v2_carries_on_from_last_used_ids(tmp_path: Path):
+    last_used_ids = tmp_path / "last_used_ids.tsv"
+    last_used_ids.write_text("measurement\t100\n")
+
+    def run(output: Path) -> list[str]:
+        run_v2(
+            test_data / "integration_test1",
+            output,
+            "--last-used-ids-file",
+            str(last_used_ids),
+        )
+
+        lines = (output / "measurement.tsv").read_text().splitlines()[1:]
+        return [line.split("\t")[0] for line in lines]
+
+    first = run(tmp_path / "first")
+    assert [str(i) for i in range(101, 101 + len(first))] == first
+
+    second = run(tmp_path / "second")
+    assert [str(int(i) + len(first)) for i in first] == second
+
+    saved = load_last_used_ids(last_used_ids, {})
+    assert 101 + 2 * len(first) == saved["measurement"]
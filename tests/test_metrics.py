@@ -0,0 +1,172 @@
+"""
+checks the summary that Metrics builds from its counts
+
+# λ uv run pytest tests/test_metrics.py
+
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools import outputs
+from carrottransform.tools.metrics import Metrics
+from tests.testools import run_v2, test_data
+
+
+def fill(metrics: Metrics, times: int = 1) -> None:
+    for _ in range(times):
+        metrics.increment_key_count(
+            "src_WEIGHT.csv", "all", "all", "all", "", "input_count"
+        )
+        metrics.increment_key_count(
+            "src_WEIGHT.csv", "all", "measurement", "all", "", "invalid_person_ids"
+        )
+        metrics.increment_with_datacol(
+            "src_WEIGHT.csv", "measurement", "body_kgs", ["1", "2", "3003"]
+        )
+        metrics.increment_with_datacol(
+            "src_PERSON.csv", "person", "gender", ["1", "8507", "1950"]
+        )
+
+
+@pytest.mark.unit
+def test_summary_rows():
+    metrics = Metrics("test")
+    fill(metrics, 2)
+
+    # only the finest grained output counts are kept - the rest are rolled up from them
+    assert {
+        ("src_WEIGHT.csv", "body_kgs", "measurement", "3003", ""): 2,
+        ("src_PERSON.csv", "gender", "person", "8507", "1950"): 2,
+    } == metrics.outputs
+
+    rows = {
+        (row.source, row.fieldname, row.tablename, row.concept_id, row.additional): row
+        for row in metrics.get_mapstream_summary_rows()
+    }
+
+    weight = rows[("src_WEIGHT", "all", "all", "all", "")]
+    assert (2, 2) == (weight.input_count, weight.output_count)
+    assert 2 == rows[("src_WEIGHT", "all", "measurement", "all", "")].invalid_person_ids
+    assert 2 == rows[("src_WEIGHT", "body_kgs", "measurement", "3003", "")].output_count
+    assert 2 == rows[("all", "all", "all", "3003", "")].output_count
+    assert 2 == rows[("src_PERSON", "all", "person", "8507", "1950")].output_count
+    assert 2 == rows[("all", "all", "person", "all", "")].output_count
+
+    # the rows are sorted by their `~` joined keys
+    keys = [
+        "~".join([row.source, row.fieldname, row.tablename, row.concept_id])
+        for row in metrics.get_mapstream_summary_rows()
+    ]
+    assert keys == sorted(keys)
+
+
+@pytest.mark.unit
+def test_merge_and_count_match_repeats():
+    repeated = Metrics("test")
+    fill(repeated, 3)
+
+    merged = Metrics("test")
+    fill(merged)
+    other = Metrics("test")
+    fill(other, 2)
+    merged.merge(other)
+
+    counted = Metrics("test")
+    counted.increment_key_count(
+        "src_WEIGHT.csv", "all", "all", "all", "", "input_count", count=3
+    )
+    counted.increment_key_count(
+        "src_WEIGHT.csv", "all", "measurement", "all", "", "invalid_person_ids", count=3
+    )
+    counted.increment_with_datacol(
+        "src_WEIGHT.csv", "measurement", "body_kgs", ["1", "2", "3003"], count=3
+    )
+    counted.increment_with_datacol(
+        "src_PERSON.csv", "person", "gender", ["1", "8507", "1950"], count=3
+    )
+
+    assert repeated.get_mapstream_summary() == merged.get_mapstream_summary()
+    assert repeated.get_mapstream_summary() == counted.get_mapstream_summary()
+
+
+@pytest.mark.unit
+def test_save_and_load(tmp_path: Path):
+    metrics = Metrics("test")
+    fill(metrics, 2)
+
+    saved = tmp_path / "metrics.json"
+    metrics.save(saved)
+    loaded = Metrics.load(saved)
+
+    assert "test" == loaded.dataset_name
+    assert metrics.counts == loaded.counts
+    assert metrics.outputs == loaded.outputs
+    assert metrics.get_mapstream_summary() == loaded.get_mapstream_summary()
+
+    # the counts are found by name - so the order of the types in the file doesn't matter
+    data = json.loads(saved.read_text())
+    data["count_types"].reverse()
+    data["counts"] = [item[:5] + item[5:][::-1] for item in data["counts"]]
+    assert metrics.counts == Metrics.from_dict(data).counts
+
+
+@pytest.mark.unit
+def test_v2_adds_to_the_metrics_file(tmp_path: Path):
+    metrics_file = tmp_path / "metrics.json"
+
+    def run(output: Path) -> dict[tuple[str, ...], list[str]]:
+        run_v2(
+            test_data / "integration_test1",
+            output,
+            "--metrics-file",
+            str(metrics_file),
+        )
+
+        lines = (output / "summary_mapstream.tsv").read_text().splitlines()
+        return {
+            tuple(row[1:6]): row[6:] for row in (line.split("\t") for line in lines)
+        }
+
+    first = run(tmp_path / "first")
+    assert metrics_file.is_file()
+    second = run(tmp_path / "second")
+
+    assert first.keys() == second.keys()
+    for key, counts in first.items():
+        if "source" == key[0]:
+            continue
+        assert [str(2 * int(count)) for count in counts] == second[key]
+
+
+@pytest.mark.unit
+def test_summary_streams_into_an_output(tmp_path: Path):
+    metrics = Metrics("test")
+    fill(metrics, 2)
+    metrics.increment_with_datacol(
+        "src_WEIGHT.csv", "measurement", "body_kgs", ["1", "2", "3004"], count=5
+    )
+
+    target = outputs.csv_output_target(tmp_path / "all")
+    metrics.write_mapstream_summary(target)
+    target.close()
+    assert metrics.get_mapstream_summary() == (
+        (tmp_path / "all/summary_mapstream.tsv").read_text()
+    )
+
+    # the top rows keep their order
+    target = outputs.csv_output_target(tmp_path / "top")
+    metrics.write_mapstream_summary(target, top=3)
+    target.close()
+
+    lines = (tmp_path / "top/summary_mapstream.tsv").read_text().splitlines()
+    assert metrics.get_mapstream_summary().splitlines()[0] == lines[0]
+    rows = [line.split("\t") for line in lines[1:]]
+    assert ["7", "7", "7"] == [row[-1] for row in rows]
+    assert [
+        ("all", "all", "measurement", "all"),
+        ("src_WEIGHT", "all", "all", "all"),
+        ("src_WEIGHT", "all", "measurement", "all"),
+    ] == [tuple(row[1:5]) for row in rows]
@@ -7,6 +7,7 @@ runs tests for the target writer
 
 import logging
 import textwrap
+import threading
 from pathlib import Path
 
 import pytest
@@ -177,3 +178,188 @@ def test_join():
     header = ["a", "b", "c"]
 
     assert "a\tb\tc\n" == ("\t".join(header) + "\n")
+
+
+@pytest.mark.unit
+def test_sql_output_target_batches(tmp_path: Path):
+    """records are held back until a batch fills, and, everything is flushed by close()"""
+
+    engine = sqlalchemy.create_engine(
+        f"sqlite:///{(tmp_path / 'testing.db').absolute()}"
+    )
+    outputTarget = outputs.sql_output_target(engine, batch_size=4, transaction_size=10)
+
+    def count(table: str) -> int:
+        with engine.connect() as conn:
+            return conn.execute(
+                sqlalchemy.text(f"SELECT COUNT(*) FROM {table}")
+            ).scalar_one()
+
+    expected = {
+        "first": [[str(i), "" if 0 == i % 3 else f"v{i}"] for i in range(23)],
+        "second": [[str(i), f"w{i}"] for i in range(7)],
+    }
+
+    handles = {name: outputTarget.start(name, ["a", "b"]) for name in expected}
+
+    # batches of 4 went in at 4, 8, 12, 16, 20 records, and, a commit happened once 12 were pending
+    for record in expected["first"]:
+        handles["first"].write(record)
+    assert 12 == count("first")
+
+    # the first batch of these takes the pending count over 10 again - committing 8 more of the others
+    for record in expected["second"]:
+        handles["second"].write(record)
+    assert 20 == count("first")
+    assert 4 == count("second")
+
+    outputTarget.close()
+
+    source = sources.sql_source_object(engine)
+    for name, records in expected.items():
+        assert [["a", "b"]] + records == list(source.open(name))
+
+
+class FakeS3:
+    """just enough of a boto3 s3 client to check the multipart uploads"""
+
+    def __init__(self, failures: int = 0):
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.completed: dict[str, bytes] = {}
+        self.aborted: list[str] = []
+        self.failures = failures
+
+        # the parts are uploaded from several threads
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads[Key] = {}
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body):
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("dropped")
+        body = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self.uploads[UploadId][PartNumber] = body
+        return {"ETag": f"{Key}-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = MultipartUpload["Parts"]
+        assert [part["PartNumber"] for part in parts] == list(range(1, 1 + len(parts)))
+        self.completed[Key] = b"".join(
+            self.uploads[UploadId][part["PartNumber"]] for part in parts
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self._lock:
+            self.aborted.append(Key)
+
+
+@pytest.mark.unit
+def test_s3_parts_upload_in_the_background():
+    s3 = FakeS3(failures=2)
+    tool = outputs.S3Tool(
+        s3, "bucket", "folder/", part_size=10, concurrency=3, max_pending=25, backoff=0
+    )
+
+    expected: dict[str, bytes] = {}
+    for name in ["person", "measurement", "empty"]:
+        tool.new_stream(name)
+        expected["folder/" + name] = b""
+    for line in range(50):
+        for name in ["person", "measurement"]:
+            data = f"{name}\t{line}\n".encode()
+            tool.send_chunk(name, data)
+            expected["folder/" + name] += data
+
+    tool.complete_all()
+
+    assert expected == s3.completed
+    assert 1 < len(s3.uploads["folder/person"])
+    assert 0 == tool._pending
+
+    # both of the dropped parts were retried
+    assert 0 == s3.failures
+
+
+@pytest.mark.unit
+def test_s3_upload_is_aborted_when_a_part_keeps_failing():
+    s3 = FakeS3(failures=100)
+    tool = outputs.S3Tool(s3, "bucket", "", part_size=10, retries=2, backoff=0)
+
+    tool.new_stream("person")
+    tool.send_chunk("person", b"0123456789ab")
+
+    with pytest.raises(ConnectionError):
+        tool.complete("person")
+    assert ["person"] == s3.aborted
+    assert 100 - 3 == s3.failures
+
+
+@pytest.mark.unit
+def test_s3_buffers_spill_to_disk_over_the_budget(tmp_path: Path):
+    s3 = FakeS3()
+    tool = outputs.S3Tool(
+        s3, "bucket", "", part_size=100, memory_budget=120, spill_dir=tmp_path
+    )
+
+    names = [f"table_{index}" for index in range(4)]
+    expected = {name: b"" for name in names}
+    for name in names:
+        tool.new_stream(name)
+
+    spilled = set()
+    for line in range(40):
+        for name in names:
+            data = f"{name}\t{line}\n".encode()
+            tool.send_chunk(name, data)
+            expected[name] += data
+
+            assert tool._buffered <= 120
+            spilled |= {name for name in names if tool._streams[name]._spilled}
+
+    tool.complete_all()
+
+    assert expected == s3.completed
+    assert spilled
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("compression", [None, ".gz", ".zst"])
+def test_csv_output_target_compresses_and_rotates(tmp_path: Path, compression):
+    if ".zst" == compression:
+        pytest.importorskip("zstandard")
+
+    target = outputs.OutputTargetArgumentType().convert(
+        f"tsv:{tmp_path}?part-bytes=22"
+        + ("" if compression is None else f"&compression={compression[1:]}"),
+        None,
+        None,
+    )
+
+    # a part from an earlier (bigger) run is cleared out
+    stale = tmp_path / f"foo.part-0009.tsv{compression or ''}"
+    stale.write_bytes(b"")
+
+    handle = target.start("foo", ["a", "b"])
+    for number in range(5):
+        handle.write([str(number), "x" * 6])
+    handle.close()
+
+    assert not stale.exists()
+
+    # the parts read back as tables through the source side
+    source = sources.csv_source_object(tmp_path, "\t")
+    parts = sorted(path.name for path in tmp_path.iterdir())
+    assert [
+        f"foo.part-{part:04d}.tsv{compression or ''}" for part in [1, 2, 3]
+    ] == parts
+    rows = [list(source.open(f"foo.part-{part:04d}")) for part in [1, 2, 3]]
+    assert [
+        [["a", "b"], ["0", "xxxxxx"], ["1", "xxxxxx"]],
+        [["a", "b"], ["2", "xxxxxx"], ["3", "xxxxxx"]],
+        [["a", "b"], ["4", "xxxxxx"]],
+    ] == rows
@@ -0,0 +1,134 @@
+"""
+checks that running v2 over a pool of workers writes the same output as running it in one process
+
+# λ uv run pytest tests/test_parallel.py
+
+"""
+
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools import parallel, sources
+from tests.testools import run_v2, test_data
+
+
+def grown_inputs(tmp_path: Path) -> Path:
+    """copy the integration_test1 inputs and pad the weights out so there's enough to split up"""
+
+    inputs = tmp_path / "inputs"
+    shutil.copytree(test_data / "integration_test1", inputs)
+
+    weights = inputs / "src_WEIGHT.csv"
+    lines = weights.read_text().splitlines()
+    body = lines[1:]
+    with weights.open("w") as file:
+        file.write(lines[0] + "\n")
+        for i in range(200):
+            for line in body:
+                person, date, kgs, _ = line.split(",")
+                file.write(f"{person},{date},{float(kgs) + i},\n")
+            # someone who isn't in the person file - their records still use up ids
+            if 0 == i % 7:
+                file.write(f"404,2023-10-12,{70 + i},\n")
+
+    return inputs
+
+
+@pytest.mark.unit
+def test_line_aligned_ranges_cover_the_file(tmp_path: Path):
+    inputs = grown_inputs(tmp_path)
+    source = sources.csv_source_object(inputs, ",")
+
+    ranges = source.shard("src_WEIGHT", 256)
+    assert 1 < len(ranges)
+    assert 0 == ranges[0][0]
+    assert ranges[-1][1] is None
+
+    # the ranges should be contiguous
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+
+    # each range repeats the header, and, together they hold every row once
+    expected = list(source.open("src_WEIGHT"))
+    actual = [expected[0]]
+    for start, end in ranges:
+        rows = source.open_range("src_WEIGHT", start, end)
+        assert expected[0] == next(rows)
+        actual += list(rows)
+
+    assert expected == actual
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(not parallel.fork_available(), reason="workers need fork()")
+@pytest.mark.parametrize("shard_bytes", ["0", "256"])
+def test_workers_match_single_process(tmp_path: Path, shard_bytes: str):
+    inputs = grown_inputs(tmp_path)
+
+    run_v2(inputs, tmp_path / "single")
+    run_v2(
+        inputs,
+        tmp_path / "parallel",
+        "--workers",
+        "3",
+        "--shard-bytes",
+        shard_bytes,
+    )
+
+    names = sorted(file.name for file in (tmp_path / "single").glob("*.tsv"))
+    assert "measurement.tsv" in names
+    assert "summary_mapstream.tsv" in names
+    assert names == sorted(file.name for file in (tmp_path / "parallel").glob("*.tsv"))
+
+    for name in names:
+        expected = (tmp_path / "single" / name).read_text()
+        actual = (tmp_path / "parallel" / name).read_text()
+        assert expected == actual, f"mismatch in {name}"
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(not parallel.fork_available(), reason="workers need fork()")
+def test_merged_shards_are_cleared_away(tmp_path: Path, monkeypatch):
+    inputs = grown_inputs(tmp_path)
+
+    merge_shard = parallel.ParallelStreamProcessor.merge_shard
+    merged = []
+
+    def clearing_merge_shard(self, result):
+        merge_shard(self, result)
+        merged.append(result.spill_dir.exists())
+
+    monkeypatch.setattr(
+        parallel.ParallelStreamProcessor, "merge_shard", clearing_merge_shard
+    )
+    run_v2(inputs, tmp_path / "out", "--workers", "2", "--shard-bytes", "256")
+
+    # so the temp folder doesn't grow into a second copy of the outputs
+    assert 1 < len(merged)
+    assert not any(merged)
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(not parallel.fork_available(), reason="workers need fork()")
+def test_a_failed_shard_stops_the_rest(tmp_path: Path, monkeypatch):
+    inputs = grown_inputs(tmp_path)
+
+    # the workers are forked - so they see the patched method
+    map_shard = parallel.ParallelStreamProcessor.map_shard
+
+    def slow_map_shard(self, shard: parallel.Shard) -> parallel.ShardResult:
+        if 0 == shard.index:
+            raise RuntimeError("the first shard failed")
+        time.sleep(0.2)
+        return map_shard(self, shard)
+
+    monkeypatch.setattr(parallel.ParallelStreamProcessor, "map_shard", slow_map_shard)
+
+    # the shards that haven't started are dropped rather than waited for
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="the first shard failed"):
+        run_v2(inputs, tmp_path / "out", "--workers", "2", "--shard-bytes", "256")
+    assert time.perf_counter() - start < 2
@@ -0,0 +1,241 @@
+"""
+checks the parquet source reads the same rows a csv would, and, only reads the columns it's asked for.
+also checks the parquet output target writes the same values as the csv one, with the ddl's types
+
+# λ uv run pytest tests/test_parquet.py
+
+"""
+
+import datetime
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools import outputs, sources
+from tests.testools import run_v2, test_data, weights_dated_twice
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def csvs_to_parquet(folder: Path, into: Path, row_group_size: int) -> None:
+    """copy a folder of csvs into parquet files with all-string columns"""
+
+    into.mkdir()
+    csvs = sources.csv_source_object(folder, ",")
+    for file in folder.glob("*.csv"):
+        table = file.name[:-4]
+        rows = csvs.open(table)
+        header = next(rows)
+        columns = list(zip(*rows))
+        pq.write_table(
+            pa.table(
+                {
+                    name: pa.array(values, pa.string())
+                    for name, values in zip(header, columns)
+                }
+            ),
+            into / f"{table}.parquet",
+            row_group_size=row_group_size,
+        )
+
+
+@pytest.mark.unit
+def test_values_are_strings(tmp_path: Path):
+    pq.write_table(
+        pa.table(
+            {
+                "person_id": pa.array([1, 2, None], pa.int64()),
+                "kgs": pa.array([75.5, None, 80.25], pa.float64()),
+                "seen": pa.array(
+                    [datetime.date(2023, 10, 12), datetime.date(2024, 1, 2), None],
+                    pa.date32(),
+                ),
+                "at": pa.array(
+                    [datetime.datetime(2023, 10, 12, 8, 30), None, None],
+                    pa.timestamp("s"),
+                ),
+                "note": pa.array(["a", "", None], pa.string()),
+            }
+        ),
+        tmp_path / "things.parquet",
+    )
+
+    source = sources.parquet_source_object(tmp_path)
+
+    assert source.has_table("things")
+    assert not source.has_table("nothing")
+    with pytest.raises(sources.SourceTableNotFound):
+        source.open("nothing")
+
+    assert [
+        ["person_id", "kgs", "seen", "at", "note"],
+        # parquet keeps timestamps as milliseconds, at least
+        ["1", "75.5", "2023-10-12", "2023-10-12 08:30:00.000", "a"],
+        ["2", "", "2024-01-02", "", ""],
+        ["", "80.25", "", "", ""],
+    ] == list(source.open("things"))
+
+    # only the columns asked for, in the file's order, regardless of case
+    assert [
+        ["person_id", "seen"],
+        ["1", "2023-10-12"],
+        ["2", "2024-01-02"],
+        ["", ""],
+    ] == list(source.open("things", ["SEEN", "Person_ID", "missing"]))
+
+
+@pytest.mark.unit
+def test_shards_are_row_groups(tmp_path: Path):
+    csvs_to_parquet(test_data / "integration_test1", tmp_path / "parquet", 2)
+    source = sources.parquet_source_object(tmp_path / "parquet")
+
+    ranges = source.shard("src_WEIGHT", 1)
+    assert 1 < len(ranges)
+    assert 0 == ranges[0][0]
+    assert ranges[-1][1] is None
+
+    expected = list(source.open("src_WEIGHT", ["person_id", "body_kgs"]))
+    actual = [expected[0]]
+    for start, end in ranges:
+        rows = source.open_range("src_WEIGHT", start, end, ["person_id", "body_kgs"])
+        assert expected[0] == next(rows)
+        actual += list(rows)
+
+    assert expected == actual
+
+
+@pytest.mark.unit
+def test_v2_from_parquet_matches_csv(tmp_path: Path):
+    inputs = test_data / "integration_test1"
+    csvs_to_parquet(inputs, tmp_path / "parquet", 3)
+
+    run_v2(str(inputs), str(tmp_path / "csv"))
+    run_v2(f"parquet:{tmp_path / 'parquet'}", str(tmp_path / "parquet"))
+
+    names = sorted(file.name for file in (tmp_path / "csv").glob("*.tsv"))
+    assert "measurement.tsv" in names
+    assert names == sorted(file.name for file in (tmp_path / "parquet").glob("*.tsv"))
+    for name in names:
+        expected = (tmp_path / "csv" / name).read_text()
+        assert expected == (tmp_path / "parquet" / name).read_text(), name
+
+
+@pytest.mark.unit
+def test_output_columns_are_typed(tmp_path: Path):
+    target = outputs.parquet_output_target(tmp_path, row_group_size=2)
+
+    header = ["measurement_id", "person_id", "measurement_concept_id"]
+    header += ["measurement_date", "measurement_datetime", "value_as_number"]
+    header += ["measurement_source_value"]
+
+    measurement = target.start("measurement", header)
+    measurement.write(
+        ["1", "3", "35811769", "2023-10-12", "2023-10-12 08:30:00", "75", "75"]
+    )
+    measurement.write(["2", "3", "35811769", "2023-10-11 00:00:00", "", "", ""])
+    measurement.write(
+        ["3", "1", "0", "2023-11-21", "2023-11-21 00:00:00", "86.123", "x"]
+    )
+
+    # not in the ddl - so just strings
+    summary = target.start("summary_mapstream", ["a", "b"])
+    summary.write(["1", ""])
+
+    target.close()
+
+    parquet = pq.ParquetFile(tmp_path / "measurement.parquet")
+    assert 2 == parquet.num_row_groups
+
+    table = parquet.read()
+    assert [
+        pa.int64(),
+        pa.int64(),
+        pa.int64(),
+        pa.date32(),
+        pa.timestamp("us"),
+        pa.float64(),
+        pa.string(),
+    ] == table.schema.types
+    assert [
+        {
+            "measurement_id": 1,
+            "person_id": 3,
+            "measurement_concept_id": 35811769,
+            "measurement_date": datetime.date(2023, 10, 12),
+            "measurement_datetime": datetime.datetime(2023, 10, 12, 8, 30),
+            "value_as_number": 75.0,
+            "measurement_source_value": "75",
+        },
+        {
+            "measurement_id": 2,
+            "person_id": 3,
+            "measurement_concept_id": 35811769,
+            "measurement_date": datetime.date(2023, 10, 11),
+            "measurement_datetime": None,
+            "value_as_number": None,
+            "measurement_source_value": "",
+        },
+        {
+            "measurement_id": 3,
+            "person_id": 1,
+            "measurement_concept_id": 0,
+            "measurement_date": datetime.date(2023, 11, 21),
+            "measurement_datetime": datetime.datetime(2023, 11, 21),
+            "value_as_number": 86.123,
+            "measurement_source_value": "x",
+        },
+    ] == table.to_pylist()
+
+    assert [{"a": "1", "b": ""}] == pq.read_table(
+        tmp_path / "summary_mapstream.parquet"
+    ).to_pylist()
+
+
+@pytest.mark.unit
+def test_v2_to_parquet_matches_csv(tmp_path: Path):
+    inputs = str(test_data / "integration_test1")
+    run_v2(inputs, str(tmp_path / "csv"))
+    run_v2(inputs, f"parquet:{tmp_path / 'parquet'}")
+
+    names = sorted(file.stem for file in (tmp_path / "csv").glob("*.tsv"))
+    assert "measurement" in names
+    assert names == sorted(
+        file.stem for file in (tmp_path / "parquet").glob("*.parquet")
+    )
+
+    for name in names:
+        lines = (tmp_path / "csv" / f"{name}.tsv").read_text().splitlines()
+        header = lines[0].split("\t")
+        table = pq.read_table(tmp_path / "parquet" / f"{name}.parquet")
+        assert header == table.schema.names
+
+        rows = [line.split("\t") for line in lines[1:]]
+        assert len(rows) == table.num_rows
+
+        for field, expected in zip(table.schema, zip(*rows)):
+            for text, value in zip(expected, table.column(field.name).to_pylist()):
+                if field.type == pa.string():
+                    assert text == value
+                elif "" == text:
+                    assert value is None
+                elif field.type == pa.date32():
+                    assert text[:10] == str(value)
+                elif field.type == pa.timestamp("us"):
+                    assert text == str(value)
+                else:
+                    assert float(text) == value, f"{name}.{field.name}"
+
+
+@pytest.mark.unit
+def test_each_tables_date_column_is_read(tmp_path: Path):
+    """one input mapped to two tables, each dated by a different column, has both columns read"""
+
+    rules = weights_dated_twice(tmp_path / "csv")
+    csvs_to_parquet(tmp_path / "csv", tmp_path / "parquet", 3)
+
+    run_v2(f"parquet:{tmp_path / 'parquet'}", tmp_path / "out", rules=rules)
+
+    lines = (tmp_path / "out/observation.tsv").read_text().splitlines()
+    dates = [line.split("\t")[3] for line in lines[1:]]
+    assert ["2024-02-01", "2024-02-02", "2024-02-03", "2024-02-04"] == dates
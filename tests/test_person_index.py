@@ -0,0 +1,97 @@
+"""
+checks the compact person id lookup
+
+# λ uv run pytest tests/test_person_index.py
+
+"""
+
+import random
+from pathlib import Path
+
+import pytest
+
+from carrottransform.tools.person_index import (
+    PersonDict,
+    PersonIndex,
+    PersonLookup,
+    empty_person_lookup,
+)
+from tests.testools import run_v2, test_data
+
+
+def random_ids(count: int) -> list[str]:
+    rand = random.Random(4)
+    return [
+        rand.choice(["", "P", "ü"]) + str(rand.randrange(10 * count))
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.unit
+def test_index_matches_a_dict(tmp_path: Path):
+    expected: dict[str, str] = {}
+    index = PersonIndex(capacity=4)
+
+    for person_id in random_ids(5000):
+        added = index.add(person_id, len(expected) + 1)
+        assert added == (person_id not in expected)
+        if added:
+            expected[person_id] = str(len(expected) + 1)
+
+    for mapped in [index, index.spill(tmp_path / "index")]:
+        assert len(expected) == len(mapped)
+        assert list(expected.items()) == list(mapped.items())
+        for person_id, assigned in expected.items():
+            assert person_id in mapped
+            assert assigned == mapped[person_id]
+        assert "nobody" not in mapped
+        assert mapped.get("nobody") is None
+        with pytest.raises(KeyError):
+            mapped["nobody"]
+
+    with pytest.raises(ValueError):
+        PersonIndex.map(tmp_path / "index").add("somebody", 1)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("use_input_ids", [False, True])
+def test_the_dict_matches_the_index(use_input_ids: bool):
+    """the plain dict (which is used unless there's a --person-index-dir) behaves as the index does"""
+
+    person_dict = empty_person_lookup(use_input_ids, compact=False)
+    index = empty_person_lookup(use_input_ids, compact=True)
+    assert type(person_dict) is PersonDict
+    assert type(index) is PersonIndex
+
+    lookups: list[PersonLookup] = [person_dict, index]
+    for lookup in lookups:
+        assert 1 == lookup.next_assigned()
+        for number, person_id in enumerate(random_ids(500), start=3):
+            lookup.add(person_id, number)
+
+    assert list(index.items()) == list(person_dict.items())
+    assert index.next_assigned() == person_dict.next_assigned()
+
+
+@pytest.mark.unit
+def test_input_ids_and_empty_index(tmp_path: Path):
+    index = PersonIndex(use_input_ids=True)
+    index.add("abc", 1)
+    assert "abc" == index["abc"]
+
+    empty = PersonIndex().spill(tmp_path / "empty")
+    assert 0 == len(empty)
+    assert "abc" not in empty
+
+
+@pytest.mark.unit
+def test_v2_with_a_mapped_index(tmp_path: Path):
+    inputs = test_data / "integration_test1"
+    run_v2(inputs, tmp_path / "dict")
+    run_v2(inputs, tmp_path / "mapped", "--person-index-dir", str(tmp_path / "index"))
+
+    assert (tmp_path / "index/table.bin").is_file()
+    for name in ["person_ids.tsv", "person.tsv", "measurement.tsv", "observation.tsv"]:
+        assert (tmp_path / "dict" / name).read_text() == (
+            tmp_path / "mapped" / name
+        ).read_text()
@@ -0,0 +1,84 @@
+"""
+checks that the person registry keeps people's ids between runs
+
+# λ uv run pytest tests/test_person_registry.py
+
+"""
+
+from pathlib import Path
+
+import pytest
+
+from carrottransform.cli.subcommands.run import launch_v2, mapstream
+from carrottransform.tools.person_registry import PersonRegistry
+from tests.testools import rules_v2, run_v2, test_data
+
+rules_v1 = test_data / "integration_test1/transform-rules.json"
+
+
+def read_ids(path: Path) -> dict[str, str]:
+    lines = path.read_text().splitlines()[1:]
+    return dict(line.split("\t") for line in lines)
+
+
+@pytest.mark.unit
+def test_registry_appends_the_new_people(tmp_path: Path):
+    path = tmp_path / "people.tsv"
+
+    registry = PersonRegistry(path)
+    index = registry.load()
+    assert 0 == len(index)
+    assert 1 == index.next_assigned()
+
+    index.add("a", 1)
+    index.add("b", 2)
+    registry.save(index)
+    registry.save(index)
+    assert "a\t1\nb\t2\n" == path.read_text()
+
+    # a run that died part way through writing
+    with path.open("a") as file:
+        file.write("c\t")
+
+    registry = PersonRegistry(path)
+    index = registry.load()
+    assert {"a": "1", "b": "2"} == dict(index)
+    assert 3 == index.next_assigned()
+
+    index.add("c", index.next_assigned())
+    registry.save(index)
+    assert {"a": "1", "b": "2", "c": "3"} == dict(PersonRegistry(path).load())
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("command", [mapstream, launch_v2])
+def test_people_keep_their_ids(tmp_path: Path, command):
+    registry = tmp_path / "people.tsv"
+
+    # someone from an earlier load - and one of the people in the person table
+    registry.write_text("gone\t1\n321\t50\n")
+
+    def run(output: Path) -> dict[str, str]:
+        run_v2(
+            test_data / "integration_test1",
+            output,
+            "--person-registry",
+            str(registry),
+            *([] if command is launch_v2 else ["--use-input-person-ids", "N"]),
+            rules=rules_v2 if command is launch_v2 else rules_v1,
+            command=command,
+        )
+        return read_ids(output / "person_ids.tsv")
+
+    first = run(tmp_path / "first")
+
+    # people from earlier loads are still looked up - though they're not in this person table
+    assert "1" == first["gone"]
+    assert "50" == first["321"]
+    assert sorted(first.values(), key=int)[2:] == [
+        str(51 + n) for n in range(len(first) - 2)
+    ]
+
+    # the people are all in the registry now - so the second run numbers them the same
+    assert first == dict(PersonRegistry(registry).load())
+    assert first == run(tmp_path / "second")
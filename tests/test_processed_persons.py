@@ -0,0 +1,49 @@
+"""
+checks the bitmap of people whose person record has been written
+
+# λ uv run pytest tests/test_processed_persons.py
+
+"""
+
+import pytest
+
+from carrottransform.tools.person_index import PersonIndex
+from carrottransform.tools.processed_persons import ProcessedPersons
+
+
+@pytest.mark.unit
+def test_each_person_is_added_once_per_source():
+    lookup = PersonIndex()
+    for number, person_id in enumerate(["a", "b", "c"], start=1):
+        lookup.add(person_id, number)
+
+    processed = ProcessedPersons(lookup)
+    assert processed.add("person.csv", "a")
+    assert processed.add("person.csv", "c")
+    assert not processed.add("person.csv", "a")
+    assert processed.add("other.csv", "a")
+
+    # people that aren't in the lookup are still only added once
+    assert processed.add("person.csv", "nobody")
+    assert not processed.add("person.csv", "nobody")
+
+    restored = ProcessedPersons.from_dict(processed.to_dict(), lookup)
+    assert not restored.add("person.csv", "c")
+    assert not restored.add("person.csv", "nobody")
+    assert restored.add("person.csv", "b")
+    assert not restored.add("other.csv", "a")
+
+
+@pytest.mark.unit
+def test_input_ids_dont_size_the_bitmap():
+    lookup = PersonIndex(use_input_ids=True)
+    lookup.add("9" * 30, 1)
+    lookup.add("2", 2)
+
+    processed = ProcessedPersons(lookup)
+    assert processed.add("person.csv", "9" * 30)
+    assert processed.add("person.csv", "2")
+    assert not processed.add("person.csv", "9" * 30)
+    assert not processed.add("person.csv", "2")
+
+    assert ["person.csv:" + "9" * 30] == processed.to_dict()["others"]
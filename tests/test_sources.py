@@ -2,13 +2,22 @@
 runs some tests on the source reader thing
 """
 
+import bz2
+import gc
+import gzip
+import io
+import os
+import time
+import weakref
 from pathlib import Path
 
+import botocore.exceptions
 import pytest
 import sqlalchemy
 
 import carrottransform.tools.outputs as outputs
 import carrottransform.tools.sources as sources
+from carrottransform.tools import compressed
 from tests import testools
 
 
@@ -79,3 +88,262 @@ def test_basic_sqlite():
     # check the iterator is exhausted
     with pytest.raises(StopIteration):
         next(iterator)
+
+
+@pytest.mark.unit
+def test_sqlite_streams_and_reflects_once():
+    """rows come from a cursor with the fetch size set, and, opening a table again doesn't reflect it again"""
+
+    folder = Path(__file__).parent / "test_data/measure_weight_height/"
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    testools.copy_across(
+        outputs.sql_output_target(engine),
+        sources.csv_source_object(folder, ","),
+        ["heights"],
+    )
+
+    statements: list[str] = []
+    yield_pers: list[int | None] = []
+
+    @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+        yield_pers.append(context.execution_options.get("yield_per"))
+
+    source = sources.sql_source_object(engine, fetch_size=2)
+    expected = list(sources.csv_source_object(folder, ",").open("heights"))
+
+    assert expected == list(source.open("heights"))
+    reflected = len(statements)
+    assert expected == list(source.open("HEIGHTS"))
+
+    # only the select ran the second time - and it was streamed
+    assert reflected + 1 == len(statements)
+    assert statements[-1].lower().startswith("select")
+    assert 2 == yield_pers[-1]
+
+
+@pytest.mark.unit
+def test_sql_sources_dont_keep_their_engines():
+    """the forked workers dispose of the engines' pools - but that shouldn't keep the engines alive"""
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    source = sources.sql_source_object(engine)
+    assert engine in sources._engines
+
+    gone = weakref.ref(engine)
+    del source, engine
+    gc.collect()
+    assert gone() is None
+
+
+@pytest.mark.unit
+def test_has_table(tmp_path: Path):
+    folder = Path(__file__).parent / "test_data/measure_weight_height/"
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'has_table.db'}")
+    testools.copy_across(
+        outputs.sql_output_target(engine),
+        sources.csv_source_object(folder, ","),
+        ["heights"],
+    )
+
+    for source in [
+        sources.csv_source_object(folder, ","),
+        sources.sql_source_object(engine),
+    ]:
+        assert source.has_table("heights")
+        assert not source.has_table("nonexistent")
+
+    with pytest.raises(sources.SourceTableNotFound):
+        list(sources.sql_source_object(engine).open("nonexistent"))
+
+
+@pytest.mark.unit
+def test_columns_are_projected(tmp_path: Path):
+    """only the columns asked for come back - in the table's order - from csv and sql"""
+
+    folder = Path(__file__).parent / "test_data/measure_weight_height/"
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'projected.db'}")
+    testools.copy_across(
+        outputs.sql_output_target(engine),
+        sources.csv_source_object(folder, ","),
+        ["heights"],
+    )
+
+    statements: list[str] = []
+
+    @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    csv_source = sources.csv_source_object(folder, ",")
+    full = list(csv_source.open("heights"))
+
+    for source in [csv_source, sources.sql_source_object(engine)]:
+        assert [[row[0], row[2]] for row in full] == list(
+            source.open("heights", ["VALUE", "pid", "missing"])
+        )
+        assert [[row[1]] for row in full] == list(source.open("heights", ["date"]))
+        assert [[]] * len(full) == list(source.open("heights", []))
+
+    # the sql source only selected the columns
+    assert '"date"' not in statements[-3].split("FROM")[0]
+
+    # ranges are projected too
+    start, end = sources.line_aligned_ranges(folder / "heights.csv", 30)[1]
+    ranged = list(csv_source.open_range("heights", start, end, ["date"]))
+    assert ["date"] == ranged[0]
+    assert all(1 == len(row) for row in ranged)
+
+
+class FakeBucket:
+    """just enough of a boto3 client to read objects in ranges"""
+
+    def __init__(self, objects: dict[str, bytes]):
+        self.objects = objects
+        self.ranges: list[str] = []
+
+    def head_object(self, Bucket: str, Key: str):
+        if Key not in self.objects:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "404"}}, "HeadObject"
+            )
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket: str, Key: str, Range: str):
+        self.ranges.append(Range)
+        start, end = map(int, Range[len("bytes=") :].split("-"))
+        return {"Body": io.BytesIO(self.objects[Key][start : end + 1])}
+
+
+@pytest.mark.unit
+def test_bucket_objects_are_read_in_ranges(monkeypatch):
+    """objects are fetched in chunks and split on the same lines as the csv files"""
+
+    folder = Path(__file__).parent / "test_data/measure_weight_height/"
+    data = (folder / "heights.csv").read_bytes()
+    client = FakeBucket({"in/heights": data})
+    connected: list[int] = []
+
+    def connect():
+        connected.append(os.getpid())
+        return client
+
+    monkeypatch.setattr(sources, "LINE_PROBE_SIZE", 7)
+    bucket = sources.bucket_source_object(
+        connect, "bucket", "in/", ",", chunk_size=16, read_ahead=3
+    )
+    csv_source = sources.csv_source_object(folder, ",")
+
+    assert list(csv_source.open("heights")) == list(bucket.open("heights"))
+    assert len(client.ranges) > len(data) // 16
+
+    for size in [1, 30, 100, len(data)]:
+        ranges = sources.line_aligned_ranges(folder / "heights.csv", size)
+        assert ranges == bucket.shard("heights", size)
+
+        for start, end in ranges:
+            assert list(
+                csv_source.open_range("heights", start, end, ["date", "pid"])
+            ) == list(bucket.open_range("heights", start, end, ["date", "pid"]))
+
+    # the client is made once per process - forked workers can't share it with the parent
+    assert [os.getpid()] == connected
+    monkeypatch.setattr(sources.os, "getpid", lambda: -1)
+    assert list(csv_source.open("heights")) == list(bucket.open("heights"))
+    assert [connected[0], -1] == connected
+
+
+@pytest.mark.unit
+def test_chunks_are_read_without_copying_them_again():
+    """the chunks are read at memory speed - re-slicing them made every read copy the rest of the chunk"""
+
+    data = bytes(range(256)) * (32 * 1024 * 1024 // 256)
+    chunks = [
+        data[i : i + 8 * 1024 * 1024] for i in range(0, len(data), 8 * 1024 * 1024)
+    ]
+
+    start = time.perf_counter()
+    stream = io.BufferedReader(sources.ChunkStream(iter(chunks)))
+    read = bytearray()
+    while block := stream.read(8192):
+        read += block
+    elapsed = time.perf_counter() - start
+
+    assert data == read
+    # this was 1.5s (about 20MB/s) and is about 10ms
+    assert elapsed < 0.5, f"32MB took {elapsed=}s"
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("suffix", [".gz", ".bz2", ".zst"])
+def test_compressed_inputs_are_read(tmp_path: Path, suffix: str):
+    """a compressed `table.csv.gz` (etc.) is read as if it were `table.csv`"""
+
+    if ".zst" == suffix:
+        compress = pytest.importorskip("zstandard").ZstdCompressor().compress
+    else:
+        compress = {".gz": gzip.compress, ".bz2": bz2.compress}[suffix]
+
+    folder = Path(__file__).parent / "test_data/measure_weight_height/"
+    data = (folder / "heights.csv").read_bytes()
+    (tmp_path / f"heights.csv{suffix}").write_bytes(compress(data))
+
+    expected = list(sources.csv_source_object(folder, ",").open("heights"))
+
+    source = sources.csv_source_object(tmp_path, ",")
+    assert source.has_table("heights")
+    assert expected == list(source.open("heights"))
+
+    # compressed files can't be split
+    assert [(0, None)] == source.shard("heights", 30)
+    assert [[row[1]] for row in expected] == list(
+        source.open_range("heights", 0, None, ["date"])
+    )
+
+    bucket = sources.bucket_source_object(
+        lambda: FakeBucket({f"in/heights{suffix}": compress(data)}),
+        "bucket",
+        "in/",
+        ",",
+        chunk_size=16,
+    )
+    assert [(0, None)] == bucket.shard("heights", 30)
+    assert expected == list(bucket.open("heights"))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("extra", [[], ["--workers", "2", "--shard-bytes", "40"]])
+def test_projection_keeps_each_tables_date(tmp_path: Path, extra: list[str]):
+    """one input mapped to two tables, each dated by a different column, keeps both columns"""
+
+    rules = testools.weights_dated_twice(tmp_path / "inputs")
+    testools.run_v2(tmp_path / "inputs", tmp_path / "out", *extra, rules=rules)
+
+    # the fourth column is the date in both
+    for name, dates in [
+        ("measurement", ["2023-10-12", "2023-10-11", "2023-11-21", "2025-01-03"]),
+        ("observation", ["2024-02-01", "2024-02-02", "2024-02-03", "2024-02-04"]),
+    ]:
+        lines = (tmp_path / "out" / f"{name}.tsv").read_text().splitlines()
+        assert dates == [line.split("\t")[3] for line in lines[1:]], name
+
+
+@pytest.mark.unit
+def test_read_ahead_keeps_up():
+    """the read-ahead thread hands its chunks over at memory speed - re-slicing them made every read copy the rest of the chunk"""
+
+    data = bytes(range(256)) * (32 * 1024 * 1024 // 256)
+
+    start = time.perf_counter()
+    raw = io.BytesIO(data)
+    stream = io.BufferedReader(compressed.ReadAhead(raw, raw))
+    blocks = []
+    while block := stream.read(8192):
+        blocks.append(block)
+    elapsed = time.perf_counter() - start
+
+    assert data == b"".join(blocks)
+    assert raw.closed
+    # this was about 90ms and is about 10ms
+    assert elapsed < 0.05, f"32MB took {elapsed=}s"
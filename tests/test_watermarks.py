@@ -0,0 +1,178 @@
+"""
+checks that the watermarks let a run map only the rows that've been added since the last one
+
+# λ uv run pytest tests/test_watermarks.py
+
+"""
+
+import shutil
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from carrottransform.tools.watermarks import Watermarks
+from tests.testools import run_v2, test_data
+
+OUTPUTS = ["person.tsv", "measurement.tsv", "observation.tsv"]
+
+
+@pytest.mark.unit
+def test_skip_moves_the_watermark(tmp_path: Path):
+    watermarks = Watermarks({"a.csv": 2})
+
+    rows = [["h"], ["1"], ["2"], ["3"], ["4"]]
+    assert [["h"], ["3"], ["4"]] == list(watermarks.skip("a.csv", iter(rows)))
+    assert 4 == watermarks.rows("a.csv")
+
+    assert rows == list(watermarks.skip("b.csv", iter(rows)))
+    assert 4 == watermarks.rows("b.csv")
+
+    watermarks.save(tmp_path / "watermarks.tsv")
+    loaded = Watermarks.load(tmp_path / "watermarks.tsv")
+    assert 4 == loaded.rows("a.csv")
+    assert 0 == loaded.rows("c.csv")
+
+    # fewer rows than were mapped means the source was replaced
+    with pytest.raises(Exception):
+        list(loaded.skip("a.csv", iter(rows[:3])))
+
+
+@pytest.mark.unit
+def test_skipping_keeps_up():
+    # a delta run spends most of its time skipping the rows that were mapped before
+    rows = [["h"]] + [["row"]] * 2_000_000
+    watermarks = Watermarks({"a.csv": 2_000_000})
+
+    start = time.perf_counter()
+    assert [["h"]] == list(watermarks.skip("a.csv", iter(rows)))
+    assert time.perf_counter() - start < 0.3
+
+
+def rows_without_ids(path: Path) -> list[list[str]]:
+    """the rows of an output - without the auto-numbered first column"""
+    lines = path.read_text().splitlines()
+    return sorted(line.split("\t")[1:] for line in lines[1:])
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("extra", [[], ["--workers", "2", "--shard-bytes", "40"]])
+def test_delta_runs_match_a_full_run(tmp_path: Path, extra: list[str]):
+    run_v2(test_data / "integration_test1", tmp_path / "full", *extra)
+
+    # the first load has the first couple of rows of each table (and all the people)
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    for name in ["src_SMOKING.csv", "src_WEIGHT.csv"]:
+        lines = (test_data / "integration_test1" / name).read_text().splitlines(True)
+        (inputs / name).write_text("".join(lines[:3]))
+    shutil.copy(test_data / "integration_test1/src_PERSON.csv", inputs)
+
+    state = [
+        "--watermarks-file",
+        str(tmp_path / "watermarks.tsv"),
+        "--last-used-ids-file",
+        str(tmp_path / "last_used_ids.tsv"),
+        "--checkpoint-file",
+        str(tmp_path / "checkpoint.json"),
+    ]
+    run_v2(inputs, tmp_path / "delta", *state, *extra)
+
+    # ... and then the rest are added
+    for name in ["src_SMOKING.csv", "src_WEIGHT.csv"]:
+        lines = (test_data / "integration_test1" / name).read_text().splitlines(True)
+        with (inputs / name).open("a") as file:
+            file.write("".join(lines[3:]))
+    run_v2(inputs, tmp_path / "delta", *state, *extra)
+
+    watermarks = Watermarks.load(tmp_path / "watermarks.tsv")
+    assert 4 == watermarks.rows("src_WEIGHT.csv")
+    assert 3 == watermarks.rows("src_SMOKING.csv")
+
+    for name in OUTPUTS:
+        assert rows_without_ids(tmp_path / "full" / name) == rows_without_ids(
+            tmp_path / "delta" / name
+        )
+
+    # the second run carried on numbering from the first
+    lines = (tmp_path / "delta/measurement.tsv").read_text().splitlines()[1:]
+    ids = [int(line.split("\t")[0]) for line in lines]
+    assert list(range(1, 1 + len(ids))) == ids
+
+
+@pytest.mark.unit
+def test_the_watermarks_need_a_checkpoint(tmp_path: Path):
+    # a run that died without one would have added rows past the watermarks - and the next run would add them again
+    with pytest.raises(AssertionError, match="checkpoint"):
+        run_v2(
+            test_data / "integration_test1",
+            tmp_path / "out",
+            "--watermarks-file",
+            str(tmp_path / "watermarks.tsv"),
+            "--last-used-ids-file",
+            str(tmp_path / "last_used_ids.tsv"),
+        )
+    assert not (tmp_path / "out/person.tsv").exists()
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.mark.unit
+def test_a_delta_run_that_dies_before_its_first_checkpoint(tmp_path: Path, monkeypatch):
+    run_v2(test_data / "integration_test1", tmp_path / "full")
+
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    for name in ["src_SMOKING.csv", "src_WEIGHT.csv"]:
+        lines = (test_data / "integration_test1" / name).read_text().splitlines(True)
+        (inputs / name).write_text("".join(lines[:2]))
+    shutil.copy(test_data / "integration_test1/src_PERSON.csv", inputs)
+
+    state = [
+        "--watermarks-file",
+        str(tmp_path / "watermarks.tsv"),
+        "--last-used-ids-file",
+        str(tmp_path / "last_used_ids.tsv"),
+        "--checkpoint-file",
+        str(tmp_path / "checkpoint.json"),
+    ]
+    run_v2(inputs, tmp_path / "delta", *state)
+
+    for name in ["src_SMOKING.csv", "src_WEIGHT.csv"]:
+        lines = (test_data / "integration_test1" / name).read_text().splitlines(True)
+        with (inputs / name).open("a") as file:
+            file.write("".join(lines[2:]))
+
+    # die on the first new weight - before --checkpoint-rows have been mapped
+    skip = Watermarks.skip
+
+    def crashing_skip(self, source, rows) -> Iterator[list[str]]:
+        for row in skip(self, source, rows):
+            if "2023-10-11" in row:
+                raise Crash()
+            yield row
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Watermarks, "skip", crashing_skip)
+        with pytest.raises(Crash):
+            run_v2(inputs, tmp_path / "delta", *state)
+    assert (tmp_path / "checkpoint.json").is_file()
+
+    # ... having written some of the rows it was mapping
+    written = [
+        line
+        for line in (tmp_path / "full/measurement.tsv").read_text().splitlines(True)
+        if "2023-10-11" in line
+    ]
+    with (tmp_path / "delta/measurement.tsv").open("a") as file:
+        file.write("".join(written))
+
+    run_v2(inputs, tmp_path / "delta", *state, "--resume")
+
+    for name in OUTPUTS:
+        assert rows_without_ids(tmp_path / "full" / name) == rows_without_ids(
+            tmp_path / "delta" / name
+        )
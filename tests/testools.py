@@ -1,5 +1,7 @@
+import json
 import logging
 import random
+import shutil
 from itertools import product
 from pathlib import Path
 from typing import Iterable
@@ -9,7 +11,7 @@ import sqlalchemy
 from click.testing import CliRunner
 
 import carrottransform.tools.sources as sources
-from carrottransform.cli.subcommands.run import mapstream
+from carrottransform.cli.subcommands.run import launch_v2, mapstream
 from carrottransform.tools import outputs
 from carrottransform.tools.args import PathArg
 
@@ -20,6 +22,75 @@ logger = logging.getLogger(__name__)
 project_root: Path = Path(__file__).parent.parent
 package_root: Path = project_root / "carrottransform"
 test_data = Path(__file__).parent / "test_data"
+rules_v2 = Path(__file__).parent / "test_V2/rules-v2.json"
+
+
+def run_v2(
+    inputs: Path | str,
+    output: Path | str,
+    *extra: str,
+    rules: Path = rules_v2,
+    command=launch_v2,
+) -> None:
+    """run v2 (or another `command` like `mapstream`) in-process with src_PERSON as the person table - raising whatever it raised"""
+    result = CliRunner().invoke(
+        command,
+        [
+            "--inputs",
+            str(inputs),
+            "--rules-file",
+            str(rules),
+            "--person",
+            "src_PERSON",
+            "--output",
+            str(output),
+            *extra,
+        ],
+    )
+    if result.exception is not None:
+        raise result.exception
+    assert 0 == result.exit_code
+
+
+def weights_dated_twice(into: Path) -> Path:
+    """
+    copy integration_test1's people and weights into a folder - with the weights mapped to observations too, dated by another column.
+
+    returns the v2 rules for it
+    """
+
+    into.mkdir(parents=True, exist_ok=True)
+    shutil.copy(test_data / "integration_test1/src_PERSON.csv", into)
+
+    lines = (test_data / "integration_test1/src_WEIGHT.csv").read_text().splitlines()
+    with (into / "src_WEIGHT.csv").open("w") as file:
+        file.write("person_id,measurement_date,body_kgs,obs_date\n")
+        for number, line in enumerate(lines[1:], start=1):
+            file.write(line.rstrip(",") + f",2024-02-{number:02d}\n")
+
+    rules = json.loads(rules_v2.read_text())
+    rules["cdm"]["observation"] = {
+        "src_WEIGHT.csv": {
+            "person_id_mapping": {
+                "source_field": "person_id",
+                "dest_field": "person_id",
+            },
+            "date_mapping": {
+                "source_field": "obs_date",
+                "dest_field": ["observation_datetime"],
+            },
+            "concept_mappings": {
+                "body_kgs": {
+                    "*": {"observation_concept_id": [35811769]},
+                    "original_value": ["value_as_number"],
+                }
+            },
+        }
+    }
+
+    rules_file = into.parent / f"{into.name}-rules.json"
+    rules_file.write_text(json.dumps(rules))
+    return rules_file
 
 
 #### ==========================================================================